@@ -1,18 +1,32 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Header, Response
 from sqlalchemy.orm import Session
-from backend.models.card import Card
-from backend.services.card_service import get_cards, get_card, create_card, update_card, delete_card
+from backend.models.card import Card, image_version
+from backend.services.card_service import (
+    get_cards, create_card, update_card, delete_card, merge_cards,
+    resolve_fields, get_cards_projection, get_card_projection,
+    card_etag, etag_matches, get_card_etag, get_collection_etag, CardConflictError, get_card_changes,
+    get_cached_card_entry, get_card_cached, get_card
+)
+from backend.services.card_cache import card_cache
+from backend.services.sync_service import maybe_compact
+from backend.services.dedup_service import dedup_index
+from backend.services.export_service import resolve_export_columns, stream_csv, write_excel, stream_vcard, stream_zip
+from backend.services.export_jobs import export_jobs, normalize_options, ExportJob, JOB_DONE
+from backend.services.import_service import detect_format, import_file
+from backend.services.image_store import image_store, content_digest
+from backend.services.rendition_service import rendition_service, rendition_extension
+from backend.services.image_gc import image_gc
+from backend.services.phash_service import phash_index, ensure_image_hashes
+from backend.core.config import settings
 from backend.models.db import get_db
 from typing import List, Optional
-from fastapi.responses import StreamingResponse
-import csv
-import io
-import openpyxl
+from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, JSONResponse, FileResponse
+from starlette.background import BackgroundTask
 from fastapi import Query
 import logging
 import os
-import shutil
-from datetime import datetime
+import tempfile
 
 # 設置日誌
 logging.basicConfig(level=logging.INFO)
@@ -20,20 +34,197 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
-# 創建圖片存儲目錄
-UPLOAD_DIR = "output/card_images"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
+def _store_upload(upload: Optional[UploadFile]) -> Optional[str]:
+    """上傳的圖片存入內容定址存放區（相同內容只存一份），回傳檔案路徑"""
+    if not upload or not upload.filename:
+        return None
+    return image_store.put(upload.file, upload.filename).path
+
+class MergeRequest(BaseModel):
+    source_ids: List[int]
+
+class ExportRequest(BaseModel):
+    format: str = "csv"                 # csv / excel / vcard / zip / parquet / arrow
+    columns: Optional[str] = None       # CSV/Excel/ZIP 逗號分隔欄位
+    vcard_version: str = "3.0"
+    photos: bool = False
+    images: bool = True                 # ZIP 是否包含正反面圖片
+
+def _parse_fields(fields: Optional[str], view: str) -> Optional[List[str]]:
+    try:
+        return resolve_fields(fields, view)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+# 網址帶版本參數的圖片內容永不改變，可永久快取
+IMAGE_IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+def _set_cache_headers(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    # 允許瀏覽器快取，但每次使用前都以 ETag 重新驗證
+    response.headers["Cache-Control"] = "no-cache"
 
 @router.get("/", response_model=List[Card])
-def list_cards(db: Session = Depends(get_db)):
-    return get_cards(db)
+def list_cards(
+    response: Response,
+    fields: Optional[str] = Query(None, description="以逗號分隔的欄位，例如 name,company_name"),
+    view: str = Query("full", enum=["full", "summary"]),
+    include_ocr_text: bool = Query(False, description="完整名片是否附上 OCR 原始文字（需解壓，列表預設不讀取）"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    selected = _parse_fields(fields, view)
+    variant = ",".join(selected) if selected else ("ocr" if include_ocr_text else "")
+    etag = get_collection_etag(db, variant)
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    if selected is None:
+        _set_cache_headers(response, etag)
+        return get_cards(db, include_ocr_text)
+    # 只查詢需要的欄位並直接輸出，略過 Card 模型驗證
+    projected = JSONResponse(get_cards_projection(db, selected))
+    _set_cache_headers(projected, etag)
+    return projected
+
+@router.get("/changes")
+def list_card_changes(
+    since: int = Query(0, ge=0, description="上次同步回傳的 cursor，傳 0 取得全量同步的起點"),
+    limit: int = Query(500, ge=1, le=5000),
+    fields: Optional[str] = Query(None, description="以逗號分隔的欄位，例如 name,company_name"),
+    view: str = Query("full", enum=["full", "summary"]),
+    include_ocr_text: bool = Query(False, description="完整名片是否附上 OCR 原始文字"),
+    db: Session = Depends(get_db)
+):
+    """
+    名片增量同步：回傳 cursor 之後新增、修改與刪除的名片
+    """
+    selected = _parse_fields(fields, view)
+    maybe_compact(db)
+    return get_card_changes(db, since=since, limit=limit, fields=selected, include_ocr_text=include_ocr_text)
+
+@router.get("/cache/stats")
+def card_cache_stats():
+    """單張名片快取的命中率與延遲統計"""
+    return card_cache.stats()
+
+@router.get("/duplicates")
+def list_duplicates(
+    card_id: Optional[int] = Query(None, description="只查詢與此名片重複的名片"),
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    """
+    偵測重複名片，回傳重複群組（或指定名片的候選重複名片）
+    """
+    dedup_index.refresh(db)
+    if card_id is not None:
+        similar = dedup_index.find_similar(card_id, limit=limit)
+        return {
+            "card_id": card_id,
+            "duplicates": [{"card_id": other_id, "score": round(score, 3)} for other_id, score in similar]
+        }
+    groups = dedup_index.find_duplicates(limit=limit)
+    return {"total": len(groups), "groups": groups}
 
 @router.get("/{card_id}", response_model=Card)
-def read_card(card_id: int, db: Session = Depends(get_db)):
-    card = get_card(db, card_id)
+def read_card(
+    card_id: int,
+    fields: Optional[str] = Query(None, description="以逗號分隔的欄位，例如 name,company_name"),
+    view: str = Query("full", enum=["full", "summary"]),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    selected = _parse_fields(fields, view)
+    if selected is None:
+        # 完整名片走讀穿式快取，直接回傳已序列化的 JSON
+        entry = get_cached_card_entry(db, card_id)
+        if not entry:
+            raise HTTPException(status_code=404, detail="名片不存在")
+        if etag_matches(if_none_match, entry.etag):
+            return _not_modified(entry.etag)
+        cached = Response(content=entry.body, media_type="application/json")
+        _set_cache_headers(cached, entry.etag)
+        return cached
+
+    # 先只查詢版本欄位，未變更時不載入也不序列化名片
+    etag = get_card_etag(db, card_id, ",".join(selected))
+    if etag is None:
+        raise HTTPException(status_code=404, detail="名片不存在")
+    if etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    card = get_card_projection(db, card_id, selected)
+    if not card:
+        raise HTTPException(status_code=404, detail="名片不存在")
+    projected = JSONResponse(card)
+    _set_cache_headers(projected, etag)
+    return projected
+
+@router.get("/{card_id}/images/{side}")
+def get_card_image(
+    card_id: int,
+    side: str,
+    rendition: str = Query("original", description="original 或縮圖版本（thumb / medium）"),
+    v: Optional[str] = Query(None, description="圖片版本（見名片的 renditions 網址），相符時可永久快取"),
+    if_none_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """
+    取得名片正面或反面圖片；縮圖尚未產生時會立即產生
+
+    ETag 由圖片內容雜湊產生（強 ETag），支援 If-None-Match 與 Range。
+    網址帶有目前的版本參數時回應 immutable 快取標頭，圖片更換後網址也會改變。
+    檔案以 FileResponse 送出，ASGI 伺服器支援 pathsend 時由伺服器直接傳送檔案。
+    """
+    if side not in ("front", "back"):
+        raise HTTPException(status_code=404, detail="圖片不存在")
+    if rendition != "original" and rendition not in settings.RENDITION_SIZES:
+        raise HTTPException(status_code=400, detail=f"不支援的縮圖版本: {rendition}")
+    card = get_card_cached(db, card_id)
     if not card:
         raise HTTPException(status_code=404, detail="名片不存在")
-    return card
+    path = card.front_image_path if side == "front" else card.back_image_path
+    if not path or not (os.path.exists(path) or image_gc.restore(path)):
+        raise HTTPException(status_code=404, detail="圖片不存在")
+
+    digest = content_digest(path)
+    etag = f'"{digest}"' if rendition == "original" else f'"{digest}-{rendition}{rendition_extension()}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": IMAGE_IMMUTABLE_CACHE if v == image_version(path) else "no-cache",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    if rendition != "original":
+        path = rendition_service.ensure(path, rendition)
+        if path is None:
+            raise HTTPException(status_code=422, detail="無法產生縮圖")
+    return FileResponse(path, headers=headers)
+
+@router.get("/{card_id}/similar")
+def list_similar_cards(
+    card_id: int,
+    max_distance: int = Query(None, ge=0, le=32, description="dHash 漢明距離上限（預設 PHASH_MAX_DISTANCE）"),
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    """
+    以圖片感知雜湊找出圖片相似的名片（同一張名片重複拍攝、不同角度或壓縮）
+    """
+    phash_index.refresh(db)
+    similar = phash_index.similar(card_id, max_distance, limit)
+    if similar is None:
+        card = get_card_cached(db, card_id)
+        if not card:
+            raise HTTPException(status_code=404, detail="名片不存在")
+        # 尚未計算雜湊的舊圖片：立即計算並寫回
+        hashes = ensure_image_hashes(db, [card.front_image_path, card.back_image_path])
+        db.commit()
+        phash_index.set_card(card_id, *hashes)
+        similar = phash_index.find_cards(hashes, max_distance, exclude=card_id, limit=limit)
+    return {"card_id": card_id, "similar": similar}
 
 @router.post("/", response_model=Card)
 async def add_card(
@@ -83,25 +274,8 @@ async def add_card(
     """
     try:
         # 保存圖片文件
-        front_image_path = None
-        back_image_path = None
-        
-        if front_image and front_image.filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            front_filename = f"front_{timestamp}_{front_image.filename}"
-            front_image_path = os.path.join(UPLOAD_DIR, front_filename)
-            
-            with open(front_image_path, "wb") as buffer:
-                shutil.copyfileobj(front_image.file, buffer)
-        
-        if back_image and back_image.filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            back_filename = f"back_{timestamp}_{back_image.filename}"
-            back_image_path = os.path.join(UPLOAD_DIR, back_filename)
-            
-            with open(back_image_path, "wb") as buffer:
-                shutil.copyfileobj(back_image.file, buffer)
-        
+        front_image_path = _store_upload(front_image)
+        back_image_path = _store_upload(back_image)        
         # 創建名片數據對象
         card_data = Card(
             name=name,
@@ -134,6 +308,7 @@ async def add_card(
         )
         
         created_card = create_card(db, card_data)
+        rendition_service.schedule([front_image_path, back_image_path])
         return created_card
         
     except Exception as e:
@@ -182,37 +357,24 @@ async def edit_card(
     front_ocr_text: Optional[str] = Form(None),
     back_ocr_text: Optional[str] = Form(None),
     
+    response: Response = None,
+    if_match: Optional[str] = Header(None),
     db: Session = Depends(get_db)
 ):
     """
     更新名片資料，支持圖片上傳和OCR數據
+    
+    帶 If-Match 標頭時進行樂觀並行控制：ETag 不符回傳 412
     """
     try:
-        # 檢查名片是否存在
+        # 檢查名片是否存在（直接讀資料庫：快取可能尚未看到其他 worker 的修改）
         existing_card = get_card(db, card_id)
         if not existing_card:
             raise HTTPException(status_code=404, detail="名片不存在")
         
         # 處理圖片文件
-        front_image_path = existing_card.front_image_path
-        back_image_path = existing_card.back_image_path
-        
-        if front_image and front_image.filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            front_filename = f"front_{timestamp}_{front_image.filename}"
-            front_image_path = os.path.join(UPLOAD_DIR, front_filename)
-            
-            with open(front_image_path, "wb") as buffer:
-                shutil.copyfileobj(front_image.file, buffer)
-        
-        if back_image and back_image.filename:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            back_filename = f"back_{timestamp}_{back_image.filename}"
-            back_image_path = os.path.join(UPLOAD_DIR, back_filename)
-            
-            with open(back_image_path, "wb") as buffer:
-                shutil.copyfileobj(back_image.file, buffer)
-        
+        front_image_path = _store_upload(front_image) or existing_card.front_image_path
+        back_image_path = _store_upload(back_image) or existing_card.back_image_path        
         # 創建名片更新數據對象
         card_data = Card(
             id=card_id,
@@ -246,17 +408,37 @@ async def edit_card(
             created_at=existing_card.created_at  # 保持原創建時間
         )
         
-        updated = update_card(db, card_id, card_data)
+        updated = update_card(db, card_id, card_data, if_match=if_match)
         if not updated:
             raise HTTPException(status_code=404, detail="更新名片失敗")
+        rendition_service.schedule([front_image_path, back_image_path])
+        _set_cache_headers(response, card_etag(updated.id, updated.updated_at or updated.created_at))
         return updated
         
+    except CardConflictError as e:
+        raise HTTPException(status_code=412, detail=str(e))
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"更新名片失敗: {str(e)}")
         raise HTTPException(status_code=500, detail=f"更新名片失敗: {str(e)}")
 
+@router.post("/{card_id}/merge", response_model=Card)
+def merge_duplicate_cards(card_id: int, request: MergeRequest, db: Session = Depends(get_db)):
+    """
+    將重複名片合併到指定名片，來源名片合併後刪除
+    """
+    if not request.source_ids:
+        raise HTTPException(status_code=400, detail="未指定要合併的名片")
+    try:
+        merged = merge_cards(db, card_id, request.source_ids)
+    except Exception as e:
+        logger.error(f"合併名片失敗: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"合併名片失敗: {str(e)}")
+    if not merged:
+        raise HTTPException(status_code=404, detail="名片不存在")
+    return merged
+
 @router.delete("/{card_id}")
 def remove_card(card_id: int, db: Session = Depends(get_db)):
     if not delete_card(db, card_id):
@@ -264,142 +446,149 @@ def remove_card(card_id: int, db: Session = Depends(get_db)):
     return {"success": True}
 
 @router.get("/export/download")
-def export_cards(format: str = Query("csv", enum=["csv", "excel", "vcard"]), db: Session = Depends(get_db)):
+def export_cards(
+    format: str = Query("csv", enum=["csv", "excel", "vcard", "zip"]),
+    columns: Optional[str] = Query(None, description="逗號分隔的匯出欄位（CSV/Excel/ZIP），預設為全部名片欄位"),
+    vcard_version: str = Query("3.0", enum=["3.0", "4.0"]),
+    photos: bool = Query(False, description="vCard 是否內嵌正面圖片縮圖"),
+    images: bool = Query(True, description="ZIP 是否包含正反面圖片")
+):
     """匯出名片數據"""
     try:
         logger.info(f"開始匯出，格式: {format}")
-        cards = get_cards(db)
-        logger.info(f"找到 {len(cards)} 張名片")
         
         if format == "csv":
-            output = io.StringIO()
-            writer = csv.writer(output)
-            # 更新為新的標準化欄位
-            writer.writerow([
-                "姓名", "公司名稱", "職位", "手機", "公司電話", 
-                "Email", "Line ID", "備註", "公司地址一", "公司地址二"
-            ])
-            for card in cards:
-                writer.writerow([
-                    card.name or "",
-                    card.company_name or "",
-                    card.position or "",
-                    card.mobile_phone or "",
-                    card.office_phone or "",
-                    card.email or "",
-                    card.line_id or "",
-                    card.notes or "",
-                    card.company_address_1 or "",
-                    card.company_address_2 or ""
-                ])
-            output.seek(0)
-            content = output.getvalue().encode('utf-8-sig')  # 添加BOM以支持中文
-            
+            try:
+                export_columns = resolve_export_columns(columns)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            # 串流輸出：逐批讀取資料庫並分段寫出，記憶體用量固定
             return StreamingResponse(
-                io.BytesIO(content),
+                stream_csv(export_columns),
                 media_type="text/csv",
                 headers={
                     "Content-Disposition": "attachment; filename=cards.csv",
                     "Content-Type": "text/csv; charset=utf-8"
                 }
             )
-            
-        elif format == "excel":
+        
+        if format == "excel":
             try:
-                wb = openpyxl.Workbook()
-                ws = wb.active
-                ws.title = "名片資料"
-                
-                # 設置標題行 - 更新為新的標準化欄位
-                headers = [
-                    "姓名", "公司名稱", "職位", "手機", "公司電話", 
-                    "Email", "Line ID", "備註", "公司地址一", "公司地址二"
-                ]
-                ws.append(headers)
-                
-                # 添加數據
-                for card in cards:
-                    ws.append([
-                        card.name or "",
-                        card.company_name or "",
-                        card.position or "",
-                        card.mobile_phone or "",
-                        card.office_phone or "",
-                        card.email or "",
-                        card.line_id or "",
-                        card.notes or "",
-                        card.company_address_1 or "",
-                        card.company_address_2 or ""
-                    ])
-                
-                # 自動調整列寬
-                for column in ws.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    ws.column_dimensions[column_letter].width = adjusted_width
-                
-                output = io.BytesIO()
-                wb.save(output)
-                output.seek(0)
-                
-                logger.info("EXCEL文件生成成功")
-                
-                return StreamingResponse(
-                    output,
-                    media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                    headers={
-                        "Content-Disposition": "attachment; filename=cards.xlsx",
-                        "Content-Type": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    }
-                )
-                
+                export_columns = resolve_export_columns(columns)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            # 先寫入暫存檔再以檔案回應，送出後刪除
+            fd, path = tempfile.mkstemp(suffix=".xlsx", prefix="cards_export_")
+            os.close(fd)
+            try:
+                write_excel(path, export_columns)
             except Exception as e:
+                os.remove(path)
                 logger.error(f"生成EXCEL文件時發生錯誤: {str(e)}")
                 raise HTTPException(status_code=500, detail=f"EXCEL生成失敗: {str(e)}")
-                
-        elif format == "vcard":
-            output = io.StringIO()
-            for card in cards:
-                output.write(f"BEGIN:VCARD\nVERSION:3.0\n")
-                if card.name:
-                    output.write(f"FN:{card.name}\n")
-                if card.company_name:
-                    output.write(f"ORG:{card.company_name}\n")
-                if card.position:
-                    output.write(f"TITLE:{card.position}\n")
-                if card.office_phone:
-                    output.write(f"TEL;TYPE=WORK,VOICE:{card.office_phone}\n")
-                if card.mobile_phone:
-                    output.write(f"TEL;TYPE=CELL:{card.mobile_phone}\n")
-                if card.email:
-                    output.write(f"EMAIL;TYPE=INTERNET:{card.email}\n")
-                if card.company_address_1:
-                    address = card.company_address_1
-                    if card.company_address_2:
-                        address += f" {card.company_address_2}"
-                    output.write(f"ADR;TYPE=WORK:;;{address};;;;\n")
-                output.write("END:VCARD\n")
-            output.seek(0)
-            content = output.getvalue().encode('utf-8')
-            
+            return FileResponse(
+                path,
+                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                filename="cards.xlsx",
+                background=BackgroundTask(os.remove, path)
+            )
+        
+        if format == "vcard":
             return StreamingResponse(
-                io.BytesIO(content),
+                stream_vcard(vcard_version, include_photos=photos),
                 media_type="text/vcard",
                 headers={
                     "Content-Disposition": "attachment; filename=cards.vcf",
                     "Content-Type": "text/vcard; charset=utf-8"
                 }
             )
-        else:
-            raise HTTPException(status_code=400, detail="不支援的匯出格式")
+        
+        if format == "zip":
+            try:
+                export_columns = resolve_export_columns(columns)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            # 名片清單與圖片邊產生邊送出（zip64），不會在記憶體或磁碟組出整個壓縮檔
+            return StreamingResponse(
+                stream_zip(export_columns, include_images=images),
+                media_type="application/zip",
+                headers={"Content-Disposition": "attachment; filename=cards.zip"}
+            )
+        
+        raise HTTPException(status_code=400, detail="不支援的匯出格式")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"匯出過程中發生錯誤: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"匯出失敗: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"匯出失敗: {str(e)}")
+
+def _export_job_response(job: ExportJob) -> dict:
+    data = job.to_dict()
+    data["download_url"] = f"/api/v1/cards/export/{job.id}/file" if job.status == JOB_DONE else None
+    return data
+
+@router.post("/export", status_code=202)
+def create_export_job(request: ExportRequest, db: Session = Depends(get_db)):
+    """
+    建立背景匯出工作，以 GET /export/{job_id} 查詢進度
+
+    資料沒有變更時，相同格式與選項的匯出直接沿用已產生的檔案
+    """
+    try:
+        options = normalize_options(request.format, request.columns, request.vcard_version, request.photos,
+                                    request.images)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job = export_jobs.submit(db, request.format, options)
+    return _export_job_response(job)
+
+@router.get("/export/{job_id}")
+def get_export_job(job_id: str):
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="匯出工作不存在")
+    return _export_job_response(job)
+
+@router.get("/export/{job_id}/file")
+def download_export_job(job_id: str):
+    """下載匯出檔（支援 Range 續傳）"""
+    job = export_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="匯出工作不存在")
+    if job.status != JOB_DONE:
+        raise HTTPException(status_code=409, detail="匯出尚未完成")
+    path = export_jobs.artifact_path(job)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=410, detail="匯出檔已過期，請重新匯出")
+    return FileResponse(path, media_type=job.media_type, filename=job.filename)
+
+@router.post("/import")
+def import_cards(
+    file: UploadFile = File(...),
+    format: Optional[str] = Form(None),
+    dedup: bool = Form(False),
+    db: Session = Depends(get_db)
+):
+    """
+    批次匯入名片（CSV / Excel / vCard / Parquet / Arrow），未指定 format 時依副檔名判斷
+
+    逐列串流解析、分批驗證與寫入，回傳逐列錯誤報告；dedup=true 時略過與既有名片重複的資料。
+    檔案中途無法解析時保留已寫入的批次，回傳 success=false 與 error、imported 等筆數
+    """
+    try:
+        import_format = detect_format(file.filename, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        result = import_file(db, file.file, import_format, dedup=dedup)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        logger.error(f"匯入名片時發生錯誤: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"匯入失敗: {str(e)}")
+    if result.error and not result.imported:
+        raise HTTPException(status_code=400, detail=f"匯入失敗: {result.error}")
+    # 解析中途失敗時回傳已寫入的筆數，success 為 false
+    return {"success": result.error is None, **result.to_dict()}
@@ -1,24 +1,83 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
 from pydantic import BaseModel
-from backend.services.ocr_service import OCRService
-from typing import Optional
+from backend.core.admission import ocr_admission
+from backend.core.config import settings
+from backend.models.db import SessionLocal
+from backend.services.ocr_service import OCRService, ImageQualityError
+from backend.services.phash_service import phash_index, dhash_bytes
+from backend.services.sheet_service import ocr_sheet
+from backend.services.ocr_scheduler import LANES, LANE_INTERACTIVE, LANE_BATCH
+from sqlalchemy.exc import SQLAlchemyError
+from typing import Dict, List, Optional
+import asyncio
+import logging
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 ocr_service = OCRService()
 
 class OCRParseRequest(BaseModel):
     ocr_text: str
     side: str  # 'front' or 'back'
 
+def _find_near_duplicates(content: bytes) -> List[Dict]:
+    """以感知雜湊找出圖片幾乎相同的既有名片（在執行緒中執行）"""
+    value = dhash_bytes(content)
+    if value is None:
+        return []
+    db = SessionLocal()
+    try:
+        phash_index.refresh(db)
+        return phash_index.find_cards([value], settings.PHASH_DUPLICATE_DISTANCE)
+    except SQLAlchemyError:
+        # 相似圖片只是提示，資料庫查詢失敗（例如資料庫鎖定）不影響 OCR
+        logger.exception("相似圖片查詢失敗")
+        return []
+    finally:
+        db.close()
+
 @router.post("/image")
-async def ocr_image(file: UploadFile = File(...)):
+async def ocr_image(
+    file: UploadFile = File(...),
+    skip_if_duplicate: bool = Query(False, description="圖片與既有名片幾乎相同時不執行 OCR"),
+    check_quality: bool = Query(True, description="OCR 前檢查圖片清晰度、曝光與名片覆蓋率"),
+    priority: str = Query(LANE_INTERACTIVE, enum=list(LANES), description="OCR 排程通道")
+):
     try:
         content = await file.read()
-        text = await ocr_service.ocr_image(content)
-        return {"success": True, "text": text}
+        # OCR 之前先比對圖片相似度，重複拍攝的名片可以直接提示
+        near_duplicates = await asyncio.to_thread(_find_near_duplicates, content)
+        if near_duplicates and skip_if_duplicate:
+            return {"success": True, "text": None, "skipped": True, "near_duplicates": near_duplicates}
+        text = await ocr_service.ocr_image(content, check_quality=check_quality, lane=priority)
+        return {"success": True, "text": text, "near_duplicates": near_duplicates}
+    except ImageQualityError as e:
+        # 品質不合格直接回覆，不呼叫 OCR 服務
+        raise HTTPException(status_code=422, detail={
+            "message": f"圖片品質不足：{e}",
+            "issues": e.quality.issues,
+            "quality": e.quality.to_dict(),
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OCR失敗: {str(e)}")
 
+@router.post("/sheet")
+async def ocr_card_sheet(
+    file: UploadFile = File(...),
+    side: str = Query("front", enum=["front", "back"]),
+    check_quality: bool = Query(True, description="OCR 前檢查每張名片裁切圖的品質"),
+    include_crops: bool = Query(False, description="回傳轉正後的名片裁切圖（data URL）"),
+    priority: str = Query(LANE_BATCH, enum=list(LANES), description="OCR 排程通道")
+):
+    """
+    一張照片拍多張名片：自動切出每張名片並轉正，同時 OCR 後回傳各張名片的草稿欄位
+    """
+    try:
+        content = await file.read()
+        return await ocr_sheet(ocr_service, content, side, check_quality, include_crops, priority)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"多張名片辨識失敗: {str(e)}")
+
 @router.post("/parse-fields")
 async def parse_ocr_fields(request: OCRParseRequest):
     """
@@ -32,4 +91,24 @@ async def parse_ocr_fields(request: OCRParseRequest):
             "side": request.side
         }
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"OCR解析失敗: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"OCR解析失敗: {str(e)}") 
+
+@router.get("/quality/stats")
+def ocr_quality_stats():
+    """OCR 前圖片品質檢查的統計（拒絕數即省下的 OCR 呼叫數）"""
+    return ocr_service.quality_stats.snapshot()
+
+@router.get("/backends")
+def ocr_backends():
+    """各 OCR 後端的即時延遲、錯誤率、進行中請求與健康狀態"""
+    return {"capacity": ocr_service.router.capacity, "backends": ocr_service.router.snapshot()}
+
+@router.get("/metrics")
+def ocr_metrics():
+    """OCR 排程各通道的佇列深度、執行中數量與等待/完成延遲，以及後端與品質檢查統計"""
+    return {
+        "admission": ocr_admission.snapshot(),
+        "scheduler": ocr_service.scheduler.snapshot(),
+        "backends": ocr_service.router.snapshot(),
+        "quality": ocr_service.quality_stats.snapshot(),
+    }
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 超過此數量的用戶端時清除已回滿的令牌桶，限制記憶體用量
+MAX_TRACKED_CLIENTS = 10000
+
+
+class TokenBucket:
+    """每個用戶端的令牌桶：每秒補充 rate 個，最多累積 burst 個"""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = burst
+        self.updated = now
+
+    def refill(self, rate: float, burst: float, now: float):
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+
+
+class AdmissionController:
+    """
+    OCR 請求的准入控制
+
+    - 每個用戶端以令牌桶限制請求速率，超過時回應 429
+    - 同時處理的請求數有上限，超過時在短的有界佇列中等待；
+      佇列已滿或等待逾時立即回應 503，不把上傳內容堆積在記憶體中
+    - 兩者皆附 Retry-After，告訴用戶端多久後再試
+    - OCR_ADMISSION_MAX_IN_FLIGHT=0 不限同時處理數，OCR_CLIENT_RATE=0 不限速率
+
+    狀態只在事件迴圈中存取，不需要鎖。
+    """
+
+    def __init__(self):
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._service_ewma: Optional[float] = None
+        self.stats = {"admitted": 0, "queued": 0, "rate_limited": 0, "overloaded": 0, "queue_timeouts": 0}
+
+    @property
+    def max_in_flight(self) -> int:
+        return settings.OCR_ADMISSION_MAX_IN_FLIGHT
+
+    # ---- 令牌桶 ----
+
+    def take_token(self, client: str) -> Tuple[bool, float]:
+        """取得一個令牌；失敗時回傳需要等待的秒數"""
+        rate, burst = settings.OCR_CLIENT_RATE, max(1.0, float(settings.OCR_CLIENT_BURST))
+        if rate <= 0:
+            return True, 0.0
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            if len(self._buckets) >= MAX_TRACKED_CLIENTS:
+                self._prune(rate, burst, now)
+            bucket = self._buckets[client] = TokenBucket(burst, now)
+        bucket.refill(rate, burst, now)
+        if bucket.tokens >= 1:
+            bucket.tokens -= 1
+            return True, 0.0
+        return False, (1 - bucket.tokens) / rate
+
+    def _prune(self, rate: float, burst: float, now: float):
+        for client, bucket in list(self._buckets.items()):
+            bucket.refill(rate, burst, now)
+            if bucket.tokens >= burst:
+                del self._buckets[client]
+
+    # ---- 同時處理數 ----
+
+    def _retry_after(self) -> int:
+        """依平均處理時間估計佇列清空所需秒數"""
+        service = self._service_ewma or 1.0
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(service * backlog / max(1, self.max_in_flight)))
+
+    async def acquire(self) -> Optional[int]:
+        """取得處理名額；無法取得時回傳建議的 Retry-After 秒數"""
+        if self.max_in_flight <= 0 or (self.in_flight < self.max_in_flight and not self._waiters):
+            self.in_flight += 1
+            return None
+        if len(self._waiters) >= settings.OCR_ADMISSION_MAX_QUEUE:
+            self.stats["overloaded"] += 1
+            return self._retry_after()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), settings.OCR_ADMISSION_QUEUE_TIMEOUT)
+            return None
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # 逾時的同時剛好輪到，仍可使用這個名額
+                return None
+            self.stats["queue_timeouts"] += 1
+            return self._retry_after()
+        except asyncio.CancelledError:
+            if waiter.done():
+                self.release()
+            raise
+        finally:
+            if not waiter.done():
+                waiter.cancel()
+            try:
+                self._waiters.remove(waiter)
+            except ValueError:
+                pass
+
+    def release(self, elapsed: Optional[float] = None):
+        if elapsed is not None:
+            self._service_ewma = elapsed if self._service_ewma is None else 0.2 * elapsed + 0.8 * self._service_ewma
+        # 名額直接交給佇列中下一個仍在等待的請求
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def snapshot(self) -> Dict:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "waiting": len(self._waiters),
+            "max_queue": settings.OCR_ADMISSION_MAX_QUEUE,
+            "tracked_clients": len(self._buckets),
+            "service_ewma_ms": round(self._service_ewma * 1000, 1) if self._service_ewma is not None else None,
+            **self.stats,
+        }
+
+
+# 全域准入控制（每個 worker 一份）
+ocr_admission = AdmissionController()
+
+
+def _client_key(scope) -> str:
+    headers = dict(scope.get("headers") or [])
+    if settings.OCR_TRUST_FORWARDED_FOR and b"x-forwarded-for" in headers:
+        return headers[b"x-forwarded-for"].decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class OCRAdmissionMiddleware:
+    """
+    OCR 路由的准入控制中介層（純 ASGI）
+
+    在讀取請求內容之前決定是否受理，被拒絕的上傳不會進入應用程式；
+    GET / HEAD / OPTIONS（統計與 CORS 預檢）不受限制。
+    """
+
+    def __init__(self, app, path_prefix: str = "/api/v1/ocr", controller: AdmissionController = None):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.controller = controller or ocr_admission
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not scope["path"].startswith(self.path_prefix)
+            or scope["method"] in ("GET", "HEAD", "OPTIONS")
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        allowed, wait = self.controller.take_token(_client_key(scope))
+        if not allowed:
+            self.controller.stats["rate_limited"] += 1
+            await self._reject(scope, receive, send, 429, "請求過於頻繁，請稍後再試", math.ceil(wait))
+            return
+
+        retry_after = await self.controller.acquire()
+        if retry_after is not None:
+            await self._reject(scope, receive, send, 503, "OCR 服務忙碌中，請稍後再試", retry_after)
+            return
+
+        self.controller.stats["admitted"] += 1
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(time.monotonic() - started)
+
+    @staticmethod
+    async def _reject(scope, receive, send, status_code: int, detail: str, retry_after: int):
+        response = JSONResponse(
+            {"detail": detail, "retry_after": retry_after},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, retry_after))},
+        )
+        await response(scope, receive, send)
@@ -1,8 +1,14 @@
 from pydantic_settings import BaseSettings
+from typing import Dict, List
 import os
 
 class Settings(BaseSettings):
     DB_URL: str = "sqlite:///./cards.db"
+    
+    # 資料庫遷移配置：啟動時只套用結構遷移，資料遷移於背景執行
+    # （DB_BACKGROUND_MIGRATIONS=False 時需手動執行 python -m backend.models.init_db）
+    DB_BACKGROUND_MIGRATIONS: bool = True
+    DB_SCHEMA_LOCK_WAIT_SECONDS: float = 30
     OCR_CONFIDENCE: float = 0.8
     
     # OCR API 配置
@@ -10,11 +16,90 @@ class Settings(BaseSettings):
     OCR_TIMEOUT: int = 30
     OCR_VERIFY_SSL: bool = False
     OCR_RETRY_ATTEMPTS: int = 2
+    OCR_MAX_CONCURRENCY: int = 8
+    
+    # 多個 OCR 後端（JSON 陣列，例如 [{"type": "http", "url": "...", "max_concurrency": 4},
+    # {"type": "stub", "latency": 0.2}, {"type": "paddle"}]）；空陣列時只使用 OCR_URL
+    OCR_BACKENDS: List[Dict] = []
+    OCR_EWMA_ALPHA: float = 0.3
+    OCR_EJECT_CONSECUTIVE_FAILURES: int = 3
+    OCR_EJECT_ERROR_RATE: float = 0.5
+    OCR_EJECT_SECONDS: float = 30
+    OCR_EJECT_MAX_SECONDS: float = 300
+    
+    # OCR 路由准入控制（同時處理上限、等待佇列長度與逾時；每個用戶端每秒請求數與突發量）
+    OCR_ADMISSION_MAX_IN_FLIGHT: int = 32
+    OCR_ADMISSION_MAX_QUEUE: int = 32
+    OCR_ADMISSION_QUEUE_TIMEOUT: float = 5
+    OCR_CLIENT_RATE: float = 2.0
+    OCR_CLIENT_BURST: int = 10
+    OCR_TRUST_FORWARDED_FOR: bool = False
+    
+    # OCR 優先權通道（權重、最多可用的容量比例；保留給 interactive 的位置數）
+    OCR_LANE_WEIGHTS: Dict[str, float] = {"interactive": 8, "batch": 3, "background": 1}
+    OCR_LANE_MAX_SHARE: Dict[str, float] = {"interactive": 1.0, "batch": 0.75, "background": 0.5}
+    OCR_INTERACTIVE_RESERVED: int = 1
     
     # OCR降級策略配置
     OCR_FALLBACK_ENABLED: bool = True
     OCR_LOG_LEVEL: str = "INFO"
     
+    # OCR 前圖片品質檢查（於縮小後的灰階圖計算；OCR_QUALITY_CHECK=False 停用）
+    OCR_QUALITY_CHECK: bool = True
+    OCR_QUALITY_SAMPLE_SIZE: int = 640
+    OCR_MIN_SHARPNESS: float = 40.0
+    OCR_MIN_BRIGHTNESS: float = 40.0
+    OCR_MAX_BRIGHTNESS: float = 248.0
+    OCR_MAX_CLIPPED_RATIO: float = 0.6
+    OCR_MIN_TEXT_CONTRAST: float = 40.0
+    OCR_MIN_CARD_COVERAGE: float = 0.15
+    
+    # 多張名片合照辨識配置（最小名片短邊佔畫面短邊比例）
+    SHEET_MIN_CARD_FRACTION: float = 0.08
+    
+    # 重複名片偵測配置
+    DEDUP_MIN_SCORE: float = 0.75
+    DEDUP_MAX_BLOCK_SIZE: int = 200
+    
+    # 增量同步配置
+    SYNC_TOMBSTONE_RETENTION_DAYS: int = 30
+    SYNC_COMPACT_INTERVAL_HOURS: int = 6
+    
+    # 單張名片快取配置（CARD_CACHE_SIZE=0 停用；其他 worker 的修改最多延遲 VERSION_CHECK 秒才會看到）
+    CARD_CACHE_SIZE: int = 1024
+    CARD_CACHE_TTL_SECONDS: float = 300
+    CARD_CACHE_VERSION_CHECK_SECONDS: float = 1.0
+    
+    # OCR原始文字壓縮配置
+    OCR_TEXT_COMPRESSION_LEVEL: int = 6
+    
+    # vCard 拉丁字母姓名的順序：False 為「名 姓」（Mei-Ling Chen），True 為「姓 名」（Chen Mei-Ling，
+    # 羅馬拼音的中文姓名常見）；含逗號的「姓, 名」不受影響
+    VCARD_LATIN_FAMILY_FIRST: bool = False
+    
+    # 背景匯出工作配置
+    EXPORT_DIR: str = "output/exports"
+    EXPORT_WORKERS: int = 2
+    EXPORT_ARTIFACT_TTL_HOURS: int = 24
+    
+    # 名片圖片存放配置（以內容雜湊命名，兩層分片目錄）
+    IMAGE_STORE_DIR: str = "output/card_images"
+    
+    # 圖片縮圖配置（名稱 -> 最長邊像素；格式 webp / jpeg）
+    RENDITION_SIZES: Dict[str, int] = {"thumb": 256, "medium": 1024}
+    RENDITION_FORMAT: str = "webp"
+    RENDITION_QUALITY: int = 80
+    RENDITION_WORKERS: int = 2
+    
+    # 孤兒圖片清理配置（IMAGE_GC_INTERVAL_HOURS=0 停用背景清理）
+    IMAGE_GC_GRACE_HOURS: float = 24
+    IMAGE_GC_INTERVAL_HOURS: float = 6
+    IMAGE_GC_MAX_DIRS: int = 4096
+    
+    # 相似圖片偵測配置（dHash 漢明距離，64 位元）
+    PHASH_MAX_DISTANCE: int = 10
+    PHASH_DUPLICATE_DISTANCE: int = 6
+    
     model_config = {"case_sensitive": True}
 
 settings = Settings() 
\ No newline at end of file
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    """記錄啟動各階段耗時（匯入、資料庫結構初始化等）"""
+
+    def __init__(self):
+        self.phases: Dict[str, float] = {}
+        self.completed_at: Optional[float] = None
+
+    def record(self, name: str, seconds: float):
+        self.phases[name] = seconds
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def complete(self):
+        self.completed_at = time.time()
+        for name, seconds in self.phases.items():
+            logger.info(f"啟動階段 {name}: {seconds * 1000:.1f} ms")
+        logger.info(f"啟動完成，共 {self.total_seconds() * 1000:.1f} ms")
+
+    def total_seconds(self) -> float:
+        return sum(self.phases.values())
+
+    def as_dict(self) -> Dict:
+        return {
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            "total_ms": round(self.total_seconds() * 1000, 1),
+            "completed_at": self.completed_at,
+        }
+
+
+# 全域啟動報告（每個 worker 一份）
+startup_report = StartupReport()
+
+
+def bootstrap_schema() -> List[int]:
+    """
+    啟動時只套用結構遷移並檢查版本，已是最新版本時只做一次版本查詢
+
+    資料遷移（回填、重新壓縮、重建資料表、圖片搬移）不在啟動時執行，
+    由 start_data_migrations 於背景或 python -m backend.models.init_db 套用。
+    其他程序正在進行資料遷移時不等待遷移鎖，以目前的結構直接啟動。
+
+    Returns:
+        List[int]: 尚未套用的遷移版本
+    """
+    from backend.models.migrations import MigrationLockError, pending_migrations, run_migrations
+
+    pending = pending_migrations()
+    if pending:
+        # 結構遷移很快，其他 worker 正在套用時稍等；下一個是資料遷移時不等待
+        wait = 0 if pending[0].data else settings.DB_SCHEMA_LOCK_WAIT_SECONDS
+        try:
+            applied = run_migrations(schema_only=True, lock_wait=wait)
+        except MigrationLockError:
+            logger.info("其他程序正在遷移資料庫，以目前的結構啟動")
+        else:
+            if applied:
+                logger.info(f"已套用資料庫遷移版本: {applied}")
+        pending = pending_migrations()
+    if pending:
+        logger.warning(f"資料庫尚有未套用的資料遷移: {[m.version for m in pending]}")
+    return [m.version for m in pending]
+
+
+def run_data_migrations():
+    """套用剩餘的資料遷移；其他程序持有遷移鎖時略過（由持有者完成）"""
+    from backend.models.migrations import MigrationLockError, run_migrations
+
+    try:
+        applied = run_migrations(lock_wait=0)
+    except MigrationLockError:
+        logger.info("其他程序正在執行資料遷移，本 worker 略過")
+        return
+    except Exception:
+        logger.exception("背景資料遷移失敗，可執行 python -m backend.models.init_db 重試")
+        return
+    if applied:
+        logger.info(f"背景資料遷移完成，已套用版本: {applied}")
+
+
+def start_data_migrations() -> threading.Thread:
+    """
+    在背景執行緒中套用資料遷移，不阻擋應用程式服務請求
+
+    資料遷移以檢查點分批提交，程序結束時中斷也不會留下不一致的資料，下次啟動會接續。
+    """
+    thread = threading.Thread(target=run_data_migrations, name="data-migrations", daemon=True)
+    thread.start()
+    return thread
+
+
+# 子程序內執行：量測匯入 main 與執行 lifespan 的耗時
+_BENCHMARK_SNIPPET = """
+import asyncio, json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def run():
+    async with main.app.router.lifespan_context(main.app):
+        pass
+
+asyncio.run(run())
+print(json.dumps({
+    "import_ms": (imported - start) * 1000,
+    "lifespan_ms": (time.perf_counter() - imported) * 1000,
+    "report": main.app.state.startup_report,
+}))
+"""
+
+
+def benchmark(runs: int = 5, top: int = 10) -> Dict:
+    """
+    以全新子程序量測冷啟動時間（含直譯器啟動），並列出匯入最慢的模組
+
+    Returns:
+        Dict: 各次量測結果與統計
+    """
+    import json
+    import os
+    import statistics
+    import subprocess
+    import sys
+
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    results = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run(
+            [sys.executable, "-c", _BENCHMARK_SNIPPET],
+            cwd=root, capture_output=True, text=True, check=True,
+        )
+        wall_ms = (time.perf_counter() - start) * 1000
+        measured = json.loads(completed.stdout.strip().splitlines()[-1])
+        measured["wall_ms"] = wall_ms
+        results.append(measured)
+
+    # -X importtime 輸出每個模組的累計匯入時間（微秒）
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=root, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in completed.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            modules.append((parts[2].strip(), int(parts[1]) / 1000))
+    # 只列套件根模組（首次匯入時的累計時間），子模組已含在其中
+    slowest = sorted((m for m in modules if "." not in m[0] and m[0] != "main"),
+                     key=lambda m: m[1], reverse=True)[:top]
+
+    def summary(key):
+        values = [r[key] for r in results]
+        return {
+            "median": round(statistics.median(values), 1),
+            "min": round(min(values), 1),
+            "max": round(max(values), 1),
+        }
+
+    return {
+        "runs": runs,
+        "wall_ms": summary("wall_ms"),
+        "import_ms": summary("import_ms"),
+        "lifespan_ms": summary("lifespan_ms"),
+        "last_report": results[-1]["report"],
+        "slowest_imports_ms": [{"module": name, "ms": round(ms, 1)} for name, ms in slowest],
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="量測後端冷啟動時間")
+    parser.add_argument("--runs", type=int, default=5, help="量測次數")
+    parser.add_argument("--top", type=int, default=10, help="列出匯入最慢的模組數")
+    args = parser.parse_args()
+    print(json.dumps(benchmark(args.runs, args.top), ensure_ascii=False, indent=2))
@@ -1,8 +1,10 @@
-from pydantic import BaseModel
-from typing import Optional
-from sqlalchemy import Column, Integer, String, DateTime, Text
+from pydantic import BaseModel, computed_field
+from typing import Dict, Optional
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Text, LargeBinary
+from backend.core.config import settings
 from backend.models.db import Base
 import datetime
+import hashlib
 
 class CardORM(Base):
     __tablename__ = "cards"
@@ -44,11 +46,76 @@ class CardORM(Base):
     # 系統管理欄位
     front_image_path = Column(String(500))        # 正面圖片路径
     back_image_path = Column(String(500))         # 反面圖片路径
-    front_ocr_text = Column(Text)                 # 正面OCR原始文字
-    back_ocr_text = Column(Text)                  # 反面OCR原始文字
+    # OCR原始文字壓縮後存放於 card_ocr_texts（見 CardOCRTextORM），需要時才載入
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow)
 
+class CardOCRTextORM(Base):
+    """名片OCR原始文字（壓縮存放，與 cards 分表以保持名片列精簡）"""
+    __tablename__ = "card_ocr_texts"
+    card_id = Column(Integer, primary_key=True)   # 對應 cards.id
+    codec = Column(String(40), nullable=False)    # zlib / zstd / zstd-dict
+    dict_id = Column(Integer)                     # zstd-dict 使用的字典（ocr_text_dicts.dict_id）
+    front_ocr = Column(LargeBinary)               # 正面OCR原始文字（壓縮）
+    back_ocr = Column(LargeBinary)                # 反面OCR原始文字（壓縮）
+
+class OCRTextDictORM(Base):
+    """OCR原始文字的 zstd 壓縮字典（與資料存在同一個資料庫，只新增不覆寫）"""
+    __tablename__ = "ocr_text_dicts"
+    dict_id = Column(Integer, primary_key=True, autoincrement=False)  # zstd 字典 id
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)   # 最新的字典用於新資料
+
+class CardChangeORM(Base):
+    """名片變更紀錄（增量同步用），seq 單調遞增且不重複使用"""
+    __tablename__ = "card_changes"
+    __table_args__ = {"sqlite_autoincrement": True}
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    card_id = Column(Integer, nullable=False, index=True)
+    op = Column(String(10), nullable=False)       # insert / update / delete
+    changed_at = Column(DateTime, default=datetime.datetime.utcnow, index=True)
+
+class SyncStateORM(Base):
+    """同步相關的狀態值，例如已清除的 tombstone 水位"""
+    __tablename__ = "sync_state"
+    key = Column(String(50), primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class ImageBlobORM(Base):
+    """內容定址存放的圖片檔（以 SHA-256 為鍵），ref_count 為引用此圖片的名片欄位數"""
+    __tablename__ = "image_blobs"
+    digest = Column(String(64), primary_key=True) # 圖片內容的 SHA-256
+    path = Column(String(500), nullable=False, index=True)  # 分片目錄下的檔案路徑
+    size = Column(Integer, nullable=False, default=0)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    released_at = Column(DateTime)                # ref_count 降為 0 的時間
+    dhash = Column(BigInteger)                    # 感知雜湊（64 位元 dHash，以有號整數存放）
+
+def image_version(path: str) -> str:
+    """圖片網址的版本參數（由路徑計算，內容定址的路徑隨圖片內容改變）"""
+    return hashlib.md5(path.encode()).hexdigest()[:12]
+
+def image_renditions(card_id: Optional[int], front_image_path: Optional[str],
+                     back_image_path: Optional[str]) -> Optional[Dict[str, Dict[str, str]]]:
+    """
+    名片圖片各版本（原圖與縮圖）的網址
+
+    v 參數由圖片路徑計算，圖片更換時網址跟著改變，瀏覽器可長期快取。
+    """
+    if card_id is None:
+        return None
+    renditions = {}
+    for side, path in (("front", front_image_path), ("back", back_image_path)):
+        if not path:
+            continue
+        version = image_version(path)
+        renditions[side] = {
+            name: f"/api/v1/cards/{card_id}/images/{side}?rendition={name}&v={version}"
+            for name in (*settings.RENDITION_SIZES, "original")
+        }
+    return renditions or None
+
 class Card(BaseModel):
     id: Optional[int] = None
     
@@ -93,4 +160,22 @@ class Card(BaseModel):
     created_at: Optional[datetime.datetime] = None
     updated_at: Optional[datetime.datetime] = None
 
-    model_config = {"from_attributes": True} 
\ No newline at end of file
+    model_config = {"from_attributes": True}
+
+    @computed_field
+    @property
+    def renditions(self) -> Optional[Dict[str, Dict[str, str]]]:
+        """正反面圖片的縮圖與原圖網址"""
+        return image_renditions(self.id, self.front_image_path, self.back_image_path)
+
+# 所有可查詢的名片欄位（依 Card 模型順序，renditions 由圖片路徑計算）
+CARD_FIELDS = tuple(Card.model_fields) + ("renditions",)
+
+# 列表頁使用的精簡欄位
+CARD_SUMMARY_FIELDS = ("id", "name", "company_name", "position", "renditions")
+
+# 計算 renditions 需要的圖片路徑欄位
+IMAGE_PATH_FIELDS = ("front_image_path", "back_image_path")
+
+# 存放於 card_ocr_texts 的欄位
+OCR_TEXT_FIELDS = ("front_ocr_text", "back_ocr_text")
@@ -3,6 +3,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from backend.models.db import engine
+from backend.models.migrations import run_migrations
 from sqlalchemy import text
 import logging
 
@@ -10,111 +11,18 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def drop_legacy_columns():
-    """刪除兼容舊資料的物理欄位"""
-    
-    # 要刪除的兼容欄位
-    legacy_columns = [
-        'office_phone',      # 公司電話(舊版) -> 已遷移到 company_phone1
-        'notes',             # 備註(舊版) -> 已遷移到 note1
-        'company_address_1', # 公司地址一(舊版) -> 已遷移到 company_address1
-        'company_address_2'  # 公司地址二(舊版) -> 已遷移到 company_address2
-    ]
-    
-    with engine.connect() as connection:
-        try:
-            # 檢查表格結構
-            result = connection.execute(text("PRAGMA table_info(cards)"))
-            existing_columns = [row[1] for row in result.fetchall()]
-            
-            logger.info(f"當前表格欄位: {existing_columns}")
-            
-            # 檢查要刪除的欄位是否存在
-            columns_to_drop = [col for col in legacy_columns if col in existing_columns]
-            
-            if not columns_to_drop:
-                logger.info("沒有需要刪除的兼容欄位")
-                return
-            
-            logger.info(f"準備刪除的兼容欄位: {columns_to_drop}")
-            
-            # SQLite 不支持直接 DROP COLUMN，需要重建表格
-            # 1. 獲取當前表格結構（排除要刪除的欄位）
-            keep_columns = [col for col in existing_columns if col not in legacy_columns]
-            
-            logger.info(f"保留的欄位: {keep_columns}")
-            
-            # 2. 創建新表格結構
-            create_new_table_sql = f"""
-            CREATE TABLE cards_new (
-                id INTEGER PRIMARY KEY,
-                name VARCHAR(100),
-                name_en VARCHAR(100),
-                company_name VARCHAR(200),
-                company_name_en VARCHAR(200),
-                position VARCHAR(100),
-                position_en VARCHAR(100),
-                department1 VARCHAR(100),
-                department1_en VARCHAR(100),
-                department2 VARCHAR(100),
-                department2_en VARCHAR(100),
-                department3 VARCHAR(100),
-                department3_en VARCHAR(100),
-                mobile_phone VARCHAR(50),
-                company_phone1 VARCHAR(50),
-                company_phone2 VARCHAR(50),
-                email VARCHAR(200),
-                line_id VARCHAR(100),
-                company_address1 VARCHAR(300),
-                company_address1_en VARCHAR(300),
-                company_address2 VARCHAR(300),
-                company_address2_en VARCHAR(300),
-                note1 TEXT,
-                note2 TEXT,
-                front_image_path VARCHAR(500),
-                back_image_path VARCHAR(500),
-                front_ocr_text TEXT,
-                back_ocr_text TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-            
-            # 3. 執行遷移
-            logger.info("開始創建新表格...")
-            connection.execute(text(create_new_table_sql))
-            
-            # 4. 複製數據（只複製保留的欄位）
-            keep_columns_str = ', '.join(keep_columns)
-            copy_data_sql = f"""
-            INSERT INTO cards_new ({keep_columns_str})
-            SELECT {keep_columns_str} FROM cards
-            """
-            
-            logger.info("開始複製數據...")
-            connection.execute(text(copy_data_sql))
-            
-            # 5. 刪除舊表格
-            logger.info("刪除舊表格...")
-            connection.execute(text("DROP TABLE cards"))
-            
-            # 6. 重命名新表格
-            logger.info("重命名新表格...")
-            connection.execute(text("ALTER TABLE cards_new RENAME TO cards"))
-            
-            # 7. 提交事務
-            connection.commit()
-            
-            logger.info("✅ 成功刪除兼容舊資料欄位:")
-            for col in columns_to_drop:
-                logger.info(f"   - {col}")
-            
-            logger.info("🎉 資料庫結構已完全清理，僅保留22個標準欄位")
-            
-        except Exception as e:
-            logger.error(f"❌ 刪除兼容欄位時發生錯誤: {e}")
-            connection.rollback()
-            raise
+def drop_legacy_columns(batch_size: int = 1000):
+    """
+    刪除兼容舊資料的物理欄位
+
+    由遷移引擎以線上、分批的方式重建 cards 表（先把舊欄位資料映射到新欄位），
+    重建期間資料庫仍可讀寫，中斷後重新執行會從檢查點繼續。
+    """
+    applied = run_migrations(batch_size=batch_size)
+    if applied:
+        logger.info(f"✅ 已套用遷移版本: {applied}")
+    else:
+        logger.info("沒有需要刪除的兼容欄位")
 
 def verify_migration():
     """驗證遷移結果"""
@@ -0,0 +1,633 @@
+import datetime
+import itertools
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.engine import Connection, Engine
+
+from backend.models.db import Base, engine as default_engine
+from backend.models.card import CardORM, CardOCRTextORM, ImageBlobORM, OCRTextDictORM
+
+logger = logging.getLogger(__name__)
+
+# 遷移鎖逾時（秒）：持有者超過此時間沒有心跳即視為中斷，可被接手
+# （持有期間由背景執行緒每 LOCK_TIMEOUT / 5 秒更新心跳）
+LOCK_TIMEOUT = 300
+
+
+@dataclass
+class Migration:
+    version: int
+    name: str
+    run: Callable[["MigrationContext"], None]
+    # 資料遷移（回填、重新壓縮、重建資料表）可能耗時很久，不在應用程式啟動時執行
+    data: bool = False
+    # 可重複執行的結構部分（建表、加欄位）：資料遷移尚未完成時也在啟動時先套用，
+    # 讓應用程式一開始就能使用新的結構
+    prepare: Optional[Callable[["MigrationContext"], None]] = None
+
+
+class MigrationLockError(RuntimeError):
+    """其他程序持有遷移鎖"""
+
+
+class MigrationContext:
+    """
+    提供遷移函式使用的工具：欄位檢查、keyset 分批處理、
+    檢查點（中斷後從上次位置繼續）與進度回報
+    """
+
+    def __init__(self, engine: Engine, migration: Migration, batch_size: int,
+                 progress: Optional[Callable[[str, int, int], None]] = None, owner: str = ""):
+        self.engine = engine
+        self.migration = migration
+        self.batch_size = batch_size
+        self._progress = progress
+        self._owner = owner
+
+    def columns(self, table: str) -> List[str]:
+        with self.engine.connect() as conn:
+            return [row[1] for row in conn.execute(text(f"PRAGMA table_info({table})"))]
+
+    def table_exists(self, table: str) -> bool:
+        with self.engine.connect() as conn:
+            return conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table}
+            ).first() is not None
+
+    def checkpoint(self, step: str) -> int:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT checkpoint FROM schema_migration_progress WHERE version = :v AND step = :s"),
+                {"v": self.migration.version, "s": step},
+            ).first()
+        return row[0] if row else 0
+
+    def _save_checkpoint(self, conn: Connection, step: str, value: int):
+        conn.execute(text("""
+            INSERT INTO schema_migration_progress (version, step, checkpoint, updated_at)
+            VALUES (:v, :s, :c, :t)
+            ON CONFLICT (version, step) DO UPDATE SET checkpoint = :c, updated_at = :t
+        """), {"v": self.migration.version, "s": step, "c": value, "t": datetime.datetime.utcnow()})
+        _heartbeat(conn, self._owner)
+
+    def report(self, step: str, done: int, total: int):
+        if self._progress:
+            self._progress(f"{self.migration.version:03d}_{self.migration.name}:{step}", done, total)
+
+    def run_batches(self, step: str, table: str, process: Callable[[Connection, int, int], int],
+                    where: str = "1 = 1"):
+        """
+        以 id 為 keyset 分批處理資料表
+
+        每批在獨立交易中執行 process(conn, low_id, high_id) 並同步寫入檢查點，
+        因此任何時候中斷都能從最後提交的批次後繼續，且每批只短暫持有寫入鎖。
+        """
+        last_id = self.checkpoint(step)
+        with self.engine.connect() as conn:
+            total = conn.execute(
+                text(f"SELECT count(*) FROM {table} WHERE id > :last AND ({where})"), {"last": last_id}
+            ).scalar()
+        done = 0
+        started = time.monotonic()
+        self.report(step, done, total)
+        while True:
+            with self.engine.begin() as conn:
+                high_id = conn.execute(text(f"""
+                    SELECT max(id) FROM (
+                        SELECT id FROM {table} WHERE id > :last AND ({where}) ORDER BY id LIMIT :limit
+                    )
+                """), {"last": last_id, "limit": self.batch_size}).scalar()
+                if high_id is None:
+                    break
+                done += process(conn, last_id, high_id)
+                self._save_checkpoint(conn, step, high_id)
+            last_id = high_id
+            self.report(step, done, total)
+            elapsed = time.monotonic() - started
+            logger.info(
+                f"[{self.migration.version:03d} {self.migration.name}] {step}: "
+                f"{done}/{total} ({done * 100 / total if total else 100:.1f}%)，"
+                f"{done / elapsed if elapsed else 0:.0f} 筆/秒"
+            )
+
+
+# ---- 遷移鎖 ----
+
+def _ensure_bookkeeping_tables(conn: Connection):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name VARCHAR(100) NOT NULL,
+            applied_at DATETIME NOT NULL
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migration_progress (
+            version INTEGER NOT NULL,
+            step VARCHAR(50) NOT NULL,
+            checkpoint INTEGER NOT NULL DEFAULT 0,
+            updated_at DATETIME NOT NULL,
+            PRIMARY KEY (version, step)
+        )
+    """))
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migration_lock (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            owner VARCHAR(200) NOT NULL,
+            heartbeat DATETIME NOT NULL
+        )
+    """))
+
+
+def _heartbeat(conn: Connection, owner: str) -> bool:
+    if not owner:
+        return True
+    return conn.execute(
+        text("UPDATE schema_migration_lock SET heartbeat = :t WHERE id = 1 AND owner = :o"),
+        {"t": datetime.datetime.utcnow(), "o": owner},
+    ).rowcount > 0
+
+
+class _HeartbeatThread:
+    """
+    持有遷移鎖期間由背景執行緒定期更新心跳
+
+    建表、字典訓練、資料表切換等沒有檢查點的長步驟執行時，鎖也不會被其他程序判定為逾時而接手。
+    """
+
+    def __init__(self, engine: Engine, owner: str, interval: float):
+        self._engine = engine
+        self._owner = owner
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="migration-heartbeat", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                with self._engine.begin() as conn:
+                    if not _heartbeat(conn, self._owner):
+                        logger.error("遷移鎖已不屬於本程序，可能有其他程序同時遷移")
+            except Exception as e:
+                # 資料庫暫時被遷移交易鎖住時下次再試
+                logger.warning(f"更新遷移鎖心跳失敗: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _acquire_lock(engine: Engine, owner: str, wait: float) -> bool:
+    deadline = time.monotonic() + wait
+    while True:
+        now = datetime.datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(text("""
+                DELETE FROM schema_migration_lock WHERE heartbeat < :stale
+            """), {"stale": now - datetime.timedelta(seconds=LOCK_TIMEOUT)})
+            acquired = conn.execute(text("""
+                INSERT OR IGNORE INTO schema_migration_lock (id, owner, heartbeat) VALUES (1, :o, :t)
+            """), {"o": owner, "t": now}).rowcount
+        if acquired:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(1)
+
+
+def _release_lock(engine: Engine, owner: str):
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_migration_lock WHERE id = 1 AND owner = :o"), {"o": owner})
+
+
+def _has_rows(engine: Engine, table: str) -> bool:
+    with engine.connect() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table}
+        ).first()
+        return exists is not None and conn.execute(text(f"SELECT 1 FROM {table} LIMIT 1")).first() is not None
+
+
+def _record_changes(conn: Connection, card_ids: List[int]):
+    """資料遷移改寫了名片內容：寫入變更紀錄，讓各 worker 的快取、索引與同步用戶端重新載入"""
+    if card_ids:
+        now = datetime.datetime.utcnow()
+        conn.execute(
+            text("INSERT INTO card_changes (card_id, op, changed_at) VALUES (:id, 'update', :t)"),
+            [{"id": card_id, "t": now} for card_id in card_ids],
+        )
+
+
+# ---- 遷移內容 ----
+
+# 舊版資料庫可能缺少的欄位
+_CARD_COLUMNS = {
+    'company_name': 'VARCHAR(200)',
+    'position': 'VARCHAR(100)',
+    'mobile_phone': 'VARCHAR(50)',
+    'email': 'VARCHAR(200)',
+    'line_id': 'VARCHAR(100)',
+    'front_image_path': 'VARCHAR(500)',
+    'back_image_path': 'VARCHAR(500)',
+    'name_en': 'VARCHAR(100)',
+    'company_name_en': 'VARCHAR(200)',
+    'position_en': 'VARCHAR(100)',
+    'department1': 'VARCHAR(100)',
+    'department1_en': 'VARCHAR(100)',
+    'department2': 'VARCHAR(100)',
+    'department2_en': 'VARCHAR(100)',
+    'department3': 'VARCHAR(100)',
+    'department3_en': 'VARCHAR(100)',
+    'company_phone1': 'VARCHAR(50)',
+    'company_phone2': 'VARCHAR(50)',
+    'company_address1': 'VARCHAR(300)',
+    'company_address1_en': 'VARCHAR(300)',
+    'company_address2': 'VARCHAR(300)',
+    'company_address2_en': 'VARCHAR(300)',
+    'note1': 'TEXT',
+    'note2': 'TEXT',
+    'created_at': 'DATETIME',
+    'updated_at': 'DATETIME',
+}
+
+# 舊欄位 -> 新欄位
+_LEGACY_MAPPING = {
+    'company': 'company_name',
+    'title': 'position',
+    'mobile': 'mobile_phone',
+    'phone': 'company_phone1',
+    'office_phone': 'company_phone1',
+    'address': 'company_address1',
+    'company_address_1': 'company_address1',
+    'company_address_2': 'company_address2',
+    'notes': 'note1',
+    'image_path': 'front_image_path',
+    'image_back_path': 'back_image_path',
+    'raw_text': 'front_ocr_text',
+}
+
+
+def _m001_create_tables_and_columns(ctx: MigrationContext):
+    """建立缺少的資料表，並為舊版 cards 表補上缺少的欄位"""
+    Base.metadata.create_all(bind=ctx.engine)
+    existing = ctx.columns("cards")
+    with ctx.engine.begin() as conn:
+        for column_name, column_type in _CARD_COLUMNS.items():
+            if column_name not in existing:
+                conn.execute(text(f"ALTER TABLE cards ADD COLUMN {column_name} {column_type}"))
+                logger.info(f"已添加欄位: {column_name}")
+
+
+def _m002_map_legacy_columns(ctx: MigrationContext):
+    """將舊欄位資料分批搬到新欄位（只填入新欄位為空的資料）"""
+    existing = ctx.columns("cards")
+    for old_column, new_column in _LEGACY_MAPPING.items():
+        if old_column not in existing or new_column not in existing:
+            continue
+
+        def process(conn, low_id, high_id, old_column=old_column, new_column=new_column):
+            condition = f"""
+                id > :low AND id <= :high
+                AND {old_column} IS NOT NULL AND {old_column} != ''
+                AND ({new_column} IS NULL OR {new_column} = '')
+            """
+            params = {"low": low_id, "high": high_id}
+            card_ids = [row[0] for row in conn.execute(text(f"SELECT id FROM cards WHERE {condition}"), params)]
+            conn.execute(text(f"UPDATE cards SET {new_column} = {old_column} WHERE {condition}"), params)
+            _record_changes(conn, card_ids)
+            return len(card_ids)
+
+        ctx.run_batches(f"{old_column}->{new_column}", "cards", process)
+
+
+def _m003_move_ocr_texts(ctx: MigrationContext):
+    """將內嵌的 OCR 原始文字壓縮搬到 card_ocr_texts"""
+    from backend.services.ocr_text_store import ocr_text_codec
+
+    existing = ctx.columns("cards")
+    if 'front_ocr_text' not in existing or 'back_ocr_text' not in existing:
+        return
+    has_text = "front_ocr_text IS NOT NULL OR back_ocr_text IS NOT NULL"
+    _ensure_ocr_dict_schema(ctx)
+
+    with ctx.engine.begin() as conn:
+        if ctx.checkpoint("move") == 0 and ocr_text_codec.active_dict_id(conn) is None:
+            rows = conn.execute(
+                text(f"SELECT front_ocr_text, back_ocr_text FROM cards WHERE {has_text} LIMIT 2000")
+            ).fetchall()
+            ocr_text_codec.train_dictionary(conn, [value.encode('utf-8') for row in rows for value in row if value])
+
+    ocr_table = CardOCRTextORM.__table__
+
+    def process(conn, low_id, high_id):
+        rows = conn.execute(text(f"""
+            SELECT id, front_ocr_text, back_ocr_text FROM cards
+            WHERE id > :low AND id <= :high AND ({has_text})
+        """), {"low": low_id, "high": high_id}).fetchall()
+        codec, dict_id = ocr_text_codec.current_codec(conn)
+        for card_id, front, back in rows:
+            conn.execute(ocr_table.delete().where(ocr_table.c.card_id == card_id))
+            conn.execute(ocr_table.insert().values(
+                card_id=card_id,
+                codec=codec,
+                dict_id=dict_id,
+                front_ocr=ocr_text_codec.encode_text(conn, front, codec, dict_id),
+                back_ocr=ocr_text_codec.encode_text(conn, back, codec, dict_id),
+            ))
+        conn.execute(text(f"""
+            UPDATE cards SET front_ocr_text = NULL, back_ocr_text = NULL
+            WHERE id > :low AND id <= :high
+        """), {"low": low_id, "high": high_id})
+        _record_changes(conn, [row[0] for row in rows])
+        return len(rows)
+
+    ctx.run_batches("move", "cards", process, where=has_text)
+
+
+def _m004_rebuild_cards_table(ctx: MigrationContext):
+    """
+    重建 cards 表以移除 CardORM 不再使用的欄位（舊版欄位、內嵌 OCR 文字）
+
+    線上重建：先建立 cards_new 與同步觸發器，分批複製資料，
+    最後在一個短交易內切換，複製期間應用程式仍可正常讀寫。
+    """
+    target_columns = [column.name for column in CardORM.__table__.columns]
+    existing = ctx.columns("cards")
+    if set(existing) <= set(target_columns) and not ctx.table_exists("cards_new"):
+        return
+    copy_columns = [column for column in target_columns if column in existing]
+    column_list = ", ".join(copy_columns)
+    new_values = ", ".join(f"NEW.{column}" for column in copy_columns)
+
+    new_table = CardORM.__table__.to_metadata(MetaData(), name="cards_new")
+    with ctx.engine.begin() as conn:
+        new_table.create(conn, checkfirst=True)
+        # 觸發器讓複製期間的寫入同步到新表
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS cards_rebuild_insert AFTER INSERT ON cards BEGIN
+                INSERT OR REPLACE INTO cards_new ({column_list}) VALUES ({new_values});
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS cards_rebuild_update AFTER UPDATE ON cards BEGIN
+                INSERT OR REPLACE INTO cards_new ({column_list}) VALUES ({new_values});
+            END
+        """))
+        conn.execute(text("""
+            CREATE TRIGGER IF NOT EXISTS cards_rebuild_delete AFTER DELETE ON cards BEGIN
+                DELETE FROM cards_new WHERE id = OLD.id;
+            END
+        """))
+
+    def process(conn, low_id, high_id):
+        # OR IGNORE：觸發器已寫入的較新資料不被覆蓋
+        return conn.execute(text(f"""
+            INSERT OR IGNORE INTO cards_new ({column_list})
+            SELECT {column_list} FROM cards WHERE id > :low AND id <= :high
+        """), {"low": low_id, "high": high_id}).rowcount
+
+    ctx.run_batches("copy", "cards", process)
+
+    with ctx.engine.begin() as conn:
+        for trigger in ("cards_rebuild_insert", "cards_rebuild_update", "cards_rebuild_delete"):
+            conn.execute(text(f"DROP TRIGGER IF EXISTS {trigger}"))
+        conn.execute(text("DROP TABLE cards"))
+        conn.execute(text("ALTER TABLE cards_new RENAME TO cards"))
+        for index in new_table.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        for index in CardORM.__table__.indexes:
+            index.create(conn, checkfirst=True)
+    logger.info(f"cards 表重建完成，已移除欄位: {sorted(set(existing) - set(target_columns))}")
+
+
+def _m005_content_address_images(ctx: MigrationContext):
+    """
+    將平面目錄中的名片圖片改為內容定址存放（兩層分片目錄）並建立引用計數
+
+    每批重新計算圖片雜湊、以硬連結放入存放區並更新名片路徑。不再被引用的
+    舊檔留給 image_gc 清理（寬限期、隔離區）。找不到檔案的路徑保持原樣。
+    """
+    from backend.services.image_store import ImageStore, image_store
+
+    Base.metadata.create_all(bind=ctx.engine, tables=[ImageBlobORM.__table__])
+    has_image = "front_image_path IS NOT NULL OR back_image_path IS NOT NULL"
+    missing = set()
+
+    def process(conn, low_id, high_id):
+        rows = conn.execute(text(f"""
+            SELECT id, front_image_path, back_image_path FROM cards
+            WHERE id > :low AND id <= :high AND ({has_image})
+        """), {"low": low_id, "high": high_id}).fetchall()
+        refs = {}
+        changed = []
+        for card_id, front, back in rows:
+            paths = []
+            for path in (front, back):
+                if path and not ImageStore.digest_of(path):
+                    if os.path.isfile(path):
+                        path = image_store.put_file(path).path
+                    else:
+                        missing.add(path)
+                paths.append(path)
+                digest = ImageStore.digest_of(path)
+                if digest:
+                    ref = refs.setdefault(digest, [path, 0])
+                    ref[1] += 1
+            if paths != [front, back]:
+                conn.execute(
+                    text("UPDATE cards SET front_image_path = :f, back_image_path = :b WHERE id = :id"),
+                    {"f": paths[0], "b": paths[1], "id": card_id},
+                )
+                changed.append(card_id)
+        _record_changes(conn, changed)
+        now = datetime.datetime.utcnow()
+        for digest, (path, count) in refs.items():
+            conn.execute(text("""
+                INSERT INTO image_blobs (digest, path, size, ref_count, created_at)
+                VALUES (:d, :p, :s, :n, :t)
+                ON CONFLICT (digest) DO UPDATE SET ref_count = ref_count + :n, released_at = NULL
+            """), {"d": digest, "p": path, "s": os.path.getsize(path) if os.path.exists(path) else 0,
+                   "n": count, "t": now})
+        return len(rows)
+
+    ctx.run_batches("rehash", "cards", process, where=has_image)
+    if missing:
+        logger.warning(f"有 {len(missing)} 個名片圖片檔不存在，保留原路徑")
+
+    # 已搬入存放區的舊檔不在此直接刪除：遷移期間仍可能有請求讀取舊路徑，
+    # 交由 image_gc 依寬限期移到隔離區（再次被引用時可還原），隔離期滿後才刪除
+    logger.info("舊版圖片檔將由圖片清理（image_gc）於寬限期後隔離並刪除，"
+                "可執行 python -m backend.services.image_gc --dry-run 預覽")
+
+
+def _m006_image_perceptual_hash(ctx: MigrationContext):
+    """image_blobs 加上感知雜湊欄位與路徑索引（雜湊由 phash_service 補齊）"""
+    if "dhash" not in ctx.columns("image_blobs"):
+        with ctx.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE image_blobs ADD COLUMN dhash BIGINT"))
+    with ctx.engine.begin() as conn:
+        for index in ImageBlobORM.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+
+def _ensure_ocr_dict_schema(ctx: MigrationContext):
+    """建立 ocr_text_dicts 並為 card_ocr_texts 補上 dict_id 欄位"""
+    with ctx.engine.begin() as conn:
+        OCRTextDictORM.__table__.create(conn, checkfirst=True)
+        CardOCRTextORM.__table__.create(conn, checkfirst=True)
+    if "dict_id" not in ctx.columns("card_ocr_texts"):
+        with ctx.engine.begin() as conn:
+            conn.execute(text("ALTER TABLE card_ocr_texts ADD COLUMN dict_id INTEGER"))
+
+
+def _m007_ocr_text_dicts_in_db(ctx: MigrationContext):
+    """
+    OCR 文字壓縮字典改存資料庫：匯入舊版字典檔（OCR_TEXT_DICT_DIR，預設 output/ocr_dicts），
+    並將 codec 'zstd-dict:<id>' 拆成 codec 'zstd-dict' 與 dict_id 欄位
+    """
+    _ensure_ocr_dict_schema(ctx)
+    # 舊版的字典目錄設定已移除，仍接受同名環境變數指定舊目錄
+    dict_dir = os.environ.get("OCR_TEXT_DICT_DIR", "output/ocr_dicts")
+    dict_table = OCRTextDictORM.__table__
+    if os.path.isdir(dict_dir):
+        active = None
+        pointer = os.path.join(dict_dir, "active")
+        if os.path.exists(pointer):
+            with open(pointer) as f:
+                active = int(f.read().strip())
+        with ctx.engine.begin() as conn:
+            for name in sorted(os.listdir(dict_dir)):
+                if not name.endswith(".zdict"):
+                    continue
+                dict_id = int(name[:-len(".zdict")])
+                path = os.path.join(dict_dir, name)
+                if conn.execute(dict_table.select().where(dict_table.c.dict_id == dict_id)).first():
+                    continue
+                with open(path, "rb") as f:
+                    data = f.read()
+                # 原本啟用中的字典排在最新，其餘依檔案時間
+                created_at = (
+                    datetime.datetime.utcnow() if dict_id == active
+                    else datetime.datetime.utcfromtimestamp(os.path.getmtime(path))
+                )
+                conn.execute(dict_table.insert().values(dict_id=dict_id, data=data, created_at=created_at))
+                logger.info(f"已匯入 OCR 文字字典 {dict_id}")
+
+    with ctx.engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE card_ocr_texts
+            SET dict_id = CAST(substr(codec, length('zstd-dict:') + 1) AS INTEGER), codec = 'zstd-dict'
+            WHERE codec LIKE 'zstd-dict:%'
+        """))
+        missing = conn.execute(text("""
+            SELECT count(*) FROM card_ocr_texts
+            WHERE dict_id IS NOT NULL AND dict_id NOT IN (SELECT dict_id FROM ocr_text_dicts)
+        """)).scalar()
+    if missing:
+        logger.warning(f"{missing} 筆 OCR 文字使用的壓縮字典不存在，無法解壓")
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "create_tables_and_columns", _m001_create_tables_and_columns),
+    Migration(2, "map_legacy_columns", _m002_map_legacy_columns, data=True),
+    Migration(3, "move_ocr_texts", _m003_move_ocr_texts, data=True, prepare=_ensure_ocr_dict_schema),
+    Migration(4, "rebuild_cards_table", _m004_rebuild_cards_table, data=True),
+    Migration(5, "content_address_images", _m005_content_address_images, data=True),
+    Migration(6, "image_perceptual_hash", _m006_image_perceptual_hash, prepare=_m006_image_perceptual_hash),
+    Migration(7, "ocr_text_dicts_in_db", _m007_ocr_text_dicts_in_db, data=True, prepare=_ensure_ocr_dict_schema),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+# ---- 執行 ----
+
+def current_version(engine: Engine = None) -> int:
+    engine = engine or default_engine
+    with engine.begin() as conn:
+        _ensure_bookkeeping_tables(conn)
+        return conn.execute(text("SELECT coalesce(max(version), 0) FROM schema_version")).scalar()
+
+
+def pending_migrations(engine: Engine = None, target: int = None) -> List[Migration]:
+    version = current_version(engine)
+    target = target if target is not None else LATEST_VERSION
+    return [m for m in MIGRATIONS if version < m.version <= target]
+
+
+def run_migrations(engine: Engine = None, target: int = None, batch_size: int = 1000,
+                   progress: Optional[Callable[[str, int, int], None]] = None,
+                   lock_wait: float = 600, schema_only: bool = False) -> List[int]:
+    """
+    依版本順序執行尚未套用的遷移
+
+    多個程序同時啟動時只有一個會取得遷移鎖，其餘等待後發現已是最新版本。
+    遷移中斷時檢查點保留在 schema_migration_progress，下次執行會接續。
+
+    schema_only=True（應用程式啟動時）只執行排在第一個資料遷移之前的結構遷移，
+    其餘待套用遷移只執行 prepare 結構部分；cards 表沒有資料時資料遷移也很快，一併執行。
+
+    Returns:
+        List[int]: 本次套用的版本
+
+    Raises:
+        MigrationLockError: lock_wait 秒內無法取得遷移鎖
+    """
+    engine = engine or default_engine
+    if not pending_migrations(engine, target):
+        return []
+
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    if not _acquire_lock(engine, owner, lock_wait):
+        raise MigrationLockError("無法取得資料庫遷移鎖，可能有其他程序正在遷移")
+    try:
+        with _HeartbeatThread(engine, owner, interval=LOCK_TIMEOUT / 5):
+            return _apply(engine, target, batch_size, progress, owner, schema_only)
+    finally:
+        _release_lock(engine, owner)
+
+
+def _apply(engine: Engine, target: Optional[int], batch_size: int,
+           progress: Optional[Callable[[str, int, int], None]], owner: str, schema_only: bool) -> List[int]:
+    """在持有遷移鎖的狀態下依序套用遷移"""
+    applied = []
+    pending = pending_migrations(engine, target)
+    deferred = []
+    if schema_only and _has_rows(engine, "cards"):
+        runnable = list(itertools.takewhile(lambda m: not m.data, pending))
+        deferred = pending[len(runnable):]
+        pending = runnable
+    for migration in pending:
+        logger.info(f"開始遷移 {migration.version:03d}_{migration.name}")
+        started = time.monotonic()
+        migration.run(MigrationContext(engine, migration, batch_size, progress, owner))
+        with engine.begin() as conn:
+            conn.execute(
+                text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": migration.version, "n": migration.name, "t": datetime.datetime.utcnow()},
+            )
+            conn.execute(text("DELETE FROM schema_migration_progress WHERE version = :v"), {"v": migration.version})
+        applied.append(migration.version)
+        logger.info(f"✅ 遷移 {migration.version:03d}_{migration.name} 完成，耗時 {time.monotonic() - started:.1f} 秒")
+    for migration in deferred:
+        if migration.prepare:
+            migration.prepare(MigrationContext(engine, migration, batch_size, progress, owner))
+    return applied
+
+
+def vacuum(engine: Engine = None):
+    """回收已刪除資料的空間（會鎖住資料庫，建議在離峰時段手動執行）"""
+    engine = engine or default_engine
+    with engine.connect() as conn:
+        conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.card import Card
+from backend.services.sync_service import ChangeFollower
+
+
+@dataclass
+class CachedCard:
+    """快取項目：名片模型、ETag 與已序列化的 JSON"""
+    card: Card
+    etag: str
+    body: bytes
+    expires_at: float = 0.0
+
+
+class CardCache:
+    """
+    單張名片的讀穿式快取（LRU + TTL）
+
+    本程序內的寫入直接失效對應項目；其他 worker 的寫入則每隔 check_interval 秒
+    以 card_changes 的最新 seq 做一次版本檢查（單一查詢），發現變更時才查出
+    並只失效被修改的名片。
+    """
+
+    def __init__(self, max_size: int = None, ttl: float = None, check_interval: float = None):
+        self.max_size = max_size if max_size is not None else settings.CARD_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.CARD_CACHE_TTL_SECONDS
+        self.check_interval = check_interval if check_interval is not None else settings.CARD_CACHE_VERSION_CHECK_SECONDS
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CachedCard]" = OrderedDict()
+        # 每次失效遞增，避免載入期間被失效的舊資料寫回快取
+        self._generation = 0
+        self._changes = ChangeFollower(max_cards=self.max_size)
+        self._last_check = 0.0
+        self._stats = {
+            "hits": 0, "misses": 0, "evictions": 0, "expirations": 0,
+            "invalidations": 0, "version_checks": 0,
+            "hit_seconds": 0.0, "miss_seconds": 0.0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, db: Session, card_id: int, loader: Callable[[Session, int], Optional[CachedCard]]) -> Optional[CachedCard]:
+        """取得名片，未命中時以 loader 從資料庫載入並寫入快取"""
+        if not self.enabled:
+            return loader(db, card_id)
+
+        start = time.perf_counter()
+        self._check_version(db)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(card_id)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(card_id)
+                    self._stats["hits"] += 1
+                    self._stats["hit_seconds"] += time.perf_counter() - start
+                    return entry
+                del self._entries[card_id]
+                self._stats["expirations"] += 1
+            generation = self._generation
+
+        entry = loader(db, card_id)
+        with self._lock:
+            self._stats["misses"] += 1
+            if entry is not None and generation == self._generation:
+                entry.expires_at = time.monotonic() + self.ttl
+                self._entries[card_id] = entry
+                self._entries.move_to_end(card_id)
+                while len(self._entries) > self.max_size:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+            self._stats["miss_seconds"] += time.perf_counter() - start
+        return entry
+
+    def invalidate(self, card_ids: Iterable[int]):
+        with self._lock:
+            self._generation += 1
+            for card_id in card_ids:
+                if self._entries.pop(card_id, None) is not None:
+                    self._stats["invalidations"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._stats["invalidations"] += len(self._entries)
+            self._entries.clear()
+
+    def _check_version(self, db: Session):
+        """比對最新變更序號，失效其他程序修改過的名片"""
+        now = time.monotonic()
+        if self.check_interval and now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        self._stats["version_checks"] += 1
+
+        card_ids = self._changes.poll(db)
+        if card_ids is None:
+            # 期間的 tombstone 已被壓縮清除或變更太多，無法逐筆失效
+            self.clear()
+        elif card_ids:
+            self.invalidate(card_ids)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stats = dict(self._stats)
+            size = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        return {
+            "enabled": self.enabled,
+            "size": size,
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "hit_ratio": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            "evictions": stats["evictions"],
+            "expirations": stats["expirations"],
+            "invalidations": stats["invalidations"],
+            "version_checks": stats["version_checks"],
+            "avg_hit_ms": round(stats["hit_seconds"] * 1000 / stats["hits"], 3) if stats["hits"] else None,
+            "avg_miss_ms": round(stats["miss_seconds"] * 1000 / stats["misses"], 3) if stats["misses"] else None,
+        }
+
+
+# 全域快取實例（每個 worker 一份）
+card_cache = CardCache()
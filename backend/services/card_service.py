@@ -1,40 +1,286 @@
-from backend.models.card import CardORM, Card
+from backend.models.card import (
+    CardORM, Card, CardChangeORM, CARD_FIELDS, CARD_SUMMARY_FIELDS, OCR_TEXT_FIELDS, IMAGE_PATH_FIELDS,
+    image_renditions
+)
+from backend.services.card_cache import card_cache, CachedCard
+from backend.services.dedup_service import dedup_index
+from backend.services.image_store import retain_images, release_images, update_image_refs
+from backend.services.phash_service import ensure_image_hashes, phash_index
+from backend.services.ocr_text_store import load_ocr_texts, save_ocr_texts, delete_ocr_texts, UNCHANGED
+from backend.services.sync_service import record_change, current_cursor, tombstone_horizon, fetch_changes
+from sqlalchemy import func, insert, literal_column, text, update
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional, Sequence
+from types import SimpleNamespace
+import datetime
+import hashlib
+import logging
 
-def get_cards(db: Session) -> List[Card]:
-    return [Card.model_validate(card) for card in db.query(CardORM).order_by(CardORM.created_at.desc()).all()]
+logger = logging.getLogger(__name__)
+
+class CardConflictError(Exception):
+    """名片已被其他人修改（樂觀並行控制衝突）"""
+
+def _image_paths(card) -> List[Optional[str]]:
+    return [card.front_image_path, card.back_image_path]
+
+def _to_cards(db: Session, db_cards, include_ocr_text: bool = True) -> List[Card]:
+    """CardORM 轉為 Card；include_ocr_text 時由 card_ocr_texts 批次補上 OCR 原始文字"""
+    cards = [Card.model_validate(db_card) for db_card in db_cards]
+    if include_ocr_text:
+        texts = load_ocr_texts(db, [card.id for card in cards])
+        for card in cards:
+            card.front_ocr_text, card.back_ocr_text = texts.get(card.id, (None, None))
+    return cards
+
+def get_cards(db: Session, include_ocr_text: bool = False) -> List[Card]:
+    """名片列表；OCR 原始文字只在 include_ocr_text 時才讀取並解壓"""
+    return _to_cards(db, db.query(CardORM).order_by(CardORM.created_at.desc()).all(), include_ocr_text)
+
+def resolve_fields(fields: Optional[str] = None, view: str = "full") -> Optional[List[str]]:
+    """
+    解析 fields= / view= 參數，回傳要查詢的欄位清單；
+    回傳 None 表示需要完整的 Card
+    """
+    if fields:
+        requested = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in requested if f not in CARD_FIELDS]
+        if unknown:
+            raise ValueError(f"未知的欄位: {', '.join(unknown)}")
+        # id 永遠回傳，其餘依請求順序並去重
+        return list(dict.fromkeys(["id", *requested]))
+    if view == "summary":
+        return list(CARD_SUMMARY_FIELDS)
+    if view != "full":
+        raise ValueError(f"不支援的 view: {view}")
+    return None
+
+def _project_row(fields: Sequence[str], row) -> Dict:
+    """將查詢結果列轉為可直接序列化的 dict（不經過 Pydantic 驗證）"""
+    item = dict(zip(fields, row))
+    for key, value in item.items():
+        if isinstance(value, datetime.datetime):
+            item[key] = value.isoformat()
+    return item
+
+def _column_fields(fields: Sequence[str]) -> List[str]:
+    """需要從 cards 表 SELECT 的欄位（renditions 改為讀取圖片路徑）"""
+    columns = [f for f in fields if f not in OCR_TEXT_FIELDS and f != "renditions"]
+    if "renditions" in fields:
+        columns += [f for f in IMAGE_PATH_FIELDS if f not in columns]
+    return columns
+
+def _projection_query(db: Session, fields: Sequence[str]):
+    """只 SELECT 指定欄位（OCR 原始文字另由 card_ocr_texts 讀取）"""
+    return db.query(*[getattr(CardORM, f) for f in _column_fields(fields)])
+
+def _project_rows(db: Session, fields: Sequence[str], rows) -> List[Dict]:
+    column_fields = _column_fields(fields)
+    items = [_project_row(column_fields, row) for row in rows]
+    if column_fields == list(fields):
+        return items
+    if any(f in OCR_TEXT_FIELDS for f in fields):
+        texts = load_ocr_texts(db, [item["id"] for item in items])
+        for item in items:
+            item["front_ocr_text"], item["back_ocr_text"] = texts.get(item["id"], (None, None))
+    if "renditions" in fields:
+        for item in items:
+            item["renditions"] = image_renditions(item["id"], item["front_image_path"], item["back_image_path"])
+    return [{f: item[f] for f in fields} for item in items]
+
+def get_cards_projection(db: Session, fields: Sequence[str]) -> List[Dict]:
+    """只 SELECT 指定欄位的名片列表"""
+    rows = _projection_query(db, fields).order_by(CardORM.created_at.desc()).all()
+    return _project_rows(db, fields, rows)
+
+def get_card_projection(db: Session, card_id: int, fields: Sequence[str]) -> Optional[Dict]:
+    """只 SELECT 指定欄位的單張名片"""
+    row = _projection_query(db, fields).filter(CardORM.id == card_id).first()
+    return _project_rows(db, fields, [row])[0] if row else None
+
+def _version_stamp(value: Optional[datetime.datetime]) -> str:
+    return value.isoformat() if value else "0"
+
+def card_etag(card_id: int, updated_at: Optional[datetime.datetime], variant: str = "") -> str:
+    """由名片 id 與 updated_at 產生強 ETag；variant 區分不同的欄位投影"""
+    tag = f"{card_id}-{_version_stamp(updated_at)}"
+    if variant:
+        tag += "-" + hashlib.md5(variant.encode()).hexdigest()[:8]
+    return f'"{hashlib.md5(tag.encode()).hexdigest()}"'
+
+def etag_matches(header: Optional[str], etag: str, weak: bool = True) -> bool:
+    """比對 If-None-Match（弱比對）或 If-Match（強比對）標頭"""
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+def get_card_etag(db: Session, card_id: int, variant: str = "") -> Optional[str]:
+    """只查詢版本欄位計算 ETag，名片不存在時回傳 None"""
+    row = db.query(CardORM.updated_at, CardORM.created_at).filter(CardORM.id == card_id).first()
+    if not row:
+        return None
+    return card_etag(card_id, row.updated_at or row.created_at, variant)
+
+def get_collection_etag(db: Session, variant: str = "") -> str:
+    """名片集合的版本：任何新增、修改、刪除都會改變 ETag"""
+    count, max_id, max_updated = db.query(
+        func.count(CardORM.id), func.max(CardORM.id), func.max(CardORM.updated_at)
+    ).one()
+    tag = f"{current_cursor(db)}-{count}-{max_id}-{_version_stamp(max_updated)}-{variant}"
+    return f'"{hashlib.md5(tag.encode()).hexdigest()}"'
 
 def get_card(db: Session, card_id: int) -> Card:
     card = db.query(CardORM).filter(CardORM.id == card_id).first()
-    return Card.model_validate(card) if card else None
+    return _to_cards(db, [card])[0] if card else None
+
+def _load_cache_entry(db: Session, card_id: int) -> Optional[CachedCard]:
+    card = get_card(db, card_id)
+    if not card:
+        return None
+    return CachedCard(
+        card=card,
+        etag=card_etag(card.id, card.updated_at or card.created_at),
+        body=card.model_dump_json().encode(),
+    )
+
+def get_cached_card_entry(db: Session, card_id: int) -> Optional[CachedCard]:
+    """經由讀穿式快取取得名片（含 ETag 與序列化後的 JSON）"""
+    return card_cache.get(db, card_id, _load_cache_entry)
+
+def get_card_cached(db: Session, card_id: int) -> Optional[Card]:
+    entry = get_cached_card_entry(db, card_id)
+    return entry.card.model_copy() if entry else None
 
 def create_card(db: Session, card: Card) -> Card:
-    db_card = CardORM(**card.model_dump(exclude_unset=True))
+    card_data = card.model_dump(exclude_unset=True, exclude={'renditions'})
+    front_ocr_text = card_data.pop('front_ocr_text', None)
+    back_ocr_text = card_data.pop('back_ocr_text', None)
+    db_card = CardORM(**card_data)
     db.add(db_card)
+    db.flush()
+    save_ocr_texts(db, db_card.id, front_ocr_text, back_ocr_text)
+    retain_images(db, _image_paths(db_card))
+    image_hashes = ensure_image_hashes(db, _image_paths(db_card))
+    record_change(db, db_card.id, "insert")
     db.commit()
     db.refresh(db_card)
-    return Card.model_validate(db_card)
+    dedup_index.add(db_card)
+    phash_index.set_card(db_card.id, *image_hashes)
+    created = Card.model_validate(db_card)
+    created.front_ocr_text, created.back_ocr_text = front_ocr_text or None, back_ocr_text or None
+    return created
+
+def bulk_insert_cards(db: Session, cards: List[Dict]) -> List[int]:
+    """
+    批次新增名片（一次 executemany 寫入並提交），供大量匯入使用
+
+    每筆為名片欄位字典，可含 front_ocr_text / back_ocr_text；
+    與 create_card 相同會寫入 OCR 文字、圖片雜湊、變更紀錄，並更新重複偵測索引、
+    圖片相似索引與名片快取。整批在同一交易中，失敗時全部回滾並 raise。
+    """
+    if not cards:
+        return []
+    now = datetime.datetime.utcnow()
+    columns = [column.name for column in CardORM.__table__.columns if column.name != "id"]
+    values, ocr_texts = [], []
+    for data in cards:
+        row = {column: data.get(column) for column in columns}
+        row["created_at"] = row["created_at"] or now
+        row["updated_at"] = row["updated_at"] or row["created_at"]
+        values.append(row)
+        ocr_texts.append((data.get("front_ocr_text"), data.get("back_ocr_text")))
 
-def update_card(db: Session, card_id: int, card: Card) -> Card:
+    try:
+        card_ids = db.execute(
+            insert(CardORM).returning(CardORM.id, sort_by_parameter_order=True), values
+        ).scalars().all()
+        for card_id, (front, back) in zip(card_ids, ocr_texts):
+            if front or back:
+                save_ocr_texts(db, card_id, front, back)
+        retain_images(db, [row[column] for row in values for column in ("front_image_path", "back_image_path")])
+        image_hashes = [
+            ensure_image_hashes(db, [row["front_image_path"], row["back_image_path"]]) for row in values
+        ]
+        db.execute(insert(CardChangeORM), [{"card_id": card_id, "op": "insert"} for card_id in card_ids])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"批次新增名片錯誤: {e}")
+        raise
+    # SQLite 可能重用已刪除名片的 id，快取中不得留有舊內容
+    card_cache.invalidate(card_ids)
+    for card_id, row, hashes in zip(card_ids, values, image_hashes):
+        dedup_index.add(SimpleNamespace(id=card_id, **row))
+        if any(value is not None for value in hashes):
+            phash_index.set_card(card_id, *hashes)
+    return card_ids
+
+def update_card(db: Session, card_id: int, card: Card, if_match: Optional[str] = None) -> Card:
+    """
+    更新名片
+
+    if_match 為 If-Match 標頭：與資料庫中目前版本的 ETag（強比對）不符，
+    或比對後到寫入前被其他請求修改時 raise CardConflictError
+    """
     db_card = db.query(CardORM).filter(CardORM.id == card_id).first()
     if not db_card:
         return None
+
+    if if_match:
+        # 樂觀鎖：版本與 ETag 相同，取 coalesce(updated_at, created_at)（舊資料的 updated_at 可能為 NULL）；
+        # 以原始字串比對版本，再以條件式 UPDATE 搶先取得寫入鎖並確認版本未被修改
+        stored_version = db.query(literal_column("coalesce(updated_at, created_at)")).filter(
+            CardORM.id == card_id).scalar()
+        current_etag = card_etag(card_id, db_card.updated_at or db_card.created_at)
+        matched = etag_matches(if_match, current_etag, weak=False) and db.execute(
+            update(CardORM)
+            .where(CardORM.id == card_id, text("coalesce(updated_at, created_at) IS :version").bindparams(
+                version=stored_version))
+            .values(updated_at=datetime.datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        ).rowcount > 0
+        if not matched:
+            db.rollback()
+            card_cache.invalidate([card_id])
+            raise CardConflictError("名片已被其他人修改，請重新載入後再編輯")
     
     # 獲取要更新的數據，排除 None 值和 id 字段
-    update_data = card.model_dump(exclude_unset=True, exclude={'id'})
+    update_data = card.model_dump(exclude_unset=True, exclude={'id', 'renditions'})
+    old_image_paths = _image_paths(db_card)
     
     for k, v in update_data.items():
         if hasattr(db_card, k):
             setattr(db_card, k, v)
     
+    # OCR原始文字存放於 card_ocr_texts，僅有文字變更時也要更新 updated_at
+    if save_ocr_texts(
+        db, card_id,
+        front=update_data.get('front_ocr_text', UNCHANGED),
+        back=update_data.get('back_ocr_text', UNCHANGED),
+    ):
+        db_card.updated_at = datetime.datetime.utcnow()
+    update_image_refs(db, old_image_paths, _image_paths(db_card))
+    image_hashes = ensure_image_hashes(db, _image_paths(db_card))
+    record_change(db, card_id, "update")
+    
     try:
         db.commit()
         db.refresh(db_card)
-        return Card.model_validate(db_card)
+        card_cache.invalidate([card_id])
+        dedup_index.add(db_card)
+        phash_index.set_card(card_id, *image_hashes)
+        return _to_cards(db, [db_card])[0]
     except Exception as e:
         db.rollback()
-        print(f"更新名片錯誤: {e}")
+        logger.error(f"更新名片錯誤: {e}")
         raise e
 
 def delete_card(db: Session, card_id: int) -> bool:
@@ -43,9 +289,116 @@ def delete_card(db: Session, card_id: int) -> bool:
         return False
     try:
         db.delete(db_card)
+        delete_ocr_texts(db, [card_id])
+        release_images(db, _image_paths(db_card))
+        record_change(db, card_id, "delete")
         db.commit()
+        card_cache.invalidate([card_id])
+        dedup_index.remove(card_id)
+        phash_index.remove_card(card_id)
         return True
     except Exception as e:
         db.rollback()
-        print(f"刪除名片錯誤: {e}")
-        return False 
\ No newline at end of file
+        logger.error(f"刪除名片錯誤: {e}")
+        return False 
+
+def merge_cards(db: Session, target_id: int, source_ids: List[int]) -> Card:
+    """
+    合併重複名片：來源名片的非空欄位補進目標名片的空白欄位，
+    合併完成後刪除來源名片
+    """
+    target = db.query(CardORM).filter(CardORM.id == target_id).first()
+    if not target:
+        return None
+    sources = (
+        db.query(CardORM)
+        .filter(CardORM.id.in_([i for i in source_ids if i != target_id]))
+        .order_by(CardORM.updated_at.desc())
+        .all()
+    )
+
+    old_image_paths = _image_paths(target) + [path for source in sources for path in _image_paths(source)]
+
+    # 系統欄位不參與合併
+    skip_fields = {'id', 'created_at', 'updated_at'}
+    for field in Card.model_fields:
+        if field in skip_fields or not hasattr(target, field):
+            continue
+        if getattr(target, field):
+            continue
+        for source in sources:
+            value = getattr(source, field, None)
+            if value:
+                setattr(target, field, value)
+                break
+
+    try:
+        merged_ids = [source.id for source in sources]
+        for source in sources:
+            db.delete(source)
+            record_change(db, source.id, "delete")
+        delete_ocr_texts(db, merged_ids)
+        update_image_refs(db, old_image_paths, _image_paths(target))
+        image_hashes = ensure_image_hashes(db, _image_paths(target))
+        record_change(db, target_id, "update")
+        db.commit()
+        db.refresh(target)
+        card_cache.invalidate([target_id, *merged_ids])
+        for source_id in merged_ids:
+            dedup_index.remove(source_id)
+            phash_index.remove_card(source_id)
+        dedup_index.add(target)
+        phash_index.set_card(target_id, *image_hashes)
+        return _to_cards(db, [target])[0]
+    except Exception as e:
+        db.rollback()
+        logger.error(f"合併名片錯誤: {e}")
+        raise e
+
+def get_card_changes(db: Session, since: int = 0, limit: int = 500, fields: Optional[Sequence[str]] = None,
+                     include_ocr_text: bool = False) -> Dict:
+    """
+    增量同步：回傳 since 之後變更的名片
+    
+    同一頁內同一張名片只回傳最新狀態；刪除以 tombstone 表示。
+    與名片列表相同，完整名片只在 include_ocr_text 時附上 OCR 原始文字。
+    首次同步（since=0）或游標早於已清除的 tombstone 時回傳 reset=True，
+    客戶端需以名片列表全量同步，並以回傳的 cursor 作為新起點。
+    """
+    if since == 0 or since < tombstone_horizon(db):
+        return {"reset": True, "cursor": current_cursor(db), "has_more": False, "changes": []}
+
+    rows = fetch_changes(db, since, limit)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if not rows:
+        return {"reset": False, "cursor": since, "has_more": False, "changes": []}
+
+    latest: Dict[int, CardChangeORM] = {}
+    for row in rows:
+        latest[row.card_id] = row
+
+    live_ids = [card_id for card_id, row in latest.items() if row.op != "delete"]
+    cards: Dict[int, object] = {}
+    if live_ids:
+        if fields:
+            projected = _projection_query(db, fields).filter(CardORM.id.in_(live_ids)).all()
+            for item in _project_rows(db, fields, projected):
+                cards[item["id"]] = item
+        else:
+            live_cards = db.query(CardORM).filter(CardORM.id.in_(live_ids)).all()
+            for card in _to_cards(db, live_cards, include_ocr_text):
+                cards[card.id] = card
+
+    changes = []
+    for change in sorted(latest.values(), key=lambda c: c.seq):
+        card = cards.get(change.card_id)
+        # 名片在變更紀錄之後已被刪除，視為 tombstone（刪除紀錄會出現在後續頁面）
+        op = "delete" if change.op == "delete" or card is None else "upsert"
+        changes.append({
+            "seq": change.seq,
+            "op": op,
+            "card_id": change.card_id,
+            "card": card if op == "upsert" else None,
+        })
+    return {"reset": False, "cursor": rows[-1].seq, "has_more": has_more, "changes": changes}
@@ -0,0 +1,326 @@
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.card import CardORM
+from backend.services.sync_service import ChangeFollower
+
+# 公司名稱常見後綴，比對前移除
+_COMPANY_SUFFIXES = (
+    "股份有限公司", "有限公司", "股份公司", "公司", "集團",
+    "co.,ltd.", "co.,ltd", "co.ltd", "co.", "ltd.", "ltd", "inc.", "inc",
+    "corp.", "corp", "corporation", "company", "limited",
+)
+_NON_WORD = re.compile(r"[\s\-_.,，。·・()（）]+")
+
+# 建索引時需要的欄位（只取這幾欄，避免載入整列）
+_INDEX_COLUMNS = (
+    CardORM.id, CardORM.name, CardORM.name_en, CardORM.company_name,
+    CardORM.company_name_en, CardORM.email, CardORM.mobile_phone,
+)
+
+# 其他 worker 修改的名片超過此數量時直接重建索引
+MAX_REPLAY_CARDS = 5000
+
+
+@dataclass(frozen=True)
+class CardFingerprint:
+    """名片比對用的標準化資料"""
+    name: str
+    company: str
+    email: str
+    mobile: str
+
+
+def normalize_text(value: Optional[str]) -> str:
+    """全半形統一、轉小寫並移除空白與標點"""
+    if not value:
+        return ""
+    value = unicodedata.normalize("NFKC", value).lower()
+    return _NON_WORD.sub("", value)
+
+
+def normalize_email(value: Optional[str]) -> str:
+    """Email 轉小寫並去除空白"""
+    if not value:
+        return ""
+    return unicodedata.normalize("NFKC", value).strip().lower()
+
+
+def normalize_mobile(value: Optional[str]) -> str:
+    """手機號碼只保留數字，+886 開頭轉為 0 開頭"""
+    if not value:
+        return ""
+    digits = re.sub(r"\D", "", unicodedata.normalize("NFKC", value))
+    if digits.startswith("886"):
+        digits = "0" + digits[3:]
+    return digits if len(digits) >= 8 else ""
+
+
+def normalize_company(value: Optional[str]) -> str:
+    """公司名稱標準化並移除常見後綴"""
+    company = normalize_text(value)
+    for suffix in _COMPANY_SUFFIXES:
+        key = _NON_WORD.sub("", suffix)
+        if company.endswith(key) and len(company) > len(key):
+            company = company[: -len(key)]
+            break
+    return company
+
+
+def fingerprint(card) -> CardFingerprint:
+    """由 CardORM / Card / 查詢結果列建立比對指紋"""
+    return CardFingerprint(
+        name=normalize_text(card.name or card.name_en),
+        company=normalize_company(card.company_name or card.company_name_en),
+        email=normalize_email(card.email),
+        mobile=normalize_mobile(card.mobile_phone),
+    )
+
+
+def blocking_keys(fp: CardFingerprint) -> Set[str]:
+    """產生分塊鍵：只有共用至少一個鍵的名片才會被比對"""
+    keys = set()
+    if fp.email:
+        keys.add(f"e:{fp.email}")
+    if fp.mobile:
+        keys.add(f"m:{fp.mobile[-9:]}")
+    if fp.name:
+        # 公司 + 姓名字元雙連詞（shingle），容忍姓名中個別 OCR 錯字
+        name = fp.name if len(fp.name) > 1 else fp.name + "$"
+        for i in range(len(name) - 1):
+            keys.add(f"n:{fp.company}:{name[i:i + 2]}")
+    return keys
+
+
+def _similarity(a: str, b: str) -> float:
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    return SequenceMatcher(None, a, b).ratio()
+
+
+def score_pair(a: CardFingerprint, b: CardFingerprint, min_score: float = 0.0) -> float:
+    """計算兩張名片的相似度（0~1），只計入雙方都有值的欄位
+
+    先計算 email / 手機的精確比對，若加上姓名與公司滿分仍達不到
+    min_score，就不再做較昂貴的字串相似度計算。
+    """
+    total_weight = 0.0
+    exact = 0.0
+    if a.email and b.email:
+        total_weight += 0.35
+        exact += 0.35 if a.email == b.email else 0.0
+    if a.mobile and b.mobile:
+        total_weight += 0.35
+        exact += 0.35 if a.mobile[-9:] == b.mobile[-9:] else 0.0
+    has_name = bool(a.name and b.name)
+    has_company = bool(a.company and b.company)
+    fuzzy_weight = (0.2 if has_name else 0.0) + (0.1 if has_company else 0.0)
+    total_weight += fuzzy_weight
+    if total_weight == 0:
+        return 0.0
+    if (exact + fuzzy_weight) / total_weight < min_score:
+        return 0.0
+
+    score = exact
+    if has_name:
+        score += 0.2 * _similarity(a.name, b.name)
+    if has_company:
+        score += 0.1 * _similarity(a.company, b.company)
+    score /= total_weight
+    # 僅靠公司名稱相同不足以判定重複
+    if total_weight == 0.1:
+        score = min(score, 0.5)
+    return score
+
+
+class DuplicateIndex:
+    """名片重複偵測索引
+
+    以 blocking key 建立倒排索引，只比對共用鍵的候選名片，
+    避免 O(n²) 全量兩兩比對。索引在第一次使用時由資料庫串流建立，
+    之後本程序的寫入透過 add / remove 增量維護；其他 worker 的寫入
+    在每次使用前依 card_changes 重新載入被修改的名片。
+    """
+
+    def __init__(self, max_block_size: int = None, min_score: float = None):
+        self.max_block_size = max_block_size or settings.DEDUP_MAX_BLOCK_SIZE
+        self.min_score = min_score if min_score is not None else settings.DEDUP_MIN_SCORE
+        self._lock = threading.RLock()
+        self._fingerprints: Dict[int, CardFingerprint] = {}
+        self._blocks: Dict[str, Set[int]] = defaultdict(set)
+        self._built = False
+        self._changes = ChangeFollower(max_cards=MAX_REPLAY_CARDS)
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def refresh(self, db: Session, batch_size: int = 5000):
+        """使用索引前呼叫：第一次使用時由資料庫建立索引，之後追上其他 worker 的修改"""
+        with self._lock:
+            if self._built:
+                card_ids = self._changes.poll(db)
+                if card_ids is not None:
+                    self._reload(db, card_ids)
+                    return
+                self._fingerprints.clear()
+                self._blocks.clear()
+            # 先記下游標再載入，載入期間的修改會在下次 refresh 時重新載入
+            self._changes.mark(db)
+            for row in db.query(*_INDEX_COLUMNS).execution_options(yield_per=batch_size):
+                self._add(row.id, fingerprint(row))
+            self._built = True
+
+    def _reload(self, db: Session, card_ids: List[int]):
+        """由資料庫重新載入指定名片，已刪除的名片移出索引"""
+        for start in range(0, len(card_ids), 500):
+            chunk = card_ids[start:start + 500]
+            for card_id in chunk:
+                self._remove(card_id)
+            for row in db.query(*_INDEX_COLUMNS).filter(CardORM.id.in_(chunk)):
+                self._add(row.id, fingerprint(row))
+
+    def reset(self):
+        """清空索引，下次使用時重建"""
+        with self._lock:
+            self._fingerprints.clear()
+            self._blocks.clear()
+            self._built = False
+
+    def add(self, card):
+        """新增或更新一張名片（索引尚未建立時略過，建立時會一併載入）"""
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(card.id)
+            self._add(card.id, fingerprint(card))
+
+    def remove(self, card_id: int):
+        if not self._built:
+            return
+        with self._lock:
+            self._remove(card_id)
+
+    def _add(self, card_id: int, fp: CardFingerprint):
+        self._fingerprints[card_id] = fp
+        for key in blocking_keys(fp):
+            self._blocks[key].add(card_id)
+
+    def _remove(self, card_id: int):
+        fp = self._fingerprints.pop(card_id, None)
+        if fp is None:
+            return
+        for key in blocking_keys(fp):
+            block = self._blocks.get(key)
+            if block is not None:
+                block.discard(card_id)
+                if not block:
+                    del self._blocks[key]
+
+    def _candidates(self, card_id: int, fp: CardFingerprint) -> Set[int]:
+        candidates = set()
+        for key in blocking_keys(fp):
+            block = self._blocks.get(key)
+            # 過大的區塊（例如常見姓氏）資訊量太低，直接略過
+            if block and len(block) <= self.max_block_size:
+                candidates.update(block)
+        candidates.discard(card_id)
+        return candidates
+
+    def find_similar(self, card_id: int, limit: int = 20) -> List[Tuple[int, float]]:
+        """找出與指定名片可能重複的名片"""
+        with self._lock:
+            fp = self._fingerprints.get(card_id)
+            if fp is None:
+                return []
+            scored = []
+            for other_id in self._candidates(card_id, fp):
+                score = score_pair(fp, self._fingerprints[other_id], self.min_score)
+                if score >= self.min_score:
+                    scored.append((other_id, score))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def find_matches(self, card, limit: int = 1) -> List[Tuple[int, float]]:
+        """找出與一筆尚未存入的名片資料可能重複的名片"""
+        fp = fingerprint(card)
+        with self._lock:
+            scored = []
+            for other_id in self._candidates(None, fp):
+                score = score_pair(fp, self._fingerprints[other_id], self.min_score)
+                if score >= self.min_score:
+                    scored.append((other_id, score))
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+    def find_duplicates(self, limit: int = 100) -> List[Dict]:
+        """找出所有重複群組（以 union-find 將候選配對合併為群組）"""
+        with self._lock:
+            seen_pairs = set()
+            pairs = []
+            for block in self._blocks.values():
+                if len(block) < 2 or len(block) > self.max_block_size:
+                    continue
+                members = sorted(block)
+                for i, a in enumerate(members):
+                    fp_a = self._fingerprints[a]
+                    for b in members[i + 1:]:
+                        if (a, b) in seen_pairs:
+                            continue
+                        seen_pairs.add((a, b))
+                        score = score_pair(fp_a, self._fingerprints[b], self.min_score)
+                        if score >= self.min_score:
+                            pairs.append((a, b, score))
+
+        parent: Dict[int, int] = {}
+
+        def find(x: int) -> int:
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b, _ in pairs:
+            root_a, root_b = find(a), find(b)
+            if root_a != root_b:
+                parent[max(root_a, root_b)] = min(root_a, root_b)
+
+        groups: Dict[int, Dict] = {}
+        for a, b, score in pairs:
+            root = find(a)
+            group = groups.setdefault(root, {"card_ids": set(), "pairs": []})
+            group["card_ids"].update((a, b))
+            group["pairs"].append({"card_id": a, "duplicate_id": b, "score": round(score, 3)})
+
+        result = []
+        for group in groups.values():
+            group["pairs"].sort(key=lambda p: -p["score"])
+            result.append({
+                "card_ids": sorted(group["card_ids"]),
+                "max_score": group["pairs"][0]["score"],
+                "pairs": group["pairs"],
+            })
+        result.sort(key=lambda g: (-g["max_score"], g["card_ids"][0]))
+        return result[:limit]
+
+
+def new_local_index() -> DuplicateIndex:
+    """建立獨立的空索引（例如匯入時比對同一檔案內尚未寫入的資料）"""
+    index = DuplicateIndex()
+    index._built = True
+    return index
+
+
+# 全域索引實例（每個 worker 一份）
+dedup_index = DuplicateIndex()
@@ -0,0 +1,270 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.card import CardORM
+from backend.services.card_service import get_collection_etag
+from backend.services.export_service import (
+    resolve_export_columns, stream_csv, write_excel, stream_vcard, stream_zip, write_parquet, write_arrow,
+    VCARD_VERSIONS, COLUMNAR_FORMATS, COLUMNAR_DEFAULT_FIELDS
+)
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# 進度寫回磁碟的最短間隔（秒）
+_PROGRESS_FLUSH_SECONDS = 0.5
+
+
+def _write_stream(stream) -> Callable[[str], None]:
+    def write(path: str):
+        with open(path, "wb") as f:
+            for chunk in stream:
+                f.write(chunk)
+    return write
+
+
+def _csv_writer(options: Dict, progress) -> Callable[[str], None]:
+    return _write_stream(stream_csv(options["columns"], progress=progress))
+
+
+def _excel_writer(options: Dict, progress) -> Callable[[str], None]:
+    return lambda path: write_excel(path, options["columns"], progress=progress)
+
+
+def _vcard_writer(options: Dict, progress) -> Callable[[str], None]:
+    return _write_stream(stream_vcard(options["vcard_version"], options["photos"], progress=progress))
+
+
+def _zip_writer(options: Dict, progress) -> Callable[[str], None]:
+    return _write_stream(stream_zip(options["columns"], options["images"], progress=progress))
+
+
+def _parquet_writer(options: Dict, progress) -> Callable[[str], None]:
+    return lambda path: write_parquet(path, options["columns"], progress=progress)
+
+
+def _arrow_writer(options: Dict, progress) -> Callable[[str], None]:
+    return lambda path: write_arrow(path, options["columns"], progress=progress)
+
+
+@dataclass
+class ExportFormat:
+    extension: str
+    media_type: str
+    writer: Callable[[Dict, Callable[[int], None]], Callable[[str], None]]
+
+
+# 匯出格式註冊表：writer(options, progress) 回傳「寫入指定路徑」的函式
+EXPORT_FORMATS: Dict[str, ExportFormat] = {
+    "csv": ExportFormat("csv", "text/csv; charset=utf-8", _csv_writer),
+    "excel": ExportFormat("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", _excel_writer),
+    "vcard": ExportFormat("vcf", "text/vcard; charset=utf-8", _vcard_writer),
+    "zip": ExportFormat("zip", "application/zip", _zip_writer),
+    "parquet": ExportFormat("parquet", "application/vnd.apache.parquet", _parquet_writer),
+    "arrow": ExportFormat("arrows", "application/vnd.apache.arrow.stream", _arrow_writer),
+}
+
+
+def normalize_options(format: str, columns: Optional[str] = None, vcard_version: str = "3.0",
+                      photos: bool = False, images: bool = True) -> Dict:
+    """
+    整理匯出選項（只保留影響輸出內容的選項，作為快取鍵的一部分）
+
+    Raises:
+        ValueError: 格式或選項不正確
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"不支援的匯出格式: {format}")
+    if format == "vcard":
+        if vcard_version not in VCARD_VERSIONS:
+            raise ValueError(f"不支援的 vCard 版本: {vcard_version}")
+        return {"vcard_version": vcard_version, "photos": bool(photos)}
+    if format == "zip":
+        return {"columns": resolve_export_columns(columns), "images": bool(images)}
+    if format in COLUMNAR_FORMATS:
+        return {"columns": resolve_export_columns(columns, default=COLUMNAR_DEFAULT_FIELDS)}
+    return {"columns": resolve_export_columns(columns)}
+
+
+@dataclass
+class ExportJob:
+    id: str
+    format: str
+    options: Dict
+    cache_key: str
+    status: str = JOB_PENDING
+    processed: int = 0
+    total: int = 0
+    cached: bool = False
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def filename(self) -> str:
+        return f"cards.{EXPORT_FORMATS[self.format].extension}"
+
+    @property
+    def media_type(self) -> str:
+        return EXPORT_FORMATS[self.format].media_type
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["progress"] = round(self.processed / self.total, 4) if self.total else (1.0 if self.status == JOB_DONE else 0.0)
+        data["filename"] = self.filename
+        return data
+
+
+class ExportJobManager:
+    """
+    背景匯出工作
+
+    產出檔以「格式 + 選項 + 資料版本」為快取鍵存放在 EXPORT_DIR，資料沒有變更時
+    相同的匯出直接沿用既有檔案。工作狀態同時寫成 JSON 檔，多個 worker 都能查詢。
+    """
+
+    def __init__(self, export_dir: str = None, workers: int = None, ttl_hours: float = None):
+        self.export_dir = export_dir or settings.EXPORT_DIR
+        self.workers = workers or settings.EXPORT_WORKERS
+        self.ttl = (ttl_hours if ttl_hours is not None else settings.EXPORT_ARTIFACT_TTL_HOURS) * 3600
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, ExportJob] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    # ---- 路徑 ----
+
+    def _jobs_dir(self) -> str:
+        path = os.path.join(self.export_dir, "jobs")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def _job_path(self, job_id: str) -> str:
+        return os.path.join(self._jobs_dir(), f"{job_id}.json")
+
+    def artifact_path(self, job: ExportJob) -> str:
+        return os.path.join(self.export_dir, f"{job.cache_key}.{EXPORT_FORMATS[job.format].extension}")
+
+    def _save(self, job: ExportJob):
+        path = self._job_path(job.id)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(job), f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    # ---- 工作 ----
+
+    def submit(self, db: Session, format: str, options: Dict) -> ExportJob:
+        """建立匯出工作；已有相同內容的檔案或執行中的工作時直接沿用"""
+        version = get_collection_etag(db, variant=f"export-{format}")
+        key_source = json.dumps({"format": format, "options": options, "version": version}, sort_keys=True)
+        cache_key = hashlib.sha256(key_source.encode()).hexdigest()[:32]
+        job = ExportJob(id=uuid.uuid4().hex, format=format, options=options, cache_key=cache_key,
+                        total=db.query(func.count(CardORM.id)).scalar() or 0)
+        os.makedirs(self.export_dir, exist_ok=True)
+        self.prune()
+
+        with self._lock:
+            for existing in self._jobs.values():
+                if existing.cache_key == cache_key and existing.status in (JOB_PENDING, JOB_RUNNING):
+                    return existing
+            if os.path.exists(self.artifact_path(job)):
+                # 更新時間戳，保留期限從最後一次使用起算
+                os.utime(self.artifact_path(job))
+                job.status = JOB_DONE
+                job.processed = job.total
+                job.cached = True
+                job.finished_at = time.time()
+                self._jobs[job.id] = job
+                self._save(job)
+                return job
+            self._jobs[job.id] = job
+            self._save(job)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="export")
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def _run(self, job: ExportJob):
+        job.status = JOB_RUNNING
+        self._save(job)
+        last_flush = time.monotonic()
+
+        def progress(processed: int):
+            nonlocal last_flush
+            job.processed = processed
+            if time.monotonic() - last_flush >= _PROGRESS_FLUSH_SECONDS:
+                last_flush = time.monotonic()
+                self._save(job)
+
+        path = self.artifact_path(job)
+        tmp_path = f"{path}.{job.id}.tmp"
+        started = time.monotonic()
+        try:
+            EXPORT_FORMATS[job.format].writer(job.options, progress)(tmp_path)
+            os.replace(tmp_path, path)
+            job.status = JOB_DONE
+            job.total = max(job.total, job.processed)
+            logger.info(f"匯出工作 {job.id} 完成（{job.format}，{job.processed} 筆，{time.monotonic() - started:.1f} 秒）")
+        except Exception as e:
+            job.status = JOB_FAILED
+            job.error = str(e)
+            logger.error(f"匯出工作 {job.id} 失敗: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        job.finished_at = time.time()
+        self._save(job)
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        """查詢工作（其他 worker 建立的工作從 JSON 檔讀取）"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        if not all(c in "0123456789abcdef" for c in job_id):
+            return None
+        try:
+            with open(self._job_path(job_id), encoding="utf-8") as f:
+                return ExportJob(**json.load(f))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def prune(self):
+        """清除超過保留期限的產出檔與工作紀錄"""
+        if not os.path.isdir(self.export_dir):
+            return
+        cutoff = time.time() - self.ttl
+        for directory in (self.export_dir, os.path.join(self.export_dir, "jobs")):
+            if not os.path.isdir(directory):
+                continue
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file() and entry.stat().st_mtime < cutoff:
+                            os.remove(entry.path)
+                    except OSError:
+                        pass
+        with self._lock:
+            for job_id in [j.id for j in self._jobs.values()
+                           if j.finished_at and j.finished_at < cutoff]:
+                del self._jobs[job_id]
+
+
+# 全域匯出工作管理器
+export_jobs = ExportJobManager()
@@ -0,0 +1,667 @@
+import base64
+import codecs
+import csv
+import datetime
+import io
+import itertools
+import logging
+import os
+import tempfile
+import time
+import unicodedata
+import zipfile
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+from backend.core.config import settings
+from backend.models.db import SessionLocal
+from backend.models.card import CardORM
+
+logger = logging.getLogger(__name__)
+
+# 匯出欄位（順序即輸出順序）與中文標題，預設匯出全部名片資料欄位
+EXPORT_COLUMNS = {
+    "name": "姓名",
+    "name_en": "英文姓名",
+    "company_name": "公司名稱",
+    "company_name_en": "英文公司名稱",
+    "position": "職位",
+    "position_en": "英文職位",
+    "department1": "部門1",
+    "department1_en": "部門1(英文)",
+    "department2": "部門2",
+    "department2_en": "部門2(英文)",
+    "department3": "部門3",
+    "department3_en": "部門3(英文)",
+    "mobile_phone": "手機",
+    "company_phone1": "公司電話1",
+    "company_phone2": "公司電話2",
+    "email": "Email",
+    "line_id": "Line ID",
+    "company_address1": "公司地址一",
+    "company_address1_en": "公司地址一(英文)",
+    "company_address2": "公司地址二",
+    "company_address2_en": "公司地址二(英文)",
+    "note1": "備註1",
+    "note2": "備註2",
+}
+
+# 可額外指定的系統欄位（不在預設匯出內）
+EXTRA_EXPORT_COLUMNS = {
+    "id": "ID",
+    "front_image_path": "正面圖片",
+    "back_image_path": "反面圖片",
+    "created_at": "建立時間",
+    "updated_at": "更新時間",
+}
+
+DEFAULT_EXPORT_FIELDS = tuple(EXPORT_COLUMNS)
+
+# 每次查詢的筆數；批次之間結束讀取交易，長時間匯出不會一直鎖住 SQLite
+EXPORT_BATCH_SIZE = 1000
+# 累積到此大小才送出一段輸出
+EXPORT_CHUNK_SIZE = 64 * 1024
+# Excel 欄寬依前 N 筆資料估算（write-only 模式必須在寫入資料前設定欄寬）
+EXCEL_WIDTH_SAMPLE_ROWS = 500
+EXCEL_MAX_COLUMN_WIDTH = 50
+
+
+def resolve_export_columns(columns: Optional[str], default: Iterable[str] = DEFAULT_EXPORT_FIELDS) -> List[str]:
+    """
+    解析逗號分隔的匯出欄位
+
+    Raises:
+        ValueError: 含有未知欄位
+    """
+    if not columns:
+        return list(default)
+    requested = [c.strip() for c in columns.split(",") if c.strip()]
+    unknown = [c for c in requested if c not in EXPORT_COLUMNS and c not in EXTRA_EXPORT_COLUMNS]
+    if unknown:
+        raise ValueError(f"未知的匯出欄位: {', '.join(unknown)}")
+    if not requested:
+        raise ValueError("至少需要一個匯出欄位")
+    return list(dict.fromkeys(requested))
+
+
+def column_headers(columns: List[str]) -> List[str]:
+    return [EXPORT_COLUMNS.get(c) or EXTRA_EXPORT_COLUMNS[c] for c in columns]
+
+
+def format_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(sep=" ", timespec="seconds")
+    return str(value)
+
+
+def iter_card_batches(columns: List[str], batch_size: int = EXPORT_BATCH_SIZE,
+                      progress: Optional[Callable[[int], None]] = None) -> Iterator[List[tuple]]:
+    """
+    依 id 順序分批讀取名片欄位，每批為一個 SQL 結果區塊
+
+    使用獨立的 session（回應開始串流後請求的 session 可能已關閉），
+    以 keyset 分頁加上 yield_per 逐批取回，記憶體用量與總筆數無關；
+    批次之間結束讀取交易。progress 於每批讀完後以累計筆數呼叫。
+    """
+    entities = [getattr(CardORM, c) for c in columns]
+    db = SessionLocal()
+    try:
+        last_id = 0
+        total = 0
+        while True:
+            rows = [
+                tuple(row) for row in
+                db.query(CardORM.id, *entities)
+                .filter(CardORM.id > last_id)
+                .order_by(CardORM.id)
+                .limit(batch_size)
+                .yield_per(batch_size)
+            ]
+            db.rollback()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            total += len(rows)
+            if progress:
+                progress(total)
+            yield [row[1:] for row in rows]
+            if len(rows) < batch_size:
+                break
+    finally:
+        db.close()
+
+
+def iter_card_rows(columns: List[str], batch_size: int = EXPORT_BATCH_SIZE,
+                   progress: Optional[Callable[[int], None]] = None) -> Iterator[tuple]:
+    """依 id 順序逐筆串流讀取名片欄位"""
+    for rows in iter_card_batches(columns, batch_size, progress):
+        yield from rows
+
+
+def stream_csv(columns: List[str], batch_size: int = EXPORT_BATCH_SIZE,
+               chunk_size: int = EXPORT_CHUNK_SIZE,
+               progress: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """產生 CSV 內容（UTF-8，開頭為 BOM 讓 Excel 正確辨識中文）"""
+    yield codecs.BOM_UTF8
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(column_headers(columns))
+    count = 0
+    try:
+        for row in iter_card_rows(columns, batch_size, progress):
+            writer.writerow([format_value(value) for value in row])
+            count += 1
+            if buffer.tell() >= chunk_size:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+    except Exception as e:
+        # 回應已開始傳送，無法再改為錯誤狀態碼，只能記錄並中止
+        logger.error(f"CSV 串流匯出中斷（已輸出 {count} 筆）: {e}")
+        raise
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+    logger.info(f"CSV 匯出完成，共 {count} 筆")
+
+
+def display_width(value: str) -> int:
+    """估算顯示寬度（全形中文字算兩格）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in ("W", "F") else 1 for ch in value)
+
+
+def write_excel(path: str, columns: List[str], batch_size: int = EXPORT_BATCH_SIZE,
+                progress: Optional[Callable[[int], None]] = None) -> int:
+    """
+    以 openpyxl write-only 模式將名片寫入 xlsx 檔
+
+    資料逐列寫出、不保留儲存格物件，欄寬由前 EXCEL_WIDTH_SAMPLE_ROWS 筆估算，
+    記憶體用量與總筆數無關。
+
+    Returns:
+        int: 匯出筆數
+    """
+    import openpyxl  # 延遲載入，只有匯出 Excel 時才需要
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+    from openpyxl.utils import get_column_letter
+
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("名片資料")
+    headers = column_headers(columns)
+
+    rows = iter_card_rows(columns, batch_size, progress)
+    sample = list(itertools.islice(rows, EXCEL_WIDTH_SAMPLE_ROWS))
+    widths = [display_width(header) for header in headers]
+    for row in sample:
+        for i, value in enumerate(row):
+            if value is not None:
+                widths[i] = max(widths[i], display_width(format_value(value)))
+    for i, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(i)].width = min(width + 2, EXCEL_MAX_COLUMN_WIDTH)
+    ws.freeze_panes = "A2"
+
+    def cell(value):
+        if not isinstance(value, str):
+            return value
+        value = ILLEGAL_CHARACTERS_RE.sub("", value)
+        if value.startswith("="):
+            # 強制為文字，避免被當成公式
+            text_cell = WriteOnlyCell(ws, value=value)
+            text_cell.data_type = "s"
+            return text_cell
+        return value
+
+    ws.append(headers)
+    count = 0
+    for row in itertools.chain(sample, rows):
+        ws.append([cell(value) for value in row])
+        count += 1
+    wb.save(path)
+    logger.info(f"Excel 匯出完成，共 {count} 筆")
+    return count
+
+
+# ---- vCard ----
+
+VCARD_VERSIONS = ("3.0", "4.0")
+VCARD_COLUMNS = ["id"] + list(EXPORT_COLUMNS) + ["front_image_path", "updated_at"]
+# 內嵌照片的縮圖尺寸與 base64 分段大小（3 的倍數，各段可直接串接）
+VCARD_PHOTO_SIZE = (256, 256)
+VCARD_PHOTO_CHUNK = 3 * 1024
+
+# 常見複姓
+_COMPOUND_SURNAMES = ("歐陽", "司馬", "諸葛", "上官", "司徒", "東方", "夏侯", "皇甫", "長孫", "慕容", "張簡", "范姜")
+
+
+def _escape(value: str) -> str:
+    """vCard 文字值跳脫（RFC 6350 3.4）"""
+    return (value.replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;")
+            .replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n"))
+
+
+def _structured(*components: Optional[str]) -> str:
+    return ";".join(_escape(c or "") for c in components)
+
+
+def _fold(parts: Iterable[str]) -> Iterator[bytes]:
+    """
+    將一個內容行依 75 octet 折行（續行以空白開頭），不切斷 UTF-8 多位元組字元
+
+    內容可分段提供（例如照片的 base64），邊產生邊輸出。
+    """
+    out = bytearray()
+    width = 0
+    for part in parts:
+        if part.isascii():
+            data = part.encode("ascii")
+            while data:
+                room = 75 - width
+                if room <= 0:
+                    out += b"\r\n "
+                    width = 1
+                    room = 74
+                out += data[:room]
+                width += len(data[:room])
+                data = data[room:]
+        else:
+            for ch in part:
+                encoded = ch.encode("utf-8")
+                if width + len(encoded) > 75:
+                    out += b"\r\n "
+                    width = 1
+                out += encoded
+                width += len(encoded)
+        if len(out) >= EXPORT_CHUNK_SIZE:
+            yield bytes(out)
+            out.clear()
+    out += b"\r\n"
+    yield bytes(out)
+
+
+def _split_name(name: str, family_first: Optional[bool] = None) -> tuple:
+    """
+    拆成 (姓, 名)
+
+    - 含逗號時視為「姓, 名」
+    - 中文姓名取第一個字（或複姓）為姓
+    - 拉丁字母姓名無法從字面判斷順序（Mei-Ling Chen 與羅馬拼音的 Chen Mei-Ling 都常見），
+      family_first 為 True 時取第一個字為姓，否則取最後一個字；預設依 VCARD_LATIN_FAMILY_FIRST
+    """
+    name = name.strip()
+    if "," in name:
+        family, given = name.split(",", 1)
+        return family.strip(), given.strip()
+    if name.isascii():
+        if family_first is None:
+            family_first = settings.VCARD_LATIN_FAMILY_FIRST
+        tokens = name.split()
+        if len(tokens) < 2:
+            return "", name
+        if family_first:
+            return tokens[0], " ".join(tokens[1:])
+        return tokens[-1], " ".join(tokens[:-1])
+    if " " not in name and 2 <= len(name) <= 4:
+        surname_length = 2 if name[:2] in _COMPOUND_SURNAMES else 1
+        return name[:surname_length], name[surname_length:]
+    return name, ""
+
+
+def _photo_base64(path: Optional[str]) -> Optional[bytes]:
+    """產生名片正面的 JPEG 縮圖，圖片不存在或無法讀取時略過"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        from PIL import Image  # 延遲載入，只有內嵌照片時才需要
+
+        with Image.open(path) as image:
+            image = image.convert("RGB")
+            image.thumbnail(VCARD_PHOTO_SIZE)
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=80)
+        return buffer.getvalue()
+    except Exception as e:
+        logger.warning(f"無法產生名片照片縮圖 {path}: {e}")
+        return None
+
+
+def _iter_base64(data: bytes) -> Iterator[str]:
+    for start in range(0, len(data), VCARD_PHOTO_CHUNK):
+        yield base64.b64encode(data[start:start + VCARD_PHOTO_CHUNK]).decode("ascii")
+
+
+def _vcard_lines(card: Dict, version: str, include_photo: bool) -> Iterator[Iterable[str]]:
+    """產生單張名片的內容行（每行為可分段的字串序列）"""
+    v4 = version == "4.0"
+    yield ["BEGIN:VCARD"]
+    yield [f"VERSION:{version}"]
+    if card["id"] is not None:
+        yield [f"UID:card-{card['id']}"]
+
+    name, name_en = card["name"], card["name_en"]
+
+    def bilingual(prop: str, zh: Optional[str], en: Optional[str], value=_escape, params: str = ""):
+        """中英文版本：4.0 以 ALTID 標示為同一屬性的不同語言，3.0 只輸出中文（無中文時用英文）"""
+        if v4 and zh and en:
+            yield [f"{prop}{params};ALTID=1;LANGUAGE=zh:{value(zh)}"]
+            yield [f"{prop}{params};ALTID=1;LANGUAGE=en:{value(en)}"]
+        elif zh or en:
+            yield [f"{prop}{params}:{value(zh or en)}"]
+
+    if name or name_en:
+        yield from bilingual("FN", name, name_en)
+    else:
+        yield [f"FN:{_escape(card['company_name'] or card['company_name_en'] or '')}"]
+    yield from bilingual("N", name, name_en, value=lambda n: _structured(*_split_name(n), "", "", ""))
+    if not name and not name_en:
+        yield ["N:;;;;"]
+    if not v4 and name and name_en:
+        # 3.0 不支援同屬性多語言，英文姓名放在 NICKNAME 讓通訊錄可搜尋
+        yield [f"NICKNAME:{_escape(name_en)}"]
+
+    departments = [card[f"department{i}"] for i in (1, 2, 3)]
+    departments_en = [card[f"department{i}_en"] for i in (1, 2, 3)]
+    org_zh = [card["company_name"]] + [d for d in departments if d] if card["company_name"] or any(departments) else None
+    org_en = [card["company_name_en"]] + [d for d in departments_en if d] if card["company_name_en"] or any(departments_en) else None
+    yield from bilingual("ORG", org_zh, org_en, value=lambda org: _structured(*org))
+    yield from bilingual("TITLE", card["position"], card["position_en"])
+
+    if card["mobile_phone"]:
+        params = ';TYPE="cell,voice";VALUE=text' if v4 else ";TYPE=CELL,VOICE"
+        yield [f"TEL{params}:{_escape(card['mobile_phone'])}"]
+    for field in ("company_phone1", "company_phone2"):
+        if card[field]:
+            params = ';TYPE="work,voice";VALUE=text' if v4 else ";TYPE=WORK,VOICE"
+            yield [f"TEL{params}:{_escape(card[field])}"]
+    if card["email"]:
+        yield [f"EMAIL;TYPE={'work' if v4 else 'INTERNET,WORK'}:{_escape(card['email'])}"]
+    if card["line_id"]:
+        yield [f"X-LINE:{_escape(card['line_id'])}"]
+
+    for i in (1, 2):
+        address, address_en = card[f"company_address{i}"], card[f"company_address{i}_en"]
+        params = ";TYPE=work" if v4 else ";TYPE=WORK"
+        if v4 and address and address_en:
+            # 兩個地址各自的中英文版本需要不同的 ALTID
+            yield [f"ADR{params};ALTID={i};LANGUAGE=zh:{_structured('', '', address, '', '', '', '')}"]
+            yield [f"ADR{params};ALTID={i};LANGUAGE=en:{_structured('', '', address_en, '', '', '', '')}"]
+        else:
+            if address:
+                yield [f"ADR{params}:{_structured('', '', address, '', '', '', '')}"]
+            if address_en:
+                yield [f"ADR{params};LANGUAGE=en:{_structured('', '', address_en, '', '', '', '')}"]
+
+    notes = [n for n in (card["note1"], card["note2"]) if n]
+    if notes:
+        yield [f"NOTE:{_escape(chr(10).join(notes))}"]
+    if card["updated_at"]:
+        yield [f"REV:{card['updated_at'].strftime('%Y%m%dT%H%M%SZ')}"]
+
+    if include_photo:
+        photo = _photo_base64(card["front_image_path"])
+        if photo:
+            prefix = "PHOTO:data:image/jpeg;base64," if v4 else "PHOTO;ENCODING=b;TYPE=JPEG:"
+            yield itertools.chain([prefix], _iter_base64(photo))
+    yield ["END:VCARD"]
+
+
+def stream_vcard(version: str = "3.0", include_photos: bool = False,
+                 batch_size: int = EXPORT_BATCH_SIZE,
+                 progress: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    產生 vCard 3.0/4.0 內容（UTF-8、CRLF、75 octet 折行）
+
+    逐張名片產生、分段輸出；內嵌照片時一次只在記憶體中保留一張縮圖。
+    """
+    if version not in VCARD_VERSIONS:
+        raise ValueError(f"不支援的 vCard 版本: {version}")
+    buffer = bytearray()
+    count = 0
+    try:
+        for row in iter_card_rows(VCARD_COLUMNS, batch_size, progress):
+            card = dict(zip(VCARD_COLUMNS, row))
+            for line in _vcard_lines(card, version, include_photos):
+                for piece in _fold(line):
+                    buffer += piece
+                    if len(buffer) >= EXPORT_CHUNK_SIZE:
+                        yield bytes(buffer)
+                        buffer.clear()
+            count += 1
+    except Exception as e:
+        logger.error(f"vCard 串流匯出中斷（已輸出 {count} 筆）: {e}")
+        raise
+    if buffer:
+        yield bytes(buffer)
+    logger.info(f"vCard 匯出完成，共 {count} 筆")
+
+
+# ---- ZIP（名片資料 + 圖片）----
+
+ZIP_COLUMNS = ["id"] + list(EXPORT_COLUMNS) + ["front_image_path", "back_image_path", "created_at", "updated_at"]
+ZIP_MANIFEST_NAME = "manifest.csv"
+ZIP_IMAGE_DIR = "images"
+# 本身已壓縮的圖片格式以 STORED 存放，不再重複壓縮
+ZIP_STORED_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+ZIP_COPY_CHUNK_SIZE = 1024 * 1024
+# 清單超過此大小才寫到磁碟暫存檔
+ZIP_MANIFEST_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+class _ZipSink:
+    """
+    只能附加寫入的輸出緩衝
+
+    不提供 seek，zipfile 會改用 data descriptor 逐項寫出，不需要回頭修改檔頭；
+    產生器每次寫入後取走累積的內容送出。
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def drain(self, min_size: int = 0) -> Optional[bytes]:
+        if not self._buffer or len(self._buffer) < min_size:
+            return None
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+def _zip_image_name(card_id: int, side: str, path: str) -> str:
+    extension = os.path.splitext(path)[1].lower() or ".jpg"
+    return f"{ZIP_IMAGE_DIR}/{card_id}_{side}{extension}"
+
+
+def _zip_image_info(name: str, path: str) -> zipfile.ZipInfo:
+    stat = os.stat(path)
+    info = zipfile.ZipInfo(name, date_time=time.localtime(max(stat.st_mtime, 315532800))[:6])
+    info.compress_type = (zipfile.ZIP_STORED if name.endswith(ZIP_STORED_EXTENSIONS)
+                          else zipfile.ZIP_DEFLATED)
+    # 預先填入大小，讓 zipfile 判斷是否需要 zip64 擴充欄位
+    info.file_size = stat.st_size
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def stream_zip(columns: List[str], include_images: bool = True,
+               batch_size: int = EXPORT_BATCH_SIZE,
+               progress: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """
+    產生包含名片清單與正反面圖片的 ZIP（zip64）
+
+    圖片依名片 id 重新命名為 images/<id>_front.jpg、images/<id>_back.jpg，
+    逐檔以 1MB 區塊複製並隨即送出，整個壓縮檔不會留在記憶體中。
+    清單（manifest.csv，欄位同 CSV 匯出並加上圖片在壓縮檔中的路徑）
+    邊讀邊寫入暫存檔，最後才加入壓縮檔。
+    """
+    manifest_columns = ["id"] + [c for c in columns if c != "id"]
+    read_columns = list(dict.fromkeys(manifest_columns + ["front_image_path", "back_image_path"]))
+    front_index = read_columns.index("front_image_path")
+    back_index = read_columns.index("back_image_path")
+    manifest_width = len(manifest_columns)
+
+    sink = _ZipSink()
+    manifest = tempfile.SpooledTemporaryFile(max_size=ZIP_MANIFEST_SPOOL_SIZE, mode="w+b")
+    text = io.TextIOWrapper(manifest, encoding="utf-8", newline="")
+    text.write("\ufeff")
+    writer = csv.writer(text)
+    writer.writerow(column_headers(manifest_columns) + ["正面圖片", "背面圖片"])
+
+    count = 0
+    images = 0
+    missing = 0
+    try:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+            for row in iter_card_rows(read_columns, batch_size, progress):
+                card_id = row[0]
+                entries = []
+                for side, path in (("front", row[front_index]), ("back", row[back_index])):
+                    if not include_images or not path:
+                        entries.append("")
+                        continue
+                    if not os.path.isfile(path):
+                        missing += 1
+                        entries.append("")
+                        continue
+                    name = _zip_image_name(card_id, side, path)
+                    with open(path, "rb") as source, archive.open(_zip_image_info(name, path), "w") as target:
+                        while True:
+                            chunk = source.read(ZIP_COPY_CHUNK_SIZE)
+                            if not chunk:
+                                break
+                            target.write(chunk)
+                            data = sink.drain(EXPORT_CHUNK_SIZE)
+                            if data:
+                                yield data
+                    images += 1
+                    entries.append(name)
+                writer.writerow([format_value(value) for value in row[:manifest_width]] + entries)
+                count += 1
+                data = sink.drain(EXPORT_CHUNK_SIZE)
+                if data:
+                    yield data
+
+            text.flush()
+            manifest.seek(0)
+            info = zipfile.ZipInfo(ZIP_MANIFEST_NAME, date_time=time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            with archive.open(info, "w", force_zip64=True) as target:
+                while True:
+                    chunk = manifest.read(ZIP_COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    target.write(chunk)
+                    data = sink.drain(EXPORT_CHUNK_SIZE)
+                    if data:
+                        yield data
+    except Exception as e:
+        logger.error(f"ZIP 串流匯出中斷（已輸出 {count} 筆）: {e}")
+        raise
+    finally:
+        text.close()
+    data = sink.drain()
+    if data:
+        yield data
+    if missing:
+        logger.warning(f"ZIP 匯出時有 {missing} 個圖片檔不存在，已略過")
+    logger.info(f"ZIP 匯出完成，共 {count} 筆、{images} 張圖片")
+
+
+# ---- Parquet / Arrow ----
+
+COLUMNAR_FORMATS = ("parquet", "arrow")
+# 分析用途預設包含 id 與時間欄位
+COLUMNAR_DEFAULT_FIELDS = ("id",) + DEFAULT_EXPORT_FIELDS + ("created_at", "updated_at")
+# 每個 SQL 區塊轉成一個 record batch（Parquet 中即一個 row group）
+COLUMNAR_BATCH_SIZE = 50000
+# 低基數欄位使用字典編碼
+ARROW_DICTIONARY_COLUMNS = (
+    "company_name", "company_name_en", "position", "position_en",
+    "department1", "department1_en", "department2", "department2_en", "department3", "department3_en",
+    "company_address1", "company_address1_en", "company_address2", "company_address2_en",
+)
+
+
+def require_pyarrow():
+    """pyarrow 為選用套件，只有 Parquet/Arrow 匯出入時才載入"""
+    try:
+        import pyarrow
+    except ImportError:
+        raise RuntimeError("Parquet/Arrow 格式需要安裝 pyarrow（pip install pyarrow）")
+    return pyarrow
+
+
+def arrow_schema(columns: List[str]):
+    pa = require_pyarrow()
+    fields = []
+    for column in columns:
+        if column == "id":
+            column_type = pa.int64()
+        elif column in ("created_at", "updated_at"):
+            column_type = pa.timestamp("us")
+        elif column in ARROW_DICTIONARY_COLUMNS:
+            column_type = pa.dictionary(pa.int32(), pa.string())
+        else:
+            column_type = pa.string()
+        fields.append(pa.field(column, column_type))
+    return pa.schema(fields)
+
+
+def iter_record_batches(columns: List[str], batch_size: int = COLUMNAR_BATCH_SIZE,
+                        progress: Optional[Callable[[int], None]] = None):
+    """每個 SQL 結果區塊直接轉為一個 Arrow record batch"""
+    pa = require_pyarrow()
+    schema = arrow_schema(columns)
+    for rows in iter_card_batches(columns, batch_size, progress):
+        arrays = []
+        for i, schema_field in enumerate(schema):
+            values = [row[i] for row in rows]
+            if pa.types.is_dictionary(schema_field.type):
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=schema_field.type))
+        yield pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def write_parquet(path: str, columns: List[str], batch_size: int = COLUMNAR_BATCH_SIZE,
+                  progress: Optional[Callable[[int], None]] = None) -> int:
+    """匯出 Parquet（zstd 壓縮，低基數欄位字典編碼）"""
+    require_pyarrow()
+    import pyarrow.parquet as pq
+
+    count = 0
+    dictionary_columns = [c for c in columns if c in ARROW_DICTIONARY_COLUMNS]
+    with pq.ParquetWriter(path, arrow_schema(columns), compression="zstd",
+                          use_dictionary=dictionary_columns or False) as writer:
+        for batch in iter_record_batches(columns, batch_size, progress):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    logger.info(f"Parquet 匯出完成，共 {count} 筆")
+    return count
+
+
+def write_arrow(path: str, columns: List[str], batch_size: int = COLUMNAR_BATCH_SIZE,
+                progress: Optional[Callable[[int], None]] = None) -> int:
+    """匯出 Arrow IPC 串流格式（zstd 壓縮）"""
+    pa = require_pyarrow()
+
+    count = 0
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_stream(sink, arrow_schema(columns), options=options) as writer:
+        for batch in iter_record_batches(columns, batch_size, progress):
+            writer.write_batch(batch)
+            count += batch.num_rows
+    logger.info(f"Arrow 匯出完成，共 {count} 筆")
+    return count
@@ -0,0 +1,324 @@
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Dict, Iterator, List, Optional, Set
+
+from backend.core.config import settings
+from backend.models.card import CardORM, ImageBlobORM
+from backend.models.db import SessionLocal
+from backend.services.image_store import ImageStore, image_store
+
+logger = logging.getLogger(__name__)
+
+QUARANTINE_DIR = ".quarantine"
+STATE_FILE = ".gc_state.json"
+LOCK_FILE = ".gc.lock"
+# 鎖檔超過此時間未更新即視為前一次清理中斷
+LOCK_TIMEOUT = 2 * 3600
+# 乾跑報告最多列出的孤兒檔數
+REPORT_SAMPLE_SIZE = 100
+
+_SHARD_NAME = re.compile(r"^[0-9a-f]{2}$")
+
+
+@dataclass
+class GCReport:
+    dry_run: bool
+    scanned: int = 0
+    referenced: int = 0
+    young: int = 0
+    orphans: int = 0
+    orphan_bytes: int = 0
+    quarantined: int = 0
+    restored: int = 0
+    deleted: int = 0
+    deleted_bytes: int = 0
+    temp_removed: int = 0
+    directories: int = 0
+    cursor: Optional[str] = None
+    cycle_completed: bool = False
+    seconds: float = 0.0
+    sample: List[str] = field(default_factory=list)
+
+    def to_dict(self) -> Dict:
+        return asdict(self)
+
+
+def _owner_key(path: str) -> int:
+    """
+    檔案所屬的原圖鍵值：縮圖（<原檔名>.<版本>.<副檔名>）與原圖對應到同一個鍵
+
+    只保留雜湊值以節省記憶體；碰撞只會讓孤兒檔被保留，不會誤刪。
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    stem = os.path.splitext(name)[0]
+    base, _, suffix = stem.rpartition(".")
+    if base and suffix in settings.RENDITION_SIZES:
+        stem = base
+    return hash(os.path.join(directory, stem))
+
+
+class ImageGarbageCollector:
+    """
+    孤兒圖片清理
+
+    1. 以串流查詢建立所有名片引用的圖片鍵值集合
+    2. 依序以 os.scandir 掃描分片目錄（每次最多 max_dirs 個，游標存於狀態檔，
+       下次從中斷處繼續），未被引用且超過寬限期的檔案移到隔離區
+    3. 隔離超過寬限期的檔案再次確認未被引用後刪除，若又被引用則還原
+
+    目錄內容逐一處理，不會把整個檔案清單載入記憶體。
+    """
+
+    def __init__(self, store: ImageStore = None, grace_hours: float = None, max_dirs: int = None):
+        self.store = store or image_store
+        self.grace = (grace_hours if grace_hours is not None else settings.IMAGE_GC_GRACE_HOURS) * 3600
+        self.max_dirs = max_dirs or settings.IMAGE_GC_MAX_DIRS
+
+    # ---- 路徑與狀態 ----
+
+    @property
+    def root(self) -> str:
+        return self.store.root
+
+    def _quarantine_root(self) -> str:
+        return os.path.join(self.root, QUARANTINE_DIR)
+
+    def _load_cursor(self) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, STATE_FILE), encoding="utf-8") as f:
+                return json.load(f).get("cursor")
+        except (OSError, ValueError):
+            return None
+
+    def _save_cursor(self, cursor: Optional[str]):
+        path = os.path.join(self.root, STATE_FILE)
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            json.dump({"cursor": cursor, "updated_at": time.time()}, f)
+        os.replace(f"{path}.tmp", path)
+
+    def _acquire(self) -> bool:
+        """跨程序的清理鎖（多個 worker 同時啟動時只有一個會執行）"""
+        path = os.path.join(self.root, LOCK_FILE)
+        try:
+            if time.time() - os.path.getmtime(path) > LOCK_TIMEOUT:
+                os.remove(path)
+        except OSError:
+            pass
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+
+    def _release(self):
+        try:
+            os.remove(os.path.join(self.root, LOCK_FILE))
+        except OSError:
+            pass
+
+    # ---- 掃描 ----
+
+    def referenced_keys(self, batch_size: int = 5000) -> Set[int]:
+        """以串流查詢取得所有名片引用的圖片鍵值"""
+        keys = set()
+        db = SessionLocal()
+        try:
+            query = db.query(CardORM.front_image_path, CardORM.back_image_path).filter(
+                (CardORM.front_image_path.isnot(None)) | (CardORM.back_image_path.isnot(None))
+            )
+            for front, back in query.execution_options(yield_per=batch_size):
+                for path in (front, back):
+                    if path:
+                        keys.add(_owner_key(path))
+        finally:
+            db.close()
+        return keys
+
+    def _directories(self, after: Optional[str]) -> Iterator[str]:
+        """依序列出要掃描的目錄：根目錄（舊版平面檔案）與各分片目錄"""
+        if after is None:
+            yield ""
+        with os.scandir(self.root) as entries:
+            top = sorted(e.name for e in entries if e.is_dir() and _SHARD_NAME.match(e.name))
+        for first in top:
+            if after and first < after.split("/")[0]:
+                continue
+            with os.scandir(os.path.join(self.root, first)) as entries:
+                second = sorted(e.name for e in entries if e.is_dir() and _SHARD_NAME.match(e.name))
+            for name in second:
+                key = f"{first}/{name}"
+                if after and key <= after:
+                    continue
+                yield key
+
+    def _sweep_directory(self, key: str, referenced: Set[int], report: GCReport, now: float):
+        directory = os.path.join(self.root, *key.split("/")) if key else self.root
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                    continue
+                report.scanned += 1
+                if _owner_key(entry.path) in referenced:
+                    report.referenced += 1
+                    continue
+                stat = entry.stat()
+                if now - stat.st_mtime < self.grace:
+                    report.young += 1
+                    continue
+                report.orphans += 1
+                report.orphan_bytes += stat.st_size
+                if len(report.sample) < REPORT_SAMPLE_SIZE:
+                    report.sample.append(entry.path)
+                if not report.dry_run:
+                    self._quarantine(entry.path)
+                    report.quarantined += 1
+
+    def _quarantine(self, path: str):
+        target = os.path.join(self._quarantine_root(), os.path.relpath(path, self.root))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        # 以隔離時間作為刪除寬限期的起點
+        os.utime(target)
+
+    def _purge_quarantine(self, referenced: Set[int], report: GCReport, now: float):
+        quarantine = self._quarantine_root()
+        if not os.path.isdir(quarantine):
+            return
+        deleted_digests = []
+        for directory, _, files in os.walk(quarantine):
+            for name in files:
+                path = os.path.join(directory, name)
+                original = os.path.join(self.root, os.path.relpath(path, quarantine))
+                if _owner_key(original) in referenced:
+                    if report.dry_run:
+                        continue
+                    if os.path.exists(original):
+                        os.remove(path)
+                    else:
+                        os.makedirs(os.path.dirname(original), exist_ok=True)
+                        os.replace(path, original)
+                    report.restored += 1
+                    continue
+                stat = os.stat(path)
+                if now - stat.st_mtime < self.grace or report.dry_run:
+                    continue
+                os.remove(path)
+                report.deleted += 1
+                report.deleted_bytes += stat.st_size
+                digest = ImageStore.digest_of(original)
+                if digest:
+                    deleted_digests.append(digest)
+        if deleted_digests:
+            self._forget_blobs(deleted_digests)
+
+    def _forget_blobs(self, digests: List[str]):
+        """刪除已清除圖片的引用計數紀錄（只刪除 ref_count 為 0 的紀錄）"""
+        db = SessionLocal()
+        try:
+            for start in range(0, len(digests), 500):
+                db.query(ImageBlobORM).filter(
+                    ImageBlobORM.digest.in_(digests[start:start + 500]), ImageBlobORM.ref_count <= 0
+                ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _remove_stale_temp(self, report: GCReport, now: float):
+        """清除中斷的上傳留下的暫存檔"""
+        tmp_dir = os.path.join(self.root, ".tmp")
+        if not os.path.isdir(tmp_dir):
+            return
+        with os.scandir(tmp_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and now - entry.stat().st_mtime >= self.grace:
+                    if not report.dry_run:
+                        os.remove(entry.path)
+                    report.temp_removed += 1
+
+    def sweep(self, dry_run: bool = False, full: bool = False) -> Optional[GCReport]:
+        """
+        執行一次清理；full=True 時掃描完整一輪，否則最多處理 max_dirs 個目錄
+
+        乾跑時不移動或刪除任何檔案，也不推進游標。其他程序正在清理時回傳 None。
+        """
+        if not os.path.isdir(self.root):
+            return GCReport(dry_run=dry_run, cycle_completed=True)
+        if not self._acquire():
+            logger.info("其他程序正在清理圖片，略過本次執行")
+            return None
+        started = time.monotonic()
+        report = GCReport(dry_run=dry_run)
+        try:
+            now = time.time()
+            referenced = self.referenced_keys()
+            cursor = None if dry_run else self._load_cursor()
+            limit = None if full else self.max_dirs
+            report.cycle_completed = True
+            for key in self._directories(cursor):
+                if limit is not None and report.directories >= limit:
+                    report.cycle_completed = False
+                    break
+                self._sweep_directory(key, referenced, report, now)
+                report.directories += 1
+                cursor = key
+            self._purge_quarantine(referenced, report, now)
+            self._remove_stale_temp(report, now)
+            report.cursor = None if report.cycle_completed else cursor
+            if not dry_run:
+                self._save_cursor(report.cursor)
+        finally:
+            self._release()
+        report.seconds = round(time.monotonic() - started, 3)
+        logger.info(
+            f"圖片清理{'（乾跑）' if dry_run else ''}：掃描 {report.scanned} 個檔案，"
+            f"孤兒 {report.orphans} 個（{report.orphan_bytes / 1024 / 1024:.1f} MB），"
+            f"隔離 {report.quarantined}、刪除 {report.deleted}、還原 {report.restored}，"
+            f"耗時 {report.seconds} 秒"
+        )
+        return report
+
+    def restore(self, path: str) -> bool:
+        """名片引用的圖片仍在隔離區時移回原位（清理與上傳同時發生的補救）"""
+        quarantined = os.path.join(self._quarantine_root(), os.path.relpath(path, self.root))
+        if not os.path.exists(quarantined):
+            return False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(quarantined, path)
+        logger.warning(f"已由隔離區還原圖片 {path}")
+        return True
+
+    async def run_periodically(self, interval_hours: float = None):
+        """背景定期清理（由應用程式 lifespan 啟動）"""
+        interval = (interval_hours if interval_hours is not None else settings.IMAGE_GC_INTERVAL_HOURS) * 3600
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                logger.error(f"圖片清理失敗: {e}")
+
+
+# 全域清理器
+image_gc = ImageGarbageCollector()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="清理未被任何名片引用的圖片")
+    parser.add_argument("--dry-run", action="store_true", help="只列出孤兒檔，不移動或刪除")
+    parser.add_argument("--full", action="store_true", help="掃描完整一輪（預設每次最多 IMAGE_GC_MAX_DIRS 個目錄）")
+    parser.add_argument("--grace-hours", type=float, default=None, help="寬限期（小時）")
+    args = parser.parse_args()
+
+    collector = ImageGarbageCollector(grace_hours=args.grace_hours)
+    result = collector.sweep(dry_run=args.dry_run, full=args.full)
+    print(json.dumps(result.to_dict() if result else {"skipped": True}, ensure_ascii=False, indent=2))
@@ -0,0 +1,249 @@
+import datetime
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import case, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.card import ImageBlobORM
+
+logger = logging.getLogger(__name__)
+
+# 讀寫檔案的區塊大小
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# 依檔頭判斷圖片格式，相同內容一律得到相同的副檔名
+_MAGIC_EXTENSIONS = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+    (b"BM", ".bmp"),
+    (b"II*\x00", ".tif"),
+    (b"MM\x00*", ".tif"),
+)
+_DIGEST_NAME = re.compile(r"^([0-9a-f]{64})(\.[0-9a-z]+)?$")
+
+
+@dataclass
+class StoredImage:
+    digest: str
+    path: str
+    size: int
+    created: bool       # False 表示已有相同內容的檔案（未重複存放）
+
+
+def sniff_extension(head: bytes, filename: Optional[str] = None) -> str:
+    """由檔頭判斷副檔名，無法判斷時使用原始檔名的副檔名"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    for magic, extension in _MAGIC_EXTENSIONS:
+        if head.startswith(magic):
+            return extension
+    extension = os.path.splitext(filename or "")[1].lower()
+    return extension if re.fullmatch(r"\.[0-9a-z]{1,5}", extension) else ".bin"
+
+
+class ImageStore:
+    """
+    內容定址的圖片存放區
+
+    檔案以 SHA-256 命名並放在兩層分片目錄（ab/cd/<digest>.<ext>），
+    單一目錄的項目數維持在數百以內；相同內容只存一份。寫入時先寫到
+    同一檔案系統的暫存檔再以 os.replace 原子性地放到定位，讀取端不會
+    看到寫到一半的檔案。
+    """
+
+    def __init__(self, root: str = None):
+        self.root = root or settings.IMAGE_STORE_DIR
+
+    def _tmp_dir(self) -> str:
+        path = os.path.join(self.root, ".tmp")
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def path_for(self, digest: str, extension: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}{extension}")
+
+    @staticmethod
+    def digest_of(path: Optional[str]) -> Optional[str]:
+        """由存放區內的路徑取出內容雜湊；不是存放區的路徑回傳 None"""
+        if not path:
+            return None
+        match = _DIGEST_NAME.match(os.path.basename(path))
+        if not match:
+            return None
+        digest = match.group(1)
+        shard = os.path.normpath(os.path.dirname(path)).split(os.sep)[-2:]
+        return digest if shard == [digest[:2], digest[2:4]] else None
+
+    def _place(self, tmp_path: str, digest: str, extension: str, size: int) -> StoredImage:
+        path = self.path_for(digest, extension)
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            # 更新時間戳，避免尚未被引用的舊檔在寬限期內被孤兒清理移走
+            os.utime(path)
+            return StoredImage(digest, path, size, created=False)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return StoredImage(digest, path, size, created=True)
+
+    def put(self, source: BinaryIO, filename: Optional[str] = None) -> StoredImage:
+        """串流寫入一張圖片（邊寫邊計算雜湊），回傳存放位置"""
+        sha = hashlib.sha256()
+        size = 0
+        head = b""
+        fd, tmp_path = tempfile.mkstemp(dir=self._tmp_dir(), suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as target:
+                while True:
+                    chunk = source.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    if len(head) < 16:
+                        # 來源可能分段回傳很短的內容，檔頭需累積到足以判斷格式
+                        head += chunk[:16 - len(head)]
+                    sha.update(chunk)
+                    target.write(chunk)
+                    size += len(chunk)
+                target.flush()
+                os.fsync(target.fileno())
+            return self._place(tmp_path, sha.hexdigest(), sniff_extension(head, filename), size)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def put_file(self, path: str) -> StoredImage:
+        """
+        將既有檔案加入存放區（原檔保留）
+
+        同一檔案系統時以硬連結放到定位，不佔用額外空間；否則複製。
+        """
+        sha = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as source:
+            head = source.read(16)
+            source.seek(0)
+            for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+                sha.update(chunk)
+                size += len(chunk)
+        digest = sha.hexdigest()
+        extension = sniff_extension(head, path)
+        if os.path.exists(self.path_for(digest, extension)):
+            return StoredImage(digest, self.path_for(digest, extension), size, created=False)
+        tmp_path = os.path.join(self._tmp_dir(), f"{digest}.{os.getpid()}.part")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(path, tmp_path)
+        except OSError:
+            shutil.copyfile(path, tmp_path)
+        return self._place(tmp_path, digest, extension, size)
+
+
+# 存放區以外（舊版路徑）檔案的雜湊快取：(路徑, mtime, 大小) -> SHA-256
+_legacy_digests: Dict[Tuple[str, int, int], str] = {}
+_legacy_digests_lock = threading.Lock()
+_LEGACY_DIGEST_CACHE_SIZE = 4096
+
+
+def content_digest(path: str) -> str:
+    """
+    圖片內容的 SHA-256
+
+    存放區內的檔案直接由檔名取得；其他檔案計算一次後依 mtime 與大小快取。
+    """
+    digest = ImageStore.digest_of(path)
+    if digest:
+        return digest
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    with _legacy_digests_lock:
+        digest = _legacy_digests.get(key)
+    if digest:
+        return digest
+    sha = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()
+    with _legacy_digests_lock:
+        if len(_legacy_digests) >= _LEGACY_DIGEST_CACHE_SIZE:
+            _legacy_digests.clear()
+        _legacy_digests[key] = digest
+    return digest
+
+
+# ---- 引用計數（與名片寫入在同一個交易中更新）----
+
+def _blob_counts(paths: Iterable[Optional[str]]) -> Counter:
+    counts = Counter()
+    for path in paths:
+        digest = ImageStore.digest_of(path)
+        if digest:
+            counts[(digest, path)] += 1
+    return counts
+
+
+def _retain(db: Session, counts: Counter):
+    now = datetime.datetime.utcnow()
+    for (digest, path), count in counts.items():
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        statement = insert(ImageBlobORM).values(
+            digest=digest, path=path, size=size, ref_count=count, created_at=now
+        )
+        db.execute(statement.on_conflict_do_update(
+            index_elements=[ImageBlobORM.digest],
+            set_={"ref_count": ImageBlobORM.ref_count + count, "released_at": None},
+        ))
+
+
+def _release(db: Session, counts: Counter):
+    now = datetime.datetime.utcnow()
+    for (digest, _), count in counts.items():
+        db.execute(
+            update(ImageBlobORM)
+            .where(ImageBlobORM.digest == digest)
+            .values(
+                ref_count=case((ImageBlobORM.ref_count > count, ImageBlobORM.ref_count - count), else_=0),
+                released_at=case((ImageBlobORM.ref_count > count, None), else_=now),
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+
+def retain_images(db: Session, paths: Iterable[Optional[str]]):
+    """名片開始引用這些圖片（存放區以外的路徑略過）"""
+    _retain(db, _blob_counts(paths))
+
+
+def release_images(db: Session, paths: Iterable[Optional[str]]):
+    """
+    名片不再引用這些圖片
+
+    引用數降為 0 的圖片不會立即刪除（可能有剛上傳、尚未存入名片的
+    相同內容），只記錄 released_at，由清理工作在寬限期後處理。
+    """
+    _release(db, _blob_counts(paths))
+
+
+def update_image_refs(db: Session, old_paths: Iterable[Optional[str]], new_paths: Iterable[Optional[str]]):
+    """名片圖片欄位由 old_paths 改為 new_paths 時調整引用數（只處理差異）"""
+    old_counts, new_counts = _blob_counts(old_paths), _blob_counts(new_paths)
+    _retain(db, new_counts - old_counts)
+    _release(db, old_counts - new_counts)
+
+
+# 全域圖片存放區
+image_store = ImageStore()
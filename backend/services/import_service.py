@@ -0,0 +1,507 @@
+import codecs
+import csv
+import datetime
+import io
+import logging
+import quopri
+import re
+import time
+from dataclasses import dataclass, field
+from types import SimpleNamespace
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.card import CardORM
+from backend.services.card_service import bulk_insert_cards
+from backend.services.dedup_service import dedup_index, new_local_index
+from backend.services.export_service import EXPORT_COLUMNS, EXTRA_EXPORT_COLUMNS, require_pyarrow
+
+logger = logging.getLogger(__name__)
+
+# 可匯入的欄位（id 一律由資料庫重新產生）
+IMPORT_FIELDS = tuple(EXPORT_COLUMNS) + ("front_ocr_text", "back_ocr_text", "created_at", "updated_at")
+IMPORT_BATCH_SIZE = 5000
+# 錯誤報告最多保留的筆數（其餘只計數），避免大檔案錯誤過多時記憶體增長
+IMPORT_MAX_REPORTED = 1000
+
+# 副檔名 -> 匯入格式
+IMPORT_EXTENSIONS = {
+    ".csv": "csv",
+    ".xlsx": "excel",
+    ".xlsm": "excel",
+    ".vcf": "vcard",
+    ".vcard": "vcard",
+    ".parquet": "parquet",
+    ".arrow": "arrow",
+    ".arrows": "arrow",
+}
+
+_COLUMN_LENGTHS = {
+    column.name: column.type.length
+    for column in CardORM.__table__.columns
+    if getattr(column.type, "length", None)
+}
+_EMAIL_RE = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+
+@dataclass
+class ImportResult:
+    total: int = 0
+    imported: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    errors: List[Dict] = field(default_factory=list)
+    duplicate_rows: List[Dict] = field(default_factory=list)
+    # 解析中斷時的錯誤訊息；之前已寫入的批次仍保留
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict:
+        return {
+            "total": self.total,
+            "imported": self.imported,
+            "skipped": self.skipped,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "batches": self.batches,
+            "seconds": round(self.seconds, 3),
+            "errors": self.errors,
+            "duplicate_rows": self.duplicate_rows,
+            "error": self.error,
+        }
+
+
+def detect_format(filename: Optional[str], format: Optional[str] = None) -> str:
+    """
+    由指定格式或副檔名判斷匯入格式
+
+    Raises:
+        ValueError: 無法判斷或不支援的格式
+    """
+    if format:
+        if format not in set(IMPORT_EXTENSIONS.values()):
+            raise ValueError(f"不支援的匯入格式: {format}")
+        return format
+    name = (filename or "").lower()
+    for extension, detected in IMPORT_EXTENSIONS.items():
+        if name.endswith(extension):
+            return detected
+    raise ValueError("無法由檔名判斷匯入格式，請指定 format")
+
+
+# ---- 欄位對應 ----
+
+def map_headers(headers: List[Any]) -> List[Optional[str]]:
+    """
+    將標題列對應到名片欄位：欄位名稱、本系統匯出的中文標題，
+    其次使用 FieldMapper 的精確與模糊對應；同一欄位只取第一個出現的標題
+    """
+    from backend.services.ocr_service import FieldMapper
+
+    mapper = FieldMapper()
+    export_headers = {header: name for name, header in {**EXPORT_COLUMNS, **EXTRA_EXPORT_COLUMNS}.items()}
+    mapped, used = [], set()
+    for header in headers:
+        header = str(header).strip() if header is not None else ""
+        target = None
+        if header in IMPORT_FIELDS:
+            target = header
+        elif header in export_headers:
+            target = export_headers[header]
+        elif header:
+            target = mapper.map_field(header) or mapper.fuzzy_map_field(header)
+        if target not in IMPORT_FIELDS or target in used:
+            target = None
+        if target:
+            used.add(target)
+        mapped.append(target)
+    return mapped
+
+
+def _cell_text(value: Any) -> Any:
+    """試算表儲存格轉為文字（整數值的浮點數去掉 .0，時間保留為 datetime）"""
+    if value is None or isinstance(value, (str, datetime.datetime)):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _parse_datetime(value: Any) -> Optional[datetime.datetime]:
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+
+def clean_row(row: Dict) -> Optional[Dict]:
+    """只保留可匯入欄位，文字去除空白；沒有任何名片資料時回傳 None"""
+    data = {}
+    for name in IMPORT_FIELDS:
+        value = row.get(name)
+        if value is None:
+            continue
+        if name in ("created_at", "updated_at"):
+            parsed = _parse_datetime(value)
+            if parsed:
+                data[name] = parsed
+            continue
+        value = str(value).strip()
+        if value:
+            data[name] = value
+    if not any(name in data for name in EXPORT_COLUMNS):
+        return None
+    return data
+
+
+def validate_row(data: Dict) -> List[str]:
+    """檢查單筆名片資料，回傳錯誤訊息（空清單表示通過）"""
+    errors = []
+    if not data.get("name") and not data.get("name_en") and not data.get("company_name") and not data.get("company_name_en"):
+        errors.append("缺少姓名或公司名稱")
+    for name, length in _COLUMN_LENGTHS.items():
+        value = data.get(name)
+        if value and len(value) > length:
+            errors.append(f"{name} 超過長度上限 {length}")
+    email = data.get("email")
+    if email and not _EMAIL_RE.match(email):
+        errors.append(f"Email 格式不正確: {email}")
+    return errors
+
+
+# ---- CSV ----
+
+def _detect_encoding(head: bytes) -> str:
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    try:
+        # 允許結尾被截斷的多位元組字元
+        codecs.getincrementaldecoder("utf-8")().decode(head, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        # 台灣舊版 Excel 預設以 Big5 輸出 CSV
+        return "cp950"
+
+
+def iter_csv_rows(file: BinaryIO) -> Iterator[Tuple[int, Dict]]:
+    head = file.read(64 * 1024)
+    file.seek(0)
+    encoding = _detect_encoding(head)
+    text = io.TextIOWrapper(file, encoding=encoding, errors="replace", newline="")
+    try:
+        sample = head.decode(encoding, errors="ignore")
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    reader = csv.reader(text, dialect)
+    try:
+        headers = map_headers(next(reader))
+    except StopIteration:
+        return
+    for row_number, values in enumerate(reader, start=2):
+        yield row_number, {name: value for name, value in zip(headers, values) if name}
+    text.detach()
+
+
+# ---- Excel ----
+
+def iter_excel_rows(file: BinaryIO) -> Iterator[Tuple[int, Dict]]:
+    import openpyxl  # 延遲載入，只有匯入 Excel 時才需要
+
+    wb = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        try:
+            headers = map_headers(list(next(rows)))
+        except StopIteration:
+            return
+        for row_number, values in enumerate(rows, start=2):
+            yield row_number, {name: _cell_text(value) for name, value in zip(headers, values) if name}
+    finally:
+        wb.close()
+
+
+# ---- vCard ----
+
+def _unescape(value: str) -> str:
+    return re.sub(r"\\([\\,;nN])", lambda m: "\n" if m.group(1) in "nN" else m.group(1), value)
+
+
+def _components(value: str) -> List[str]:
+    return [_unescape(part).strip() for part in re.split(r"(?<!\\);", value)]
+
+
+def _iter_vcard_lines(text: Iterator[str]) -> Iterator[str]:
+    """展開折行（續行以空白或 tab 開頭）與 quoted-printable 的軟換行"""
+    current = None
+    for raw in text:
+        line = raw.rstrip("\r\n")
+        if current is not None:
+            if line[:1] in (" ", "\t"):
+                current += line[1:]
+                continue
+            if current.endswith("=") and "QUOTED-PRINTABLE" in current.split(":", 1)[0].upper():
+                current = current[:-1] + line
+                continue
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def _parse_vcard_line(line: str) -> Optional[Tuple[str, Dict[str, str], set, str]]:
+    """拆成 (屬性名稱, 參數, TYPE 集合, 值)"""
+    if ":" not in line:
+        return None
+    head, value = line.split(":", 1)
+    parts = head.split(";")
+    name = parts[0].split(".")[-1].upper()
+    params, types = {}, set()
+    for part in parts[1:]:
+        if "=" in part:
+            key, param_value = part.split("=", 1)
+            key = key.upper()
+            param_value = param_value.strip('"')
+            if key == "TYPE":
+                types.update(t.upper() for t in param_value.split(","))
+            else:
+                params[key] = param_value
+        else:
+            # vCard 2.1 的參數可省略 TYPE=
+            types.add(part.upper())
+    if params.get("ENCODING", "").upper() == "QUOTED-PRINTABLE" or "QUOTED-PRINTABLE" in types:
+        charset = params.get("CHARSET", "utf-8")
+        value = quopri.decodestring(value.encode("ascii", "replace")).decode(charset, errors="replace")
+    return name, params, types, value
+
+
+def _compose_name(components: List[str]) -> str:
+    """由 N 的 (姓, 名) 組回姓名；拉丁字母姓名的順序與匯出相同（VCARD_LATIN_FAMILY_FIRST）"""
+    family, given = (components + ["", ""])[:2]
+    if (family + given).isascii():
+        if settings.VCARD_LATIN_FAMILY_FIRST:
+            return f"{family} {given}".strip()
+        return f"{given} {family}".strip()
+    return family + given
+
+
+def _compose_address(components: List[str], english: bool) -> str:
+    po_box, extended, street, locality, region, postal, country = (components + [""] * 7)[:7]
+    if english:
+        return ", ".join(p for p in (po_box, extended, street, locality, region, postal, country) if p)
+    return "".join(p for p in (postal, country, region, locality, street, extended, po_box) if p)
+
+
+def _vcard_to_row(properties: List[Tuple[str, Dict[str, str], set, str]]) -> Dict:
+    row: Dict[str, str] = {}
+    names: Dict[str, str] = {}
+    addresses: List[Tuple[bool, str]] = []
+    phones: List[str] = []
+    notes: List[str] = []
+
+    def put(key: str, value: str):
+        if value and key not in row:
+            row[key] = value
+
+    for name, params, types, value in properties:
+        english = params.get("LANGUAGE", "").lower().startswith("en")
+        suffix = "_en" if english else ""
+        if name == "FN":
+            put(f"name{suffix}", _unescape(value).strip())
+        elif name == "N":
+            names.setdefault(f"name{suffix}", _compose_name(_components(value)))
+        elif name == "NICKNAME" and value.isascii():
+            names.setdefault("name_en", _unescape(value).strip())
+        elif name == "ORG":
+            parts = _components(value)
+            put(f"company_name{suffix}", parts[0])
+            for i, department in enumerate(parts[1:4], start=1):
+                put(f"department{i}{suffix}", department)
+        elif name == "TITLE":
+            put(f"position{suffix}", _unescape(value).strip())
+        elif name == "TEL":
+            number = _unescape(value).strip()
+            if number.lower().startswith("tel:"):
+                number = number[4:]
+            if "FAX" in types:
+                continue
+            if "CELL" in types and "mobile_phone" not in row:
+                row["mobile_phone"] = number
+            else:
+                phones.append(number)
+        elif name == "EMAIL":
+            put("email", _unescape(value).strip())
+        elif name == "ADR":
+            addresses.append((english, _compose_address(_components(value), english)))
+        elif name == "NOTE":
+            notes.append(_unescape(value).strip())
+        elif name in ("X-LINE", "X-LINE-ID"):
+            put("line_id", _unescape(value).strip())
+        elif name == "IMPP" and value.lower().startswith("line:"):
+            put("line_id", value[5:])
+
+    for key, value in names.items():
+        put(key, value)
+    for key, number in zip(("company_phone1", "company_phone2"), phones):
+        put(key, number)
+    slots = {False: 1, True: 1}
+    for english, address in addresses:
+        if address and slots[english] <= 2:
+            put(f"company_address{slots[english]}{'_en' if english else ''}", address)
+            slots[english] += 1
+    for key, note in zip(("note1", "note2"), [n for n in notes if n]):
+        put(key, note)
+    return row
+
+
+def iter_vcard_rows(file: BinaryIO) -> Iterator[Tuple[int, Dict]]:
+    """逐張解析 vCard 2.1 / 3.0 / 4.0，行號為第幾張名片"""
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", errors="replace", newline="")
+    properties = None
+    number = 0
+    for line in _iter_vcard_lines(text):
+        parsed = _parse_vcard_line(line)
+        if parsed is None:
+            continue
+        name, _, _, value = parsed
+        if name == "BEGIN" and value.strip().upper() == "VCARD":
+            properties = []
+        elif name == "END" and value.strip().upper() == "VCARD":
+            if properties is not None:
+                number += 1
+                yield number, _vcard_to_row(properties)
+            properties = None
+        elif properties is not None and name != "PHOTO":
+            properties.append(parsed)
+    text.detach()
+
+
+# ---- Parquet / Arrow ----
+
+def iter_columnar_rows(file: BinaryIO, format: str, batch_size: int = IMPORT_BATCH_SIZE) -> Iterator[Tuple[int, Dict]]:
+    """逐個 record batch 讀取 Parquet / Arrow IPC 串流，只解碼可匯入的欄位"""
+    pa = require_pyarrow()
+    if format == "parquet":
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(file)
+        columns = [name for name in parquet_file.schema_arrow.names if name in IMPORT_FIELDS]
+        batches = parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+    else:
+        reader = pa.ipc.open_stream(file)
+        columns = [name for name in reader.schema.names if name in IMPORT_FIELDS]
+        batches = (batch.select(columns) for batch in reader)
+    number = 0
+    for batch in batches:
+        for row in batch.to_pylist():
+            number += 1
+            yield number, row
+
+
+# ---- 匯入 ----
+
+def _report(entries: List[Dict], entry: Dict):
+    if len(entries) < IMPORT_MAX_REPORTED:
+        entries.append(entry)
+
+
+def import_rows(db: Session, rows: Iterator[Tuple[int, Dict]], dedup: bool = False,
+                batch_size: int = IMPORT_BATCH_SIZE) -> ImportResult:
+    """
+    分批驗證並寫入名片，每批一個交易
+
+    dedup=True 時略過與既有名片或同一檔案中較前面的資料重複者。
+    某批寫入失敗時整批回滾並計入 failed，其餘批次照常匯入；
+    檔案解析中途失敗時停止讀取，已寫入的批次保留，錯誤記錄於 result.error。
+    """
+    started = time.monotonic()
+    result = ImportResult()
+    if dedup:
+        dedup_index.refresh(db)
+    batch: List[Dict] = []
+    batch_rows: List[int] = []
+    local_index = new_local_index()
+
+    def flush():
+        nonlocal local_index
+        if batch:
+            try:
+                bulk_insert_cards(db, batch)
+                result.imported += len(batch)
+                result.batches += 1
+            except Exception as e:
+                result.failed += len(batch)
+                _report(result.errors, {"row": batch_rows[0], "last_row": batch_rows[-1],
+                                        "errors": [f"寫入失敗: {e}"]})
+            batch.clear()
+            batch_rows.clear()
+        # 已寫入的資料已加入全域索引，本地索引只需涵蓋尚未寫入的這一批
+        local_index = new_local_index()
+
+    try:
+        for row_number, raw in rows:
+            result.total += 1
+            data = clean_row(raw)
+            if data is None:
+                result.skipped += 1
+                continue
+            errors = validate_row(data)
+            if errors:
+                result.failed += 1
+                _report(result.errors, {"row": row_number, "errors": errors})
+                continue
+            if dedup:
+                candidate = SimpleNamespace(**{name: data.get(name) for name in EXPORT_COLUMNS})
+                existing = dedup_index.find_matches(candidate)
+                earlier = [] if existing else local_index.find_matches(candidate)
+                if existing or earlier:
+                    result.duplicates += 1
+                    entry = {"row": row_number}
+                    if existing:
+                        entry["duplicate_of"], score = existing[0]
+                    else:
+                        entry["duplicate_of_row"], score = earlier[0]
+                    entry["score"] = round(score, 3)
+                    _report(result.duplicate_rows, entry)
+                    continue
+                candidate.id = row_number
+                local_index.add(candidate)
+            batch.append(data)
+            batch_rows.append(row_number)
+            if len(batch) >= batch_size:
+                flush()
+    except Exception as e:
+        result.error = str(e)
+        logger.error(f"匯入檔案解析失敗（第 {result.total} 筆之後）: {e}")
+    flush()
+
+    result.seconds = time.monotonic() - started
+    logger.info(
+        f"匯入完成：共 {result.total} 筆，新增 {result.imported}、略過 {result.skipped}、"
+        f"重複 {result.duplicates}、錯誤 {result.failed}，耗時 {result.seconds:.1f} 秒"
+    )
+    return result
+
+
+def import_file(db: Session, file: BinaryIO, format: str, dedup: bool = False,
+                batch_size: int = IMPORT_BATCH_SIZE) -> ImportResult:
+    """依格式串流解析檔案並批次匯入"""
+    if format == "csv":
+        rows = iter_csv_rows(file)
+    elif format == "excel":
+        rows = iter_excel_rows(file)
+    elif format == "vcard":
+        rows = iter_vcard_rows(file)
+    elif format in ("parquet", "arrow"):
+        # 產生器延遲執行，先檢查 pyarrow 讓缺少套件的 RuntimeError 不被當成解析錯誤
+        require_pyarrow()
+        rows = iter_columnar_rows(file, format, batch_size)
+    else:
+        raise ValueError(f"不支援的匯入格式: {format}")
+    return import_rows(db, rows, dedup=dedup, batch_size=batch_size)
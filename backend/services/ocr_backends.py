@@ -0,0 +1,388 @@
+import io
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OCRUnavailableError(RuntimeError):
+    """所有 OCR 後端都無法完成辨識"""
+
+
+class OCRBackend:
+    """
+    OCR 後端（提供者）基底類別
+
+    子類別實作 recognize(image_bytes) 回傳辨識文字，失敗時拋出例外；
+    延遲、錯誤率與健康狀態由 OCRRouter 記錄在這裡。
+    """
+
+    kind = "base"
+
+    def __init__(self, name: str, max_concurrency: int = 4, weight: float = 1.0):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.weight = max(float(weight), 0.01)
+        # 以下由 OCRRouter 在持有鎖時更新
+        self.in_flight = 0
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.probing = False
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    def recognize(self, image_bytes: bytes) -> Optional[str]:
+        raise NotImplementedError
+
+    def snapshot(self, now: float) -> Dict:
+        return {
+            "name": self.name,
+            "type": self.kind,
+            "available": self.available,
+            "healthy": now >= self.ejected_until,
+            "ejected_for": round(max(0.0, self.ejected_until - now), 1),
+            "ejections": self.ejections,
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "error_rate": round(self.error_ewma, 3),
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class HTTPOCRBackend(OCRBackend):
+    """上游 OCR API（multipart 上傳圖片，回應 {"result": ...}）"""
+
+    kind = "http"
+
+    def __init__(self, name: str, url: str, timeout: float = None, verify_ssl: bool = None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.url = url
+        self.timeout = timeout if timeout is not None else settings.OCR_TIMEOUT
+        self.verify_ssl = verify_ssl if verify_ssl is not None else settings.OCR_VERIFY_SSL
+        self._local = threading.local()
+
+    def _session(self):
+        # requests.Session 不保證執行緒安全，每個執行緒各自保持連線
+        import requests
+
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+            session.headers["User-Agent"] = "OCR-Service/1.0"
+        return session
+
+    def recognize(self, image_bytes: bytes) -> Optional[str]:
+        response = self._session().post(
+            self.url,
+            files=[("file", ("image.jpg", io.BytesIO(image_bytes), "image/jpeg"))],
+            verify=self.verify_ssl,
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        return response.json().get("result")
+
+    def snapshot(self, now: float) -> Dict:
+        data = super().snapshot(now)
+        data["url"] = self.url
+        return data
+
+
+class StubOCRBackend(OCRBackend):
+    """本機替身：固定延遲後回傳固定文字，可注入錯誤（開發與壓力測試用）"""
+
+    kind = "stub"
+
+    def __init__(self, name: str, latency: float = 0.0, error_rate: float = 0.0, result: str = "", **kwargs):
+        super().__init__(name, **kwargs)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.result = result
+
+    def recognize(self, image_bytes: bytes) -> Optional[str]:
+        time.sleep(self.latency)
+        if self.error_rate and random.random() < self.error_rate:
+            raise RuntimeError("模擬的 OCR 錯誤")
+        return self.result
+
+
+class PaddleOCRBackend(OCRBackend):
+    """本機 PaddleOCR 引擎（選用套件，未安裝時不參與路由）"""
+
+    kind = "paddle"
+
+    def __init__(self, name: str, lang: str = "ch", **kwargs):
+        kwargs.setdefault("max_concurrency", 1)
+        super().__init__(name, **kwargs)
+        self.lang = lang
+        self._engine = None
+        self._engine_lock = threading.Lock()
+        try:
+            import paddleocr  # noqa: F401
+            self._installed = True
+        except ImportError:
+            logger.warning(f"OCR 後端 {name} 需要安裝 paddleocr（pip install paddleocr），已停用")
+            self._installed = False
+
+    @property
+    def available(self) -> bool:
+        return self._installed
+
+    def _get_engine(self):
+        with self._engine_lock:
+            if self._engine is None:
+                from paddleocr import PaddleOCR
+
+                self._engine = PaddleOCR(use_angle_cls=True, lang=self.lang, show_log=False)
+            return self._engine
+
+    def recognize(self, image_bytes: bytes) -> Optional[str]:
+        import numpy as np
+        from PIL import Image
+
+        image = np.asarray(Image.open(io.BytesIO(image_bytes)).convert("RGB"))
+        pages = self._get_engine().ocr(image, cls=True) or []
+        lines = [line[1][0] for page in pages if page for line in page]
+        return "\n".join(lines) or None
+
+
+BACKEND_TYPES = {
+    HTTPOCRBackend.kind: HTTPOCRBackend,
+    StubOCRBackend.kind: StubOCRBackend,
+    PaddleOCRBackend.kind: PaddleOCRBackend,
+}
+
+
+def create_backend(config: Dict, index: int = 0) -> OCRBackend:
+    """
+    由設定建立後端，例如 {"type": "http", "url": "...", "max_concurrency": 4}
+
+    type 預設為 http；name 預設為 <type>-<序號>。
+    """
+    options = dict(config)
+    kind = options.pop("type", HTTPOCRBackend.kind)
+    if kind not in BACKEND_TYPES:
+        raise ValueError(f"不支援的 OCR 後端類型: {kind}")
+    name = options.pop("name", f"{kind}-{index}")
+    return BACKEND_TYPES[kind](name, **options)
+
+
+def load_backends(url: Optional[str] = None) -> List[OCRBackend]:
+    """依 OCR_BACKENDS 建立後端；未設定時沿用 OCR_URL 單一後端"""
+    if url is None and settings.OCR_BACKENDS:
+        return [create_backend(config, i) for i, config in enumerate(settings.OCR_BACKENDS)]
+    return [HTTPOCRBackend("default", url or settings.OCR_URL, max_concurrency=settings.OCR_MAX_CONCURRENCY)]
+
+
+class OCRRouter:
+    """
+    依即時延遲與錯誤率分派 OCR 請求
+
+    - 每個後端有自己的同時請求上限，全部滿載時等待空位
+    - 選擇「預估完成時間」最短者：（EWMA 延遲 + 錯誤率 × 逾時）×（進行中 + 1）/ 上限，
+      再除以權重；尚無樣本的後端優先試用
+    - 連續失敗或錯誤率過高的後端暫時剔除，剔除時間隨次數倍增；
+      時間到後只放行一個探測請求，成功才恢復；全部剔除時立即失敗
+    - 失敗時換下一個後端重試（最多 OCR_RETRY_ATTEMPTS 次）
+    """
+
+    def __init__(self, backends: List[OCRBackend]):
+        self.backends = [backend for backend in backends if backend.available]
+        if not self.backends:
+            raise ValueError("沒有可用的 OCR 後端")
+        self._cond = threading.Condition()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def capacity(self) -> int:
+        return sum(backend.max_concurrency for backend in self.backends)
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        """執行 OCR 呼叫的執行緒池，大小為所有後端的同時請求上限總和"""
+        with self._cond:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.capacity, thread_name_prefix="ocr")
+            return self._executor
+
+    # ---- 選擇後端 ----
+
+    def _score(self, backend: OCRBackend) -> float:
+        latency = backend.latency_ewma if backend.latency_ewma is not None else 0.0
+        load = (backend.in_flight + 1) / backend.max_concurrency
+        # 失敗的代價以一次逾時計，快速失敗（如連線被拒）的後端不會因延遲低而被優先選用
+        return (latency + backend.error_ewma * settings.OCR_TIMEOUT) * load / backend.weight
+
+    def _acquire(self, exclude: set, timeout: float) -> Tuple[OCRBackend, bool]:
+        """取得一個後端的位置，回傳（後端, 是否為剔除期滿後的探測請求）"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                usable = [b for b in self.backends if b.name not in exclude and now >= b.ejected_until]
+                if not usable:
+                    # 全部停用時立即失敗，不再等待逾時
+                    raise OCRUnavailableError("OCR 後端皆暫時停用")
+                # 剔除期滿的後端只放行一個探測請求
+                candidates = [
+                    b for b in usable
+                    if b.in_flight < b.max_concurrency and not (b.ejections and b.probing)
+                ]
+                if candidates:
+                    backend = min(candidates, key=self._score)
+                    backend.in_flight += 1
+                    probe = bool(backend.ejections)
+                    if probe:
+                        backend.probing = True
+                    return backend, probe
+                remaining = deadline - now
+                if remaining <= 0:
+                    raise OCRUnavailableError("OCR 後端皆已滿載")
+                self._cond.wait(remaining)
+
+    # ---- 記錄結果 ----
+
+    def _release(self, backend: OCRBackend, elapsed: float, ok: bool, probe: bool = False):
+        alpha = settings.OCR_EWMA_ALPHA
+        with self._cond:
+            backend.in_flight -= 1
+            if probe:
+                backend.probing = False
+            backend.requests += 1
+            # 失敗（例如逾時）的耗時也計入延遲，慢到逾時的後端分數會變差
+            backend.latency_ewma = elapsed if backend.latency_ewma is None else (
+                alpha * elapsed + (1 - alpha) * backend.latency_ewma
+            )
+            backend.error_ewma = alpha * (0.0 if ok else 1.0) + (1 - alpha) * backend.error_ewma
+            if backend.ejections and not probe:
+                # 剔除前送出的請求只計入統計，恢復或再次剔除由探測請求的結果決定
+                if not ok:
+                    backend.failures += 1
+            elif ok:
+                backend.consecutive_failures = 0
+                if backend.ejected_until:
+                    logger.info(f"OCR 後端 {backend.name} 已恢復")
+                backend.ejected_until = 0.0
+                backend.ejections = 0
+            else:
+                backend.failures += 1
+                backend.consecutive_failures += 1
+                # 探測失敗直接再次剔除（時間倍增），不等累積到剔除門檻
+                if probe or self._should_eject(backend):
+                    self._eject(backend)
+            self._cond.notify_all()
+
+    @staticmethod
+    def _should_eject(backend: OCRBackend) -> bool:
+        if backend.consecutive_failures >= settings.OCR_EJECT_CONSECUTIVE_FAILURES:
+            return True
+        return backend.requests >= 5 and backend.error_ewma >= settings.OCR_EJECT_ERROR_RATE
+
+    @staticmethod
+    def _eject(backend: OCRBackend):
+        duration = min(settings.OCR_EJECT_SECONDS * (2 ** backend.ejections), settings.OCR_EJECT_MAX_SECONDS)
+        backend.ejections += 1
+        backend.ejected_until = time.monotonic() + duration
+        logger.warning(
+            f"OCR 後端 {backend.name} 暫時停用 {duration:.0f} 秒"
+            f"（連續失敗 {backend.consecutive_failures} 次，錯誤率 {backend.error_ewma:.2f}）"
+        )
+
+    # ---- 對外介面 ----
+
+    def recognize(self, image_bytes: bytes) -> Optional[str]:
+        """辨識一張圖片（阻塞），失敗時換後端重試；全部失敗拋出 OCRUnavailableError"""
+        attempts = min(max(1, settings.OCR_RETRY_ATTEMPTS), len(self.backends))
+        tried = set()
+        last_error: Optional[Exception] = None
+        for _ in range(attempts):
+            backend, probe = self._acquire(tried, timeout=settings.OCR_TIMEOUT)
+            tried.add(backend.name)
+            started = time.monotonic()
+            try:
+                result = backend.recognize(image_bytes)
+            except Exception as e:
+                self._release(backend, time.monotonic() - started, ok=False, probe=probe)
+                logger.warning(f"OCR 後端 {backend.name} 失敗: {e}")
+                last_error = e
+                continue
+            self._release(backend, time.monotonic() - started, ok=True, probe=probe)
+            return result
+        raise OCRUnavailableError(f"OCR 後端皆失敗: {last_error}")
+
+    def snapshot(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._cond:
+            return [backend.snapshot(now) for backend in self.backends]
+
+    def shutdown(self):
+        with self._cond:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# ---- 測試用的本機 OCR 替身伺服器 ----
+
+def make_stub_server(port: int = 0, latency: float = 0.0, error_rate: float = 0.0,
+                     result: str = "", host: str = "127.0.0.1"):
+    """
+    建立與上游 OCR API 相同介面的替身伺服器（每個請求一個執行緒）
+
+    回傳 ThreadingHTTPServer，呼叫端以 serve_forever() 啟動；
+    server.latency / server.error_rate 可在執行中調整以模擬上游變慢或故障。
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            time.sleep(self.server.latency)
+            if self.server.error_rate and random.random() < self.server.error_rate:
+                self.send_error(503, "stub failure")
+                return
+            body = json.dumps({"result": self.server.result}, ensure_ascii=False).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.latency, server.error_rate, server.result = latency, error_rate, result
+    return server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="啟動模擬上游 OCR API 的替身伺服器")
+    parser.add_argument("--port", type=int, default=9001)
+    parser.add_argument("--latency", type=float, default=0.5, help="每個請求的延遲（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="回應 503 的機率")
+    parser.add_argument("--result", default='{"姓名": "測試"}', help="回傳的辨識結果")
+    args = parser.parse_args()
+
+    stub = make_stub_server(args.port, args.latency, args.error_rate, args.result)
+    logger.info(f"OCR 替身伺服器：http://127.0.0.1:{stub.server_address[1]}/api/card")
+    stub.serve_forever()
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LANE_INTERACTIVE = "interactive"
+LANE_BATCH = "batch"
+LANE_BACKGROUND = "background"
+LANES = (LANE_INTERACTIVE, LANE_BATCH, LANE_BACKGROUND)
+
+# 延遲百分位數的取樣視窗
+LATENCY_WINDOW = 1000
+
+
+def _percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(math.ceil(q * len(ordered))) - 1)]
+
+
+class _Lane:
+    def __init__(self, name: str, weight: float, limit: int):
+        self.name = name
+        self.weight = max(float(weight), 0.01)
+        self.limit = max(1, limit)
+        self.queue: Deque[asyncio.Future] = deque()
+        self.in_flight = 0
+        self.pass_value = 0.0       # 步幅排程的虛擬時間
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.waits: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+
+    def head(self):
+        """佇列中第一個仍在等待的請求（順便丟掉已取消的）"""
+        while self.queue and self.queue[0].done():
+            self.queue.popleft()
+        return self.queue[0] if self.queue else None
+
+    def snapshot(self) -> Dict:
+        return {
+            "weight": self.weight,
+            "limit": self.limit,
+            "queued": sum(1 for ticket in self.queue if not ticket.done()),
+            "in_flight": self.in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "wait_p50_ms": round(_percentile(self.waits, 0.5) * 1000, 1),
+            "wait_p95_ms": round(_percentile(self.waits, 0.95) * 1000, 1),
+            "latency_p50_ms": round(_percentile(self.latencies, 0.5) * 1000, 1),
+            "latency_p95_ms": round(_percentile(self.latencies, 0.95) * 1000, 1),
+        }
+
+
+class OCRScheduler:
+    """
+    OCR 工作的優先權排程（interactive / batch / background 三個通道）
+
+    - 總同時執行數為所有 OCR 後端的同時請求上限總和
+    - 有空位時以步幅排程（weighted fair）在有工作等待的通道間依權重分配
+    - 每個通道有同時執行上限；另保留 OCR_INTERACTIVE_RESERVED 個位置只給
+      interactive 使用，大量批次工作佔滿其餘容量時，現場掃描仍不必排隊
+    - 排程在事件迴圈中進行，OCR 呼叫在 OCR 路由器的執行緒池中執行
+    """
+
+    def __init__(self, router):
+        self.router = router
+        capacity = router.capacity
+        self.capacity = capacity
+        self.reserved = min(max(0, settings.OCR_INTERACTIVE_RESERVED), capacity - 1)
+        self._lanes: Dict[str, _Lane] = {}
+        for name in LANES:
+            share = settings.OCR_LANE_MAX_SHARE.get(name, 1.0)
+            limit = math.floor(capacity * share)
+            if name != LANE_INTERACTIVE:
+                limit = min(limit, capacity - self.reserved)
+            self._lanes[name] = _Lane(name, settings.OCR_LANE_WEIGHTS.get(name, 1), limit)
+        self._running = 0
+        self._background_running = 0    # 非 interactive 通道執行中的數量
+        self._virtual_time = 0.0
+
+    def lane(self, name: str) -> _Lane:
+        if name not in self._lanes:
+            raise ValueError(f"不支援的 OCR 優先權: {name}（可用 {', '.join(LANES)}）")
+        return self._lanes[name]
+
+    # ---- 排程 ----
+
+    def _eligible(self, lane: _Lane) -> bool:
+        if lane.in_flight >= lane.limit or lane.head() is None:
+            return False
+        return lane.name == LANE_INTERACTIVE or self._background_running < self.capacity - self.reserved
+
+    def _dispatch(self):
+        while self._running < self.capacity:
+            candidates = [lane for lane in self._lanes.values() if self._eligible(lane)]
+            if not candidates:
+                return
+            lane = min(candidates, key=lambda item: (item.pass_value, -item.weight))
+            ticket = lane.queue.popleft()
+            self._virtual_time = lane.pass_value
+            lane.pass_value += 1 / lane.weight
+            lane.in_flight += 1
+            self._running += 1
+            if lane.name != LANE_INTERACTIVE:
+                self._background_running += 1
+            ticket.set_result(None)
+
+    def _release(self, lane: _Lane):
+        lane.in_flight -= 1
+        self._running -= 1
+        if lane.name != LANE_INTERACTIVE:
+            self._background_running -= 1
+        self._dispatch()
+
+    async def run(self, lane_name: str, func: Callable, *args):
+        """在指定通道排隊，輪到時於執行緒池中執行 func(*args) 並回傳結果"""
+        lane = self.lane(lane_name)
+        loop = asyncio.get_running_loop()
+        if lane.head() is None and lane.in_flight == 0:
+            # 閒置後重新加入的通道從目前的虛擬時間起算，不累積閒置期間的額度
+            lane.pass_value = max(lane.pass_value, self._virtual_time)
+        ticket = loop.create_future()
+        lane.queue.append(ticket)
+        lane.submitted += 1
+        enqueued = time.monotonic()
+        self._dispatch()
+        try:
+            await ticket
+        except asyncio.CancelledError:
+            lane.cancelled += 1
+            if ticket.done() and not ticket.cancelled():
+                # 已分配到位置才被取消，歸還位置
+                self._release(lane)
+            raise
+        started = time.monotonic()
+        lane.waits.append(started - enqueued)
+        job = loop.run_in_executor(self.router.executor, func, *args)
+
+        def finished(job: asyncio.Future):
+            # 位置在執行緒真正結束時才歸還：等待者被取消時 OCR 仍在執行，不能提早派出新工作
+            lane.latencies.append(time.monotonic() - enqueued)
+            if not job.cancelled() and job.exception() is None:
+                lane.completed += 1
+            else:
+                lane.failed += 1
+            self._release(lane)
+
+        job.add_done_callback(finished)
+        try:
+            return await asyncio.shield(job)
+        except asyncio.CancelledError:
+            lane.cancelled += 1
+            raise
+
+    def snapshot(self) -> Dict:
+        return {
+            "capacity": self.capacity,
+            "running": self._running,
+            "interactive_reserved": self.reserved,
+            "lanes": {name: lane.snapshot() for name, lane in self._lanes.items()},
+        }
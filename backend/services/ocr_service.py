@@ -1,15 +1,21 @@
-from PIL import Image
 import io
-import numpy as np
 import os
 from datetime import datetime
-import requests
 import re
 import json
 import logging
+import threading
+import time
+from collections import Counter
 from typing import Dict, Optional, List, Tuple
-from dataclasses import dataclass
+from dataclasses import dataclass, field, asdict
 from backend.core.config import settings
+from backend.services.ocr_backends import OCRRouter, OCRUnavailableError, load_backends
+from backend.services.ocr_scheduler import OCRScheduler, LANE_INTERACTIVE, LANE_BATCH
+from backend.services.sheet_service import foreground_mask
+
+# 前景遮罩在其範圍內的填滿比例達此值才視為與背景分離的名片（文字本身約 0.1~0.4）
+CARD_MASK_SOLIDITY = 0.6
 
 @dataclass
 class ParseResult:
@@ -18,6 +24,150 @@ class ParseResult:
     confidence: float = 0.0
     parse_method: str = ""
     
+@dataclass
+class ImageQuality:
+    """OCR 前的圖片品質分數"""
+    sharpness: float          # 拉普拉斯變異數，越大越清晰
+    brightness: float         # 平均亮度 0-255
+    clipped_ratio: float      # 過暗或過曝像素比例（取較大者）
+    contrast: float           # 文字對比（邊緣梯度與亮度範圍取較大者），過曝或過暗到看不清文字時很低
+    coverage: float           # 名片區域佔畫面比例；名片無法與背景區分時視為佔滿畫面
+    width: int
+    height: int
+    elapsed_ms: float = 0.0
+    issues: List[str] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return not self.issues
+
+    def to_dict(self) -> Dict:
+        data = asdict(self)
+        data["passed"] = self.passed
+        return data
+
+
+class ImageQualityError(ValueError):
+    """圖片品質不足以進行 OCR"""
+
+    def __init__(self, quality: ImageQuality):
+        super().__init__("；".join(quality.issues))
+        self.quality = quality
+
+
+def assess_image_quality(image) -> ImageQuality:
+    """
+    評估圖片是否適合 OCR（以 NumPy 在縮小的灰階圖上計算，數毫秒內完成）
+
+    - 清晰度：拉普拉斯運算的變異數，模糊的照片邊緣弱、變異數低
+    - 曝光：平均亮度與接近全黑/全白的像素比例；白色名片紙本身就接近全白，
+      只有文字邊緣也跟著消失（對比不足）時才視為過曝或過暗
+    - 名片覆蓋率：以前景遮罩找出與桌面分離的名片範圍；找不到時（名片佔滿畫面、
+      或名片與桌面同色）不以覆蓋率拒絕
+    """
+    import numpy as np
+    from PIL import Image
+
+    started = time.perf_counter()
+    width, height = image.size
+    scale = settings.OCR_QUALITY_SAMPLE_SIZE / max(width, height, 1)
+    if scale < 1:
+        # 最近鄰取樣不做濾波，縮小大張照片只需約 1 毫秒，且保留原有的銳利度
+        image = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.NEAREST)
+    gray = np.asarray(image.convert("L"), dtype=np.float32)
+
+    laplacian = (
+        gray[:-2, 1:-1] + gray[2:, 1:-1] + gray[1:-1, :-2] + gray[1:-1, 2:] - 4 * gray[1:-1, 1:-1]
+    )
+    sharpness = float(laplacian.var()) if laplacian.size else 0.0
+
+    brightness = float(gray.mean()) if gray.size else 0.0
+    dark = float(np.count_nonzero(gray <= 8)) / max(gray.size, 1)
+    bright = float(np.count_nonzero(gray >= 250)) / max(gray.size, 1)
+    gradient = np.abs(np.diff(gray, axis=0))[:, :-1] + np.abs(np.diff(gray, axis=1))[:-1, :]
+    contrast = 0.0
+    if gradient.size:
+        # 文字很少時亮度範圍不明顯、模糊時梯度弱，兩者取較大者；過曝或過暗時兩者都低
+        low, high = np.percentile(gray, [0.2, 99.8])
+        contrast = max(float(np.percentile(gradient, 99.8)), float(high - low))
+
+    coverage = 1.0
+    mask = foreground_mask(gray, dilate=False) if gray.size else None
+    if mask is not None and mask.any():
+        ys, xs = np.nonzero(mask)
+        top, bottom = np.percentile(ys, [0.5, 99.5]).astype(int)
+        left, right = np.percentile(xs, [0.5, 99.5]).astype(int)
+        region = mask[top:bottom + 1, left:right + 1]
+        if region.mean() >= CARD_MASK_SOLIDITY:
+            coverage = region.size / mask.size
+
+    issues = []
+    faded = contrast < settings.OCR_MIN_TEXT_CONTRAST
+    if faded and (brightness < settings.OCR_MIN_BRIGHTNESS or dark > settings.OCR_MAX_CLIPPED_RATIO):
+        issues.append("圖片過暗，請在光線充足的地方拍攝")
+    elif faded and (brightness > settings.OCR_MAX_BRIGHTNESS or bright > settings.OCR_MAX_CLIPPED_RATIO):
+        issues.append("圖片過亮或反光，請避免閃光燈直射名片")
+    elif sharpness < settings.OCR_MIN_SHARPNESS:
+        # 曝光不良時對比低，清晰度分數不可靠，只提示曝光問題
+        issues.append("圖片模糊，請對焦並保持手機穩定後重新拍攝")
+    if coverage < settings.OCR_MIN_CARD_COVERAGE:
+        issues.append("名片在畫面中太小，請靠近名片讓名片佔滿畫面")
+
+    return ImageQuality(
+        sharpness=round(sharpness, 1),
+        brightness=round(brightness, 1),
+        clipped_ratio=round(max(dark, bright), 3),
+        contrast=round(contrast, 1),
+        coverage=round(coverage, 3),
+        width=width,
+        height=height,
+        elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+        issues=issues,
+    )
+
+
+class QualityStats:
+    """品質檢查統計：檢查數、拒絕數（即省下的 OCR 呼叫）與各項分數平均"""
+
+    SCORES = ("sharpness", "brightness", "clipped_ratio", "contrast", "coverage", "elapsed_ms")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.rejected = 0
+        self.upstream_calls = 0
+        self.reasons = Counter()
+        self._totals = dict.fromkeys(self.SCORES, 0.0)
+
+    def record(self, quality: ImageQuality):
+        with self._lock:
+            self.checked += 1
+            for name in self.SCORES:
+                self._totals[name] += getattr(quality, name)
+            if not quality.passed:
+                self.rejected += 1
+                self.reasons.update(quality.issues)
+
+    def record_upstream_call(self):
+        with self._lock:
+            self.upstream_calls += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "rejected": self.rejected,
+                "rejected_ratio": round(self.rejected / self.checked, 3) if self.checked else 0.0,
+                "upstream_calls": self.upstream_calls,
+                "upstream_calls_avoided": self.rejected,
+                "reasons": dict(self.reasons),
+                "averages": {
+                    name: round(total / self.checked, 3) if self.checked else 0.0
+                    for name, total in self._totals.items()
+                },
+            }
+
+
 class FieldMapper:
     """負責欄位映射的獨立類"""
     
@@ -662,61 +812,68 @@ class OCRService:
             KeyValueParser(self.field_mapper, self.logger)
         ]
         
-    async def ocr_image(self, image_bytes: bytes):
-        """OCR圖片識別"""
-        files = []
+        self.quality_stats = QualityStats()
+        
+        # OCR 後端：OCR_BACKENDS 設定的多個提供者，或指定/預設的單一 OCR_URL
+        self.router = OCRRouter(load_backends(OCR_URL))
+        # 依優先權通道排程：現場掃描不會被批次工作卡住
+        self.scheduler = OCRScheduler(self.router)
+        
+    def check_quality(self, image) -> ImageQuality:
+        """檢查圖片品質並記錄分數；不合格時拋出 ImageQualityError"""
+        quality = assess_image_quality(image)
+        self.quality_stats.record(quality)
+        self.logger.info(
+            f"圖片品質：清晰度 {quality.sharpness}，亮度 {quality.brightness}，"
+            f"過曝/過暗 {quality.clipped_ratio}，對比 {quality.contrast}，名片覆蓋率 {quality.coverage}（{quality.elapsed_ms} ms）"
+        )
+        if not quality.passed:
+            raise ImageQualityError(quality)
+        return quality
+        
+    async def ocr_image(self, image_bytes: bytes, check_quality: bool = True, lane: str = LANE_INTERACTIVE):
+        """OCR圖片識別；品質不合格的圖片不送出，直接拋出 ImageQualityError"""
+        # OCR API 為阻塞式呼叫，由排程器在執行緒池中執行，不阻塞事件迴圈；
+        # 執行緒數為所有後端同時請求上限的總和，吞吐量隨後端數增加
+        return await self.scheduler.run(lane, self.recognize, image_bytes, check_quality)
+        
+    async def ocr_decoded_image(self, image, check_quality: bool = True, lane: str = LANE_BATCH):
+        """辨識已解碼的 PIL 圖片（例如合照切出的名片），同樣經過優先權排程"""
+        return await self.scheduler.run(lane, self.recognize_image, image, check_quality)
+        
+    def recognize(self, image_bytes: bytes, check_quality: bool = True):
+        """同步版 OCR：解碼圖片後呼叫 OCR API"""
+        from PIL import Image
+        
+        try:
+            image = Image.open(io.BytesIO(image_bytes))
+        except Exception as e:
+            self.logger.error(f"無法讀取圖片: {e}")
+            return None
+        return self.recognize_image(image, check_quality)
+        
+    def recognize_image(self, image, check_quality: bool = True):
+        """辨識已解碼的 PIL 圖片（名片裁切圖直接傳入，不必重新編碼解碼）"""
         try:
             # 準備圖片
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+            image = image.convert('RGB')
+            if check_quality and settings.OCR_QUALITY_CHECK:
+                self.check_quality(image)
             buffer = io.BytesIO()
             image.save(buffer, format="JPEG")
-            buffer.seek(0)
-            files.append(('file', ('image.jpg', buffer, 'image/jpeg')))
-            
-            # 設置請求headers和超時
-            headers = {
-                'User-Agent': 'OCR-Service/1.0',
-            }
             
-            self.logger.info(f"正在調用OCR API: {self.OCR_URL}")
-            
-            # 嘗試不同的請求方式
-            # 直接使用正確的API格式
-            response = requests.post(
-                self.OCR_URL, 
-                files=files, 
-                headers=headers,
-                verify=settings.OCR_VERIFY_SSL,
-                timeout=settings.OCR_TIMEOUT
-            )
-            response.raise_for_status()
-            result = response.json()
+            # 由路由器選擇目前最快且健康的 OCR 後端，失敗時自動換後端重試
+            self.quality_stats.record_upstream_call()
+            result = self.router.recognize(buffer.getvalue())
             self.logger.info(f"OCR API響應成功: {result}")
-            return result.get("result")
+            return result
         
-        except requests.exceptions.SSLError as e:
-            self.logger.error(f"SSL證書錯誤: {e}")
-            self.logger.info("建議：檢查OCR API的SSL配置或聯繫API提供方")
+        except ImageQualityError:
+            raise
             
-        except requests.exceptions.HTTPError as e:
-            self.logger.error(f"HTTP錯誤: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                self.logger.error(f"響應內容: {e.response.text}")
-                self.logger.error(f"響應headers: {dict(e.response.headers)}")
-            
-        except requests.exceptions.ConnectionError as e:
-            self.logger.error(f"連接錯誤: {e}")
-            self.logger.info("建議：檢查網絡連接或API服務狀態")
-            
-        except requests.exceptions.Timeout as e:
-            self.logger.error(f"請求超時: {e}")
-            self.logger.info("建議：檢查網絡速度或增加超時時間")
-            
-        except requests.exceptions.RequestException as e:
+        except OCRUnavailableError as e:
             self.logger.error(f"OCR請求失敗: {e}")
-            
-        except ValueError as e:
-            self.logger.error(f"OCR回傳格式錯誤: {e}")
+            self.logger.info("建議：檢查 OCR 後端狀態（GET /api/v1/ocr/backends）或網絡連接")
             
         except Exception as e:
             self.logger.error(f"OCR處理異常: {e}")
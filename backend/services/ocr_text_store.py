@@ -0,0 +1,196 @@
+import logging
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.card import CardOCRTextORM, OCRTextDictORM
+
+try:
+    import zstandard
+except ImportError:  # zstd 為選用套件，未安裝時使用 zlib
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+CODEC_ZLIB = "zlib"
+CODEC_ZSTD = "zstd"
+CODEC_ZSTD_DICT = "zstd-dict"
+
+# 用於 save_ocr_texts：表示該面不變更
+UNCHANGED = object()
+
+_dict_table = OCRTextDictORM.__table__
+
+
+class OCRTextCodec:
+    """
+    OCR 原始文字壓縮器
+
+    優先使用以名片 OCR JSON 訓練的 zstd 字典（小型 JSON 壓縮率最好），
+    其次為一般 zstd，未安裝 zstandard 時退回 zlib。每筆資料記錄所用的
+    codec 與字典 id；字典存放在同一個資料庫的 ocr_text_dicts，只新增不覆寫，
+    只備份資料庫或搬到新主機時舊資料仍可解壓。
+
+    需要讀寫字典的方法接受 db（Session，或遷移時的 Connection）。
+    """
+
+    def __init__(self, level: int = None):
+        self.level = level if level is not None else settings.OCR_TEXT_COMPRESSION_LEVEL
+        self._lock = threading.Lock()
+        self._dicts: Dict[int, "zstandard.ZstdCompressionDict"] = {}
+        self._active_dict_id: Optional[int] = None
+        self._active_loaded = False
+
+    # ---- 字典管理 ----
+
+    def _load_dict(self, db, dict_id: int):
+        with self._lock:
+            dict_data = self._dicts.get(dict_id)
+        if dict_data is not None:
+            return dict_data
+        data = db.execute(select(_dict_table.c.data).where(_dict_table.c.dict_id == dict_id)).scalar()
+        if data is None:
+            raise LookupError(f"找不到 OCR 文字壓縮字典 {dict_id}")
+        dict_data = zstandard.ZstdCompressionDict(data)
+        with self._lock:
+            self._dicts[dict_id] = dict_data
+        return dict_data
+
+    def active_dict_id(self, db) -> Optional[int]:
+        """最新建立的字典（新資料使用）；字典很少新增，查詢結果保留在記憶體"""
+        if zstandard is None:
+            return None
+        if not self._active_loaded:
+            self._active_dict_id = db.execute(
+                select(_dict_table.c.dict_id)
+                .order_by(_dict_table.c.created_at.desc(), _dict_table.c.dict_id.desc())
+                .limit(1)
+            ).scalar()
+            self._active_loaded = True
+        return self._active_dict_id
+
+    def train_dictionary(self, db, samples: List[bytes], dict_size: int = 16 * 1024) -> Optional[int]:
+        """
+        以現有 OCR 文字訓練 zstd 字典並寫入 ocr_text_dicts（由呼叫端 commit）
+
+        提交後成為新資料使用的字典。
+        """
+        if zstandard is None:
+            logger.warning("未安裝 zstandard，略過字典訓練")
+            return None
+        if len(samples) < 10:
+            logger.warning(f"樣本數不足（{len(samples)}），略過字典訓練")
+            return None
+        trained = zstandard.train_dictionary(dict_size, samples)
+        dict_id = trained.dict_id()
+        exists = db.execute(select(_dict_table.c.dict_id).where(_dict_table.c.dict_id == dict_id)).first()
+        if exists is None:
+            db.execute(_dict_table.insert().values(dict_id=dict_id, data=trained.as_bytes()))
+        with self._lock:
+            self._dicts[dict_id] = trained
+            # 下次使用時由資料庫重新讀取最新字典（尚未提交的字典不會被其他連線引用）
+            self._active_loaded = False
+        logger.info(f"已訓練 OCR 文字字典 {dict_id}（{len(samples)} 筆樣本）")
+        return dict_id
+
+    # ---- 壓縮 / 解壓 ----
+
+    def current_codec(self, db) -> Tuple[str, Optional[int]]:
+        """新資料使用的 (codec, 字典 id)"""
+        if zstandard is None:
+            return CODEC_ZLIB, None
+        dict_id = self.active_dict_id(db)
+        return (CODEC_ZSTD_DICT, dict_id) if dict_id else (CODEC_ZSTD, None)
+
+    def compress(self, db, data: bytes, codec: str, dict_id: Optional[int] = None) -> bytes:
+        if codec == CODEC_ZLIB:
+            return zlib.compress(data, min(self.level, 9))
+        if codec == CODEC_ZSTD:
+            return zstandard.ZstdCompressor(level=self.level).compress(data)
+        dict_data = self._load_dict(db, dict_id)
+        return zstandard.ZstdCompressor(level=self.level, dict_data=dict_data).compress(data)
+
+    def decompress(self, db, blob: bytes, codec: str, dict_id: Optional[int] = None) -> bytes:
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(blob)
+        if zstandard is None:
+            raise RuntimeError(f"需要安裝 zstandard 才能解壓 {codec} 資料")
+        if codec == CODEC_ZSTD:
+            return zstandard.ZstdDecompressor().decompress(blob)
+        dict_data = self._load_dict(db, dict_id)
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(blob)
+
+    def encode_text(self, db, text: Optional[str], codec: str, dict_id: Optional[int] = None) -> Optional[bytes]:
+        if not text:
+            return None
+        return self.compress(db, text.encode("utf-8"), codec, dict_id)
+
+    def decode_text(self, db, blob: Optional[bytes], codec: str, dict_id: Optional[int] = None) -> Optional[str]:
+        if blob is None:
+            return None
+        return self.decompress(db, blob, codec, dict_id).decode("utf-8")
+
+
+ocr_text_codec = OCRTextCodec()
+
+
+def load_ocr_texts(db: Session, card_ids: Iterable[int]) -> Dict[int, Tuple[Optional[str], Optional[str]]]:
+    """批次讀取並解壓多張名片的 OCR 原始文字 {card_id: (front, back)}"""
+    card_ids = list(card_ids)
+    if not card_ids:
+        return {}
+    texts = {}
+    # SQLite 的參數數量有上限，分批查詢
+    for start in range(0, len(card_ids), 500):
+        chunk = card_ids[start:start + 500]
+        for row in db.query(CardOCRTextORM).filter(CardOCRTextORM.card_id.in_(chunk)):
+            texts[row.card_id] = (
+                ocr_text_codec.decode_text(db, row.front_ocr, row.codec, row.dict_id),
+                ocr_text_codec.decode_text(db, row.back_ocr, row.codec, row.dict_id),
+            )
+    return texts
+
+
+def save_ocr_texts(db: Session, card_id: int, front=UNCHANGED, back=UNCHANGED) -> bool:
+    """
+    壓縮並寫入名片的 OCR 原始文字（不 commit），傳 UNCHANGED 的一面保持原值
+
+    Returns:
+        bool: 內容是否有變更
+    """
+    row = db.get(CardOCRTextORM, card_id)
+    if row is not None:
+        old_front = ocr_text_codec.decode_text(db, row.front_ocr, row.codec, row.dict_id)
+        old_back = ocr_text_codec.decode_text(db, row.back_ocr, row.codec, row.dict_id)
+    else:
+        old_front = old_back = None
+    new_front = old_front if front is UNCHANGED else (front or None)
+    new_back = old_back if back is UNCHANGED else (back or None)
+    if row is not None and (new_front, new_back) == (old_front, old_back):
+        return False
+
+    if not new_front and not new_back:
+        if row is not None:
+            db.delete(row)
+            return True
+        return False
+
+    codec, dict_id = ocr_text_codec.current_codec(db)
+    if row is None:
+        row = CardOCRTextORM(card_id=card_id)
+        db.add(row)
+    row.codec, row.dict_id = codec, dict_id
+    row.front_ocr = ocr_text_codec.encode_text(db, new_front, codec, dict_id)
+    row.back_ocr = ocr_text_codec.encode_text(db, new_back, codec, dict_id)
+    return True
+
+
+def delete_ocr_texts(db: Session, card_ids: Iterable[int]):
+    """刪除名片的 OCR 原始文字（不 commit）"""
+    card_ids = list(card_ids)
+    if card_ids:
+        db.query(CardOCRTextORM).filter(CardOCRTextORM.card_id.in_(card_ids)).delete(synchronize_session=False)
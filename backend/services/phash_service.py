@@ -0,0 +1,374 @@
+import io
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.card import ImageBlobORM
+from backend.services.image_store import ImageStore
+from backend.services.sync_service import ChangeFollower
+
+logger = logging.getLogger(__name__)
+
+HASH_BITS = 64
+# 多重索引雜湊：64 位元切成 4 段 16 位元，距離 ≤ r 的雜湊至少有一段距離 ≤ r // 4
+CHUNKS = 4
+CHUNK_BITS = HASH_BITS // CHUNKS
+# 新增的雜湊先放在差異區（線性比對），累積到此數量才合併重建
+DELTA_MERGE_SIZE = 20000
+# 其他 worker 修改的名片超過此數量時直接重建索引
+MAX_REPLAY_CARDS = 5000
+
+# 名片正反面圖片的雜湊（圖片存放區以外的舊版路徑沒有雜湊）
+_CARD_HASHES_SQL = """
+    SELECT c.id, f.dhash, b.dhash FROM cards c
+    LEFT JOIN image_blobs f ON f.path = c.front_image_path
+    LEFT JOIN image_blobs b ON b.path = c.back_image_path
+"""
+
+SIDES = ("front", "back")
+
+
+def _popcount(values):
+    import numpy as np
+
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    # NumPy 1.x
+    return np.unpackbits(values.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+# ---- 雜湊計算 ----
+
+def dhash_image(image, size: int = 8) -> int:
+    """計算 dHash（相鄰像素亮度差，64 位元）；對縮放、壓縮與輕微角度變化不敏感"""
+    import numpy as np
+    from PIL import Image, ImageOps
+
+    image.draft("L", (size * 16, size * 16))
+    image = ImageOps.exif_transpose(image).convert("L").resize((size + 1, size), Image.LANCZOS)
+    pixels = np.asarray(image, dtype=np.int16)
+    bits = np.packbits(pixels[:, 1:] > pixels[:, :-1])
+    return int.from_bytes(bits.tobytes(), "big")
+
+
+def dhash_bytes(content: bytes) -> Optional[int]:
+    from PIL import Image
+
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            return dhash_image(image)
+    except Exception as e:
+        logger.warning(f"無法計算圖片雜湊: {e}")
+        return None
+
+
+def dhash_file(path: str) -> Optional[int]:
+    from PIL import Image
+
+    try:
+        with Image.open(path) as image:
+            return dhash_image(image)
+    except Exception as e:
+        logger.warning(f"無法計算圖片雜湊 {path}: {e}")
+        return None
+
+
+def to_signed(value: int) -> int:
+    """無號 64 位元轉為 SQLite INTEGER 可存放的有號值"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value: Optional[int]) -> Optional[int]:
+    return None if value is None else value & ((1 << 64) - 1)
+
+
+def ensure_image_hashes(db: Session, paths: Sequence[Optional[str]]) -> List[Optional[int]]:
+    """
+    取得圖片的感知雜湊，尚未計算的立即計算並寫入 image_blobs（由呼叫端 commit）
+
+    存放區以外的舊版路徑只計算不保存。
+    """
+    hashes = []
+    for path in paths:
+        if not path:
+            hashes.append(None)
+            continue
+        digest = ImageStore.digest_of(path)
+        stored = db.query(ImageBlobORM.dhash).filter(ImageBlobORM.digest == digest).scalar() if digest else None
+        if stored is not None:
+            hashes.append(to_unsigned(stored))
+            continue
+        value = dhash_file(path) if os.path.exists(path) else None
+        if value is not None and digest:
+            db.query(ImageBlobORM).filter(ImageBlobORM.digest == digest).update(
+                {"dhash": to_signed(value)}, synchronize_session=False
+            )
+        hashes.append(value)
+    return hashes
+
+
+# ---- 索引 ----
+
+class PerceptualIndex:
+    """
+    名片圖片感知雜湊索引（多重索引雜湊，漢明距離查詢）
+
+    主索引以 NumPy 陣列存放（依 entry 排序的雜湊，以及每段 16 位元的排序表），
+    查詢時對每段列舉距離 ≤ r // 4 的所有值，以 searchsorted 取得候選再精確計算距離，
+    候選數遠小於總數。entry = card_id * 2 + 面（0 正面 / 1 反面）。
+    新增與刪除先記錄在差異區，累積到一定數量才重建主索引。
+    其他 worker 的寫入在每次使用前依 card_changes 重新載入被修改的名片。
+    NumPy 在建立索引時才匯入，不影響程序啟動時間。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        # 以下 NumPy 陣列於第一次 refresh 時建立
+        self._entries = None
+        self._hashes = None
+        self._chunk_values: List = []
+        self._chunk_order: List = []
+        self._delta: Dict[int, int] = {}
+        self._removed: set = set()
+        self._changes = ChangeFollower(max_cards=MAX_REPLAY_CARDS)
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    # ---- 建立 ----
+
+    def refresh(self, db: Session, batch_size: int = 10000):
+        """使用索引前呼叫：第一次使用時由資料庫建立索引，之後追上其他 worker 的修改"""
+        with self._lock:
+            if self._built:
+                card_ids = self._changes.poll(db)
+                if card_ids is not None:
+                    self._reload(db, card_ids)
+                    return
+            self._build(db, batch_size)
+
+    def _build(self, db: Session, batch_size: int):
+        import numpy as np
+
+        started = time.monotonic()
+        # 先記下游標再載入，載入期間的修改會在下次 refresh 時重新載入
+        self._changes.mark(db)
+        entries, hashes = [], []
+        rows = db.execute(text(
+            _CARD_HASHES_SQL + " WHERE f.dhash IS NOT NULL OR b.dhash IS NOT NULL"
+        )).yield_per(batch_size)
+        for card_id, front, back in rows:
+            for side, value in enumerate((front, back)):
+                if value is not None:
+                    entries.append(card_id * 2 + side)
+                    hashes.append(to_unsigned(value))
+        self._rebuild(np.array(entries, dtype=np.int64), np.array(hashes, dtype=np.uint64))
+        self._built = True
+        logger.info(f"圖片雜湊索引建立完成：{len(entries)} 張圖片，耗時 {time.monotonic() - started:.2f} 秒")
+
+    def _reload(self, db: Session, card_ids: List[int]):
+        """由資料庫重新載入指定名片的雜湊，已刪除的名片移出索引"""
+        query = text(_CARD_HASHES_SQL + " WHERE c.id IN :ids").bindparams(bindparam("ids", expanding=True))
+        for start in range(0, len(card_ids), 500):
+            chunk = card_ids[start:start + 500]
+            found = {card_id: (front, back) for card_id, front, back in db.execute(query, {"ids": chunk})}
+            for card_id in chunk:
+                front, back = found.get(card_id, (None, None))
+                self.set_card(card_id, to_unsigned(front), to_unsigned(back))
+
+    def _rebuild(self, entries, hashes):
+        import numpy as np
+
+        order = np.argsort(entries, kind="stable")
+        self._entries, self._hashes = entries[order], hashes[order]
+        self._chunk_values, self._chunk_order = [], []
+        for chunk in range(CHUNKS):
+            values = ((self._hashes >> np.uint64(chunk * CHUNK_BITS)) & np.uint64(0xFFFF)).astype(np.uint16)
+            chunk_order = np.argsort(values, kind="stable").astype(np.int32)
+            self._chunk_values.append(values[chunk_order])
+            self._chunk_order.append(chunk_order)
+        self._delta.clear()
+        self._removed.clear()
+
+    def _merge(self):
+        import numpy as np
+
+        keep = ~np.isin(self._entries, np.fromiter(self._removed | set(self._delta), dtype=np.int64))
+        entries = np.concatenate([self._entries[keep], np.fromiter(self._delta.keys(), dtype=np.int64)])
+        hashes = np.concatenate([self._hashes[keep], np.fromiter(self._delta.values(), dtype=np.uint64)])
+        self._rebuild(entries, hashes)
+
+    def reset(self):
+        with self._lock:
+            self._entries = self._hashes = None
+            self._chunk_values, self._chunk_order = [], []
+            self._delta.clear()
+            self._removed.clear()
+            self._built = False
+
+    # ---- 維護 ----
+
+    def set_card(self, card_id: int, front: Optional[int], back: Optional[int]):
+        """更新名片正反面的雜湊（索引尚未建立時略過，建立時會一併載入）"""
+        if not self._built:
+            return
+        with self._lock:
+            for side, value in enumerate((front, back)):
+                entry = card_id * 2 + side
+                self._removed.add(entry)
+                self._delta.pop(entry, None)
+                if value is not None:
+                    self._delta[entry] = value
+            if len(self._delta) + len(self._removed) >= DELTA_MERGE_SIZE:
+                self._merge()
+
+    def remove_card(self, card_id: int):
+        self.set_card(card_id, None, None)
+
+    # ---- 查詢 ----
+
+    @staticmethod
+    def _probes(value: int, radius: int):
+        """與 16 位元值距離 ≤ radius 的所有值"""
+        import numpy as np
+
+        probes = np.array([value], dtype=np.uint16)
+        for _ in range(radius):
+            flips = (probes[:, None] ^ (np.uint16(1) << np.arange(CHUNK_BITS, dtype=np.uint16))).ravel()
+            probes = np.unique(np.concatenate([probes, flips]))
+        return probes
+
+    def _lookup(self, entry: int) -> Optional[int]:
+        import numpy as np
+
+        if entry in self._delta:
+            return self._delta[entry]
+        if entry in self._removed or self._entries is None:
+            return None
+        position = np.searchsorted(self._entries, entry)
+        if position < len(self._entries) and self._entries[position] == entry:
+            return int(self._hashes[position])
+        return None
+
+    def search(self, value: int, max_distance: int) -> List[Tuple[int, int]]:
+        """找出距離 ≤ max_distance 的圖片，回傳 [(entry, distance)]，依距離排序"""
+        import numpy as np
+
+        with self._lock:
+            radius = max_distance // CHUNKS
+            candidates = []
+            for chunk in range(len(self._chunk_values)):
+                probes = self._probes((value >> (chunk * CHUNK_BITS)) & 0xFFFF, radius)
+                values = self._chunk_values[chunk]
+                low = np.searchsorted(values, probes, side="left")
+                high = np.searchsorted(values, probes, side="right")
+                hits = high > low
+                for start, end in zip(low[hits], high[hits]):
+                    candidates.append(self._chunk_order[chunk][start:end])
+            results = {}
+            if candidates:
+                positions = np.unique(np.concatenate(candidates))
+                distances = _popcount(self._hashes[positions] ^ np.uint64(value))
+                close = distances <= max_distance
+                for entry, distance in zip(self._entries[positions][close].tolist(), distances[close].tolist()):
+                    if entry not in self._removed:
+                        results[entry] = distance
+            for entry, other in self._delta.items():
+                distance = bin(value ^ other).count("1")
+                if distance <= max_distance:
+                    results[entry] = distance
+        return sorted(results.items(), key=lambda item: (item[1], item[0]))
+
+    def find_cards(self, hashes: Iterable[Optional[int]], max_distance: int = None,
+                   exclude: Optional[int] = None, limit: int = 20) -> List[Dict]:
+        """以一組圖片雜湊找出相似名片（同一張名片取最小距離）"""
+        max_distance = settings.PHASH_MAX_DISTANCE if max_distance is None else max_distance
+        best: Dict[int, Dict] = {}
+        for query_side, value in zip(SIDES, hashes):
+            if value is None:
+                continue
+            for entry, distance in self.search(value, max_distance):
+                card_id, side = divmod(entry, 2)
+                if card_id == exclude:
+                    continue
+                current = best.get(card_id)
+                if current is None or distance < current["distance"]:
+                    best[card_id] = {
+                        "card_id": card_id,
+                        "distance": distance,
+                        "similarity": round(1 - distance / HASH_BITS, 3),
+                        "side": SIDES[side],
+                        "matched_side": query_side,
+                    }
+        return sorted(best.values(), key=lambda item: (item["distance"], item["card_id"]))[:limit]
+
+    def similar(self, card_id: int, max_distance: int = None, limit: int = 20) -> Optional[List[Dict]]:
+        """找出與指定名片圖片相似的名片；名片沒有圖片雜湊時回傳 None"""
+        with self._lock:
+            hashes = [self._lookup(card_id * 2 + side) for side in range(2)]
+        if all(value is None for value in hashes):
+            return None
+        return self.find_cards(hashes, max_distance, exclude=card_id, limit=limit)
+
+
+# 全域索引實例（每個 worker 一份）
+phash_index = PerceptualIndex()
+
+
+# ---- 補齊既有圖片的雜湊 ----
+
+def backfill(workers: int = None, batch_size: int = 500) -> Dict[str, int]:
+    """為尚未計算雜湊的圖片補上 dHash（多程序計算，分批寫回）"""
+    from backend.models.db import SessionLocal
+
+    stats = {"hashed": 0, "failed": 0}
+    db = SessionLocal()
+    started = time.monotonic()
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+            last = ""
+            while True:
+                rows = (
+                    db.query(ImageBlobORM.digest, ImageBlobORM.path)
+                    .filter(ImageBlobORM.dhash.is_(None), ImageBlobORM.digest > last)
+                    .order_by(ImageBlobORM.digest)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+                last = rows[-1].digest
+                for (digest, _), value in zip(rows, pool.map(dhash_file, [row.path for row in rows], chunksize=16)):
+                    if value is None:
+                        stats["failed"] += 1
+                        continue
+                    db.query(ImageBlobORM).filter(ImageBlobORM.digest == digest).update(
+                        {"dhash": to_signed(value)}, synchronize_session=False
+                    )
+                    stats["hashed"] += 1
+                db.commit()
+                logger.info(f"已計算 {stats['hashed']} 張圖片雜湊")
+    finally:
+        db.close()
+    logger.info(f"圖片雜湊補齊完成：{stats}，耗時 {time.monotonic() - started:.1f} 秒")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="為既有名片圖片計算感知雜湊")
+    parser.add_argument("--workers", type=int, default=None, help="計算雜湊的程序數")
+    args = parser.parse_args()
+    print(json.dumps(backfill(workers=args.workers), ensure_ascii=False))
@@ -0,0 +1,192 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, Optional
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RENDITION_MEDIA_TYPES = {".webp": "image/webp", ".jpg": "image/jpeg"}
+
+
+def rendition_extension() -> str:
+    return ".webp" if settings.RENDITION_FORMAT.lower() == "webp" else ".jpg"
+
+
+def rendition_path(image_path: str, name: str) -> str:
+    """縮圖與原圖放在同一目錄：<原檔名>.<版本><副檔名>"""
+    stem, _ = os.path.splitext(image_path)
+    return f"{stem}.{name}{rendition_extension()}"
+
+
+def render_rendition(source: str, target: str, max_size: int, quality: int) -> int:
+    """
+    產生一張縮圖（在子程序中執行），回傳檔案大小
+
+    JPEG 以 draft 模式直接以縮小比例解碼，避免完整解碼大張照片；
+    先寫暫存檔再原子性地放到定位。
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(source) as image:
+        image.draft("RGB", (max_size, max_size))
+        image = ImageOps.exif_transpose(image)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+        tmp_path = f"{target}.{os.getpid()}.part"
+        if target.endswith(".webp"):
+            image.save(tmp_path, format="WEBP", quality=quality, method=4)
+        else:
+            image.save(tmp_path, format="JPEG", quality=quality, optimize=True, progressive=True)
+    os.replace(tmp_path, target)
+    return os.path.getsize(target)
+
+
+class RenditionService:
+    """
+    名片圖片縮圖產生器
+
+    縮圖（thumb / medium）在程序池中產生，不佔用 API worker 的 CPU 與 GIL：
+    上傳後立即排入背景產生，請求時若尚未產生則同步等待，亦可用 backfill 批次補齊。
+    同一張縮圖同時只會產生一次。
+    """
+
+    def __init__(self, workers: int = None):
+        self.workers = workers or settings.RENDITION_WORKERS
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Future] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        """取得程序池（呼叫端需持有 self._lock）"""
+        if self._executor is None:
+            # API 程序有多個執行緒，不使用 fork 以免子程序繼承被鎖住的鎖
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        return self._executor
+
+    def submit(self, image_path: str, name: str, force: bool = False) -> Optional[Future]:
+        """排入產生一張縮圖；已存在時回傳 None"""
+        if name not in settings.RENDITION_SIZES:
+            raise ValueError(f"不支援的縮圖版本: {name}")
+        target = rendition_path(image_path, name)
+        if not force and os.path.exists(target):
+            return None
+        args = (image_path, target, settings.RENDITION_SIZES[name], settings.RENDITION_QUALITY)
+        with self._lock:
+            future = self._pending.get(target)
+            if future is not None:
+                return future
+            try:
+                future = self._pool().submit(render_rendition, *args)
+            except BrokenProcessPool:
+                # 子程序異常結束（例如解碼時記憶體不足）後程序池無法再使用，重建後重試
+                logger.warning("縮圖程序池已損壞，重新建立")
+                self._executor = None
+                future = self._pool().submit(render_rendition, *args)
+            self._pending[target] = future
+        future.add_done_callback(lambda f, target=target: self._done(target, f))
+        return future
+
+    def _done(self, target: str, future: Future):
+        with self._lock:
+            self._pending.pop(target, None)
+        error = future.exception()
+        if error is not None:
+            logger.warning(f"縮圖產生失敗 {target}: {error}")
+
+    def schedule(self, image_paths: Iterable[Optional[str]]):
+        """上傳後在背景產生所有版本的縮圖（不等待完成）"""
+        for path in image_paths:
+            if path and os.path.exists(path):
+                for name in settings.RENDITION_SIZES:
+                    self.submit(path, name)
+
+    def ensure(self, image_path: str, name: str, timeout: float = 30) -> Optional[str]:
+        """取得縮圖路徑，尚未產生時立即產生並等待；原圖不存在或無法解碼時回傳 None"""
+        if not os.path.exists(image_path):
+            return None
+        future = self.submit(image_path, name)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception as e:
+                logger.warning(f"無法產生縮圖 {image_path} ({name}): {e}")
+                return None
+        return rendition_path(image_path, name)
+
+    def backfill(self, force: bool = False, batch_size: int = 1000,
+                 progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, int]:
+        """為所有名片圖片補齊縮圖，同時進行的工作數受限以控制記憶體"""
+        from backend.services.export_service import iter_card_rows
+
+        stats = {"images": 0, "created": 0, "skipped": 0, "missing": 0, "failed": 0}
+        in_flight = set()
+        max_in_flight = self.workers * 4
+
+        def collect():
+            nonlocal in_flight
+            done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                stats["failed" if future.exception() else "created"] += 1
+
+        started = time.monotonic()
+        for front, back in iter_card_rows(["front_image_path", "back_image_path"], batch_size):
+            for path in (front, back):
+                if not path:
+                    continue
+                stats["images"] += 1
+                if not os.path.exists(path):
+                    stats["missing"] += 1
+                    continue
+                for name in settings.RENDITION_SIZES:
+                    future = self.submit(path, name, force=force)
+                    if future is None:
+                        stats["skipped"] += 1
+                        continue
+                    in_flight.add(future)
+                    if len(in_flight) >= max_in_flight:
+                        collect()
+                if progress:
+                    progress(stats["images"], stats["created"])
+        while in_flight:
+            collect()
+        logger.info(
+            f"縮圖補齊完成：{stats['images']} 張圖片，新產生 {stats['created']} 張縮圖，"
+            f"失敗 {stats['failed']}，耗時 {time.monotonic() - started:.1f} 秒"
+        )
+        return stats
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+# 全域縮圖產生器
+rendition_service = RenditionService()
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="為既有名片圖片補齊縮圖")
+    parser.add_argument("--workers", type=int, default=None, help="產生縮圖的程序數")
+    parser.add_argument("--force", action="store_true", help="重新產生已存在的縮圖")
+    args = parser.parse_args()
+
+    service = RenditionService(workers=args.workers or os.cpu_count())
+    try:
+        print(json.dumps(service.backfill(force=args.force), ensure_ascii=False))
+    finally:
+        service.shutdown()
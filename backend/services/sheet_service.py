@@ -0,0 +1,307 @@
+import asyncio
+import base64
+import io
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+from backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 偵測用縮圖的最長邊
+DETECT_SIZE = 1000
+# 名片寬高比（長邊 / 短邊）的容許範圍；標準名片約 1.65
+CARD_ASPECT_RANGE = (1.2, 2.4)
+# 傾斜角度小於此值時不旋轉
+MIN_DESKEW_DEGREES = 0.5
+# 整張照片傾斜超過此角度時先轉正再切割（角度小時名片間的空隙仍足以投影切割）
+MIN_SHEET_DESKEW_DEGREES = 2.0
+
+
+@dataclass
+class CardRegion:
+    """整張照片中偵測到的一張名片（座標為原圖像素）"""
+    box: Tuple[int, int, int, int]      # left, top, right, bottom
+    angle: float                        # 傾斜角度（度，逆時針為正）
+    crop: object = field(repr=False, default=None)   # 轉正後的 PIL 裁切圖
+
+
+def _dilate(mask, radius: int):
+    """以位移取聯集做二值膨脹（不依賴 SciPy）"""
+    rows = mask.copy()
+    for step in range(1, radius + 1):
+        rows[step:] |= mask[:-step]
+        rows[:-step] |= mask[step:]
+    result = rows.copy()
+    for step in range(1, radius + 1):
+        result[:, step:] |= rows[:, :-step]
+        result[:, :-step] |= rows[:, step:]
+    return result
+
+
+def foreground_mask(gray, threshold: float = None, dilate: bool = True):
+    """
+    名片與桌面的前景遮罩
+
+    以畫面四周的中位數亮度當作背景，與背景差異大的像素視為名片；
+    dilate=True 時再膨脹以填補名片內文字與留白造成的空洞。
+    """
+    import numpy as np
+
+    border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+    background = float(np.median(border))
+    spread = float(np.percentile(np.abs(gray - background), 90))
+    threshold = threshold if threshold is not None else max(20.0, spread * 0.35)
+    mask = np.abs(gray - background) > threshold
+    return _dilate(mask, max(1, min(gray.shape) // 200)) if dilate else mask
+
+
+def _split_runs(profile, min_gap: int, min_size: int) -> List[Tuple[int, int]]:
+    """投影中連續有前景的區段，間隔小於 min_gap 的區段合併"""
+    import numpy as np
+
+    filled = np.flatnonzero(profile)
+    if not len(filled):
+        return []
+    breaks = np.flatnonzero(np.diff(filled) > min_gap)
+    starts = np.concatenate([[filled[0]], filled[breaks + 1]])
+    ends = np.concatenate([filled[breaks], [filled[-1]]]) + 1
+    return [(int(s), int(e)) for s, e in zip(starts, ends) if e - s >= min_size]
+
+
+def _xy_cut(mask, top: int, left: int, min_gap: int, min_size: int, depth: int = 0) -> List[Tuple[int, int, int, int]]:
+    """
+    遞迴投影切割：交替以列、欄投影的空白間隔切開，直到區塊無法再分割
+
+    名片平鋪在桌面上時彼此之間有空隙，切割結果即為各張名片的範圍。
+    """
+    rows = _split_runs(mask.any(axis=1), min_gap, min_size)
+    cols = _split_runs(mask.any(axis=0), min_gap, min_size)
+    if not rows or not cols:
+        return []
+    if len(rows) == 1 and len(cols) == 1:
+        (r0, r1), (c0, c1) = rows[0], cols[0]
+        return [(left + c0, top + r0, left + c1, top + r1)]
+    if depth > 8:
+        return []
+    boxes = []
+    if len(rows) > 1:
+        for r0, r1 in rows:
+            boxes += _xy_cut(mask[r0:r1], top + r0, left, min_gap, min_size, depth + 1)
+    else:
+        for c0, c1 in cols:
+            boxes += _xy_cut(mask[:, c0:c1], top, left + c0, min_gap, min_size, depth + 1)
+    return boxes
+
+
+def _skew_angle(mask) -> float:
+    """以前景像素座標的主軸方向估計名片傾斜角度（-45 ~ 45 度）"""
+    import numpy as np
+
+    ys, xs = np.nonzero(mask)
+    if len(xs) < 10:
+        return 0.0
+    coords = np.stack([xs - xs.mean(), ys - ys.mean()])
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(coords))
+    vx, vy = eigenvectors[:, np.argmax(eigenvalues)]
+    # 影像 y 軸朝下，逆時針為正
+    angle = float(np.degrees(np.arctan2(-vy, vx)))
+    return (angle + 45) % 90 - 45
+
+
+def _sheet_angle(mask) -> float:
+    """
+    以前景邊緣的梯度方向估計整張照片的傾斜角度（-45 ~ 45 度，逆時針為正）
+
+    同一張照片上的名片邊緣彼此平行或垂直，梯度方向以 90 度取餘數後集中在同一個角度。
+    """
+    import numpy as np
+    from PIL import Image, ImageFilter
+
+    # 先模糊二值遮罩，避免鋸齒狀的邊緣只產生 0 / 45 / 90 度的梯度
+    soft = Image.fromarray(mask.astype(np.uint8) * 255).filter(ImageFilter.GaussianBlur(2))
+    gy, gx = np.gradient(np.asarray(soft, dtype=np.float32))
+    magnitude = np.hypot(gx, gy)
+    if not magnitude.max():
+        return 0.0
+    edges = magnitude > magnitude.max() * 0.3
+    weights = magnitude[edges]
+    # 影像 y 軸朝下，逆時針為正
+    angles = (np.degrees(np.arctan2(-gy[edges], gx[edges])) + 45) % 90 - 45
+    histogram, bins = np.histogram(angles, bins=90, range=(-45, 45), weights=weights)
+    peak = int(np.argmax(histogram))
+    center = (bins[peak] + bins[peak + 1]) / 2
+    # 峰值附近加權平均提高精度（-45 與 45 度視為相鄰）
+    offsets = (angles - center + 45) % 90 - 45
+    near = np.abs(offsets) < 2
+    return float(center + np.average(offsets[near], weights=weights[near]))
+
+
+def _unrotate_box(box, angle: float, rotated_size, size) -> Tuple[int, int, int, int]:
+    """把轉正後照片上的矩形換回原照片座標（取四個角的外接矩形）"""
+    import numpy as np
+
+    left, top, right, bottom = box
+    corners = np.array([[left, top], [right, top], [left, bottom], [right, bottom]], dtype=np.float64)
+    corners -= np.array(rotated_size) / 2
+    radians = np.radians(angle)
+    cos, sin = np.cos(radians), np.sin(radians)
+    xs = corners[:, 0] * cos + corners[:, 1] * sin + size[0] / 2
+    ys = -corners[:, 0] * sin + corners[:, 1] * cos + size[1] / 2
+    return (
+        max(0, int(xs.min())), max(0, int(ys.min())),
+        min(size[0], int(np.ceil(xs.max()))), min(size[1], int(np.ceil(ys.max()))),
+    )
+
+
+def _detect_mask(image, scale: float):
+    import numpy as np
+    from PIL import Image
+
+    width, height = image.size
+    small = image.resize((max(1, round(width * scale)), max(1, round(height * scale))), Image.BILINEAR)
+    return foreground_mask(np.asarray(small.convert("L"), dtype=np.float32))
+
+
+def detect_cards(image) -> List[CardRegion]:
+    """
+    偵測一張照片中的多張名片，回傳轉正後的裁切圖（投影切割的順序即由上而下、由左而右）
+
+    在縮小的灰階圖上建立前景遮罩，估計整張照片的傾斜角度，傾斜時先轉正整張照片
+    （否則名片的投影互相重疊，會被當成一張）；以投影切割找出各張名片後，
+    再以主軸方向估計各張名片剩餘的傾斜角度並旋轉裁切區域。
+    偵測不到名片邊界時（例如名片佔滿畫面）整張照片視為一張名片。
+    """
+    import numpy as np
+    from PIL import Image
+
+    started = time.perf_counter()
+    image = image.convert("RGB")
+    width, height = image.size
+    scale = min(1.0, DETECT_SIZE / max(width, height))
+    mask = _detect_mask(image, scale)
+
+    sheet_angle = _sheet_angle(mask)
+    source = image
+    if abs(sheet_angle) >= MIN_SHEET_DESKEW_DEGREES:
+        # 以照片四周的顏色（桌面）填補旋轉後的角落
+        pixels = np.asarray(image)
+        border = np.concatenate([pixels[0], pixels[-1], pixels[:, 0], pixels[:, -1]])
+        fill = tuple(int(v) for v in np.median(border, axis=0))
+        source = image.rotate(-sheet_angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+        mask = _detect_mask(source, scale)
+    else:
+        sheet_angle = 0.0
+
+    short_side = min(mask.shape)
+    min_size = max(8, int(short_side * settings.SHEET_MIN_CARD_FRACTION))
+    boxes = _xy_cut(mask, 0, 0, min_gap=max(2, short_side // 100), min_size=min_size)
+
+    regions = []
+    for left, top, right, bottom in boxes:
+        region_mask = mask[top:bottom, left:right]
+        w, h = right - left, bottom - top
+        if region_mask.mean() < 0.3:
+            continue
+        angle = _skew_angle(region_mask)
+        aspect = max(w, h) / max(min(w, h), 1)
+        if abs(angle) < 10 and not (CARD_ASPECT_RANGE[0] <= aspect <= CARD_ASPECT_RANGE[1]):
+            continue
+        # 換回全尺寸座標，稍微外擴避免切到邊緣
+        pad = max(w, h) * 0.02
+        box = (
+            max(0, int((left - pad) / scale)), max(0, int((top - pad) / scale)),
+            min(source.width, int((right + pad) / scale) + 1), min(source.height, int((bottom + pad) / scale) + 1),
+        )
+        crop = source.crop(box)
+        if abs(angle) >= MIN_DESKEW_DEGREES:
+            crop = _deskew(crop, angle)
+        if source is not image:
+            box = _unrotate_box(box, sheet_angle, source.size, image.size)
+        regions.append(CardRegion(box=box, angle=round(sheet_angle + angle, 2), crop=crop))
+
+    if not regions:
+        logger.info("偵測不到名片邊界，整張照片視為一張名片")
+        regions.append(CardRegion(box=(0, 0, width, height), angle=0.0, crop=image))
+
+    logger.info(f"偵測到 {len(regions)} 張名片，耗時 {(time.perf_counter() - started) * 1000:.1f} ms")
+    return regions
+
+
+def _deskew(crop, angle: float):
+    """旋轉裁切圖使名片水平，並裁掉旋轉後多出的背景"""
+    import numpy as np
+    from PIL import Image
+
+    # 以裁切圖上下緣的顏色（桌面）填補旋轉後的角落
+    pixels = np.asarray(crop)
+    fill = tuple(int(v) for v in np.median(np.concatenate([pixels[0], pixels[-1]]), axis=0))
+    rotated = crop.rotate(-angle, resample=Image.BICUBIC, expand=True, fillcolor=fill)
+    mask = foreground_mask(np.asarray(rotated.convert("L"), dtype=np.float32))
+    ys, xs = np.nonzero(mask)
+    if not len(xs):
+        return rotated
+    return rotated.crop((int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1))
+
+
+def _encode_crop(crop) -> str:
+    buffer = io.BytesIO()
+    crop.save(buffer, format="JPEG", quality=85)
+    return "data:image/jpeg;base64," + base64.b64encode(buffer.getvalue()).decode("ascii")
+
+
+async def ocr_sheet(ocr_service, image_bytes: bytes, side: str = "front", check_quality: bool = True,
+                    include_crops: bool = False, lane: str = "batch") -> Dict:
+    """
+    一張照片多張名片：切出各張名片後同時 OCR，回傳每張名片的草稿欄位
+
+    偵測在執行緒中進行；各張裁切圖的 OCR 以 asyncio.gather 同時送入 OCR 排程器
+    （預設 batch 通道），同時進行的數量由排程器與各後端上限決定。單張名片失敗不影響其他名片。
+    """
+    from PIL import Image
+    from backend.services.ocr_service import ImageQualityError
+
+    started = time.perf_counter()
+    image = Image.open(io.BytesIO(image_bytes))
+    regions = await asyncio.to_thread(detect_cards, image)
+
+    def base_draft(index: int, region: CardRegion) -> Dict:
+        draft = {"index": index, "box": list(region.box), "angle": region.angle,
+                 "width": region.crop.width, "height": region.crop.height}
+        if include_crops:
+            draft["image"] = _encode_crop(region.crop)
+        return draft
+
+    async def recognize(index: int, region: CardRegion) -> Dict:
+        draft = base_draft(index, region)
+        try:
+            text = await ocr_service.ocr_decoded_image(region.crop, check_quality, lane)
+        except ImageQualityError as e:
+            draft.update(success=False, error=str(e), quality=e.quality.to_dict())
+            return draft
+        if not text:
+            draft.update(success=False, error="OCR 無結果")
+            return draft
+        draft.update(success=True, text=text, parsed_fields=ocr_service.parse_ocr_to_fields(text, side))
+        return draft
+
+    results = await asyncio.gather(*(recognize(i, region) for i, region in enumerate(regions)),
+                                   return_exceptions=True)
+    drafts = []
+    for index, (region, result) in enumerate(zip(regions, results)):
+        if isinstance(result, asyncio.CancelledError):
+            raise result
+        if isinstance(result, Exception):
+            # 單張名片的例外（例如 OCR 排程逾時、欄位解析失敗）只讓該張失敗
+            logger.error(f"第 {index + 1} 張名片辨識失敗: {result}")
+            result = dict(base_draft(index, region), success=False, error=str(result))
+        drafts.append(result)
+    return {
+        "success": True,
+        "count": len(drafts),
+        "recognized": sum(1 for draft in drafts if draft["success"]),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        "cards": drafts,
+    }
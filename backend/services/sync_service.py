@@ -0,0 +1,153 @@
+import datetime
+import logging
+import threading
+import time
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from backend.core.config import settings
+from backend.models.card import CardChangeORM, SyncStateORM
+
+logger = logging.getLogger(__name__)
+
+# 已清除 tombstone 的最大 seq；游標小於此值的客戶端必須重新全量同步
+TOMBSTONE_HORIZON_KEY = "tombstone_horizon"
+
+_compact_lock = threading.Lock()
+_last_compaction: Optional[float] = None
+
+
+def record_change(db: Session, card_id: int, op: str):
+    """在目前交易中寫入一筆變更紀錄，由呼叫端負責 commit"""
+    db.add(CardChangeORM(card_id=card_id, op=op))
+
+
+def latest_seq(db: Session) -> int:
+    """card_changes 中最新的 seq（單一查詢，供快取等頻繁的版本檢查使用）"""
+    return db.query(func.max(CardChangeORM.seq)).scalar() or 0
+
+
+def current_cursor(db: Session) -> int:
+    """目前最新的變更序號（最新紀錄被壓縮清除時不會倒退）"""
+    return max(latest_seq(db), tombstone_horizon(db))
+
+
+def tombstone_horizon(db: Session) -> int:
+    state = db.get(SyncStateORM, TOMBSTONE_HORIZON_KEY)
+    return state.value if state else 0
+
+
+def fetch_changes(db: Session, since: int, limit: int) -> List[CardChangeORM]:
+    """取得 seq > since 的變更紀錄（多取一筆用於判斷是否還有下一頁）"""
+    return (
+        db.query(CardChangeORM)
+        .filter(CardChangeORM.seq > since)
+        .order_by(CardChangeORM.seq)
+        .limit(limit + 1)
+        .all()
+    )
+
+
+def changed_card_ids(db: Session, since: int, limit: int) -> List[int]:
+    """seq > since 期間有變更的名片 id（最多 limit 筆）"""
+    rows = (
+        db.query(CardChangeORM.card_id)
+        .filter(CardChangeORM.seq > since)
+        .distinct()
+        .limit(limit)
+        .all()
+    )
+    return [row.card_id for row in rows]
+
+
+class ChangeFollower:
+    """
+    追蹤 card_changes 游標，找出上次檢查後被修改的名片
+
+    供每個 worker 各自持有的記憶體資料（快取、索引）得知其他 worker 的寫入；
+    沒有新變更時 poll 只執行一次 SELECT max(seq)。
+    """
+
+    def __init__(self, max_cards: int):
+        self.max_cards = max_cards
+        self.cursor: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def mark(self, db: Session):
+        """以目前最新的 seq 為起點（在由資料庫全量載入之前呼叫）"""
+        self.cursor = latest_seq(db)
+
+    def poll(self, db: Session) -> Optional[List[int]]:
+        """
+        回傳上次檢查後有變更（新增、修改或刪除）的名片 id；
+        無法逐筆得知時（期間的 tombstone 已被清除、變更超過 max_cards）回傳 None，
+        呼叫端應全部重新載入
+        """
+        latest = latest_seq(db)
+        with self._lock:
+            previous, self.cursor = self.cursor, latest
+        if previous is None or latest == previous:
+            return []
+        if latest < previous or tombstone_horizon(db) > previous:
+            return None
+        card_ids = changed_card_ids(db, previous, limit=self.max_cards + 1)
+        return None if len(card_ids) > self.max_cards else card_ids
+
+
+def compact_changes(db: Session, retention_days: Optional[int] = None) -> Dict[str, int]:
+    """
+    壓縮變更紀錄：
+    1. 每張名片只保留最新一筆紀錄（舊紀錄已被取代，刪除不影響任何游標）
+    2. 清除超過保留期限的 tombstone，並推進 tombstone 水位
+    """
+    if retention_days is None:
+        retention_days = settings.SYNC_TOMBSTONE_RETENTION_DAYS
+
+    latest_per_card = db.query(func.max(CardChangeORM.seq)).group_by(CardChangeORM.card_id)
+    superseded = (
+        db.query(CardChangeORM)
+        .filter(CardChangeORM.seq.notin_(latest_per_card.scalar_subquery()))
+        .delete(synchronize_session=False)
+    )
+
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+    expired = db.query(CardChangeORM).filter(
+        CardChangeORM.op == "delete", CardChangeORM.changed_at < cutoff
+    )
+    horizon = expired.with_entities(func.max(CardChangeORM.seq)).scalar()
+    purged = 0
+    if horizon:
+        purged = expired.delete(synchronize_session=False)
+        state = db.get(SyncStateORM, TOMBSTONE_HORIZON_KEY)
+        if state is None:
+            db.add(SyncStateORM(key=TOMBSTONE_HORIZON_KEY, value=horizon))
+        elif horizon > state.value:
+            state.value = horizon
+
+    db.commit()
+    logger.info(f"變更紀錄壓縮完成：移除 {superseded} 筆舊紀錄、{purged} 筆過期 tombstone")
+    return {"superseded": superseded, "tombstones_purged": purged}
+
+
+def maybe_compact(db: Session) -> bool:
+    """依 SYNC_COMPACT_INTERVAL_HOURS 節流，定期執行壓縮"""
+    global _last_compaction
+    interval = settings.SYNC_COMPACT_INTERVAL_HOURS * 3600
+    if interval <= 0:
+        return False
+    if _last_compaction is not None and time.monotonic() - _last_compaction < interval:
+        return False
+    if not _compact_lock.acquire(blocking=False):
+        return False
+    try:
+        _last_compaction = time.monotonic()
+        compact_changes(db)
+        return True
+    except Exception as e:
+        db.rollback()
+        logger.error(f"變更紀錄壓縮失敗: {e}")
+        return False
+    finally:
+        _compact_lock.release()
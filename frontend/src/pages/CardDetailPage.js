@@ -28,6 +28,8 @@ const CardDetailPage = () => {
   const [loading, setLoading] = useState(true);
   const [saving, setSaving] = useState(false);
   const [isEditing, setIsEditing] = useState(false);
+  // 名片版本（ETag），更新時以 If-Match 送出避免覆蓋他人修改
+  const [etag, setEtag] = useState(null);
   
   // 統一的名片資料狀態 - 與OCR掃描頁面保持一致的22個欄位
   const [cardData, setCardData] = useState({
@@ -80,6 +82,7 @@ const CardDetailPage = () => {
       const response = await axios.get(`/api/v1/cards/${id}`);
       if (response.data) {
         setCardData(response.data);
+        setEtag(response.headers.etag || null);
       }
     } catch (error) {
       console.error('載入名片失敗:', error);
@@ -142,6 +145,7 @@ const CardDetailPage = () => {
       const response = await axios.put(`/api/v1/cards/${id}`, saveData, {
         headers: {
           'Content-Type': 'multipart/form-data',
+          ...(etag ? { 'If-Match': etag } : {}),
         },
       });
 
@@ -24,6 +24,12 @@ import {
 } from 'antd-mobile-icons';
 import axios from 'axios';
 
+// 名片列表顯示與搜尋用到的欄位
+const LIST_FIELDS = [
+  'name', 'company_name', 'position', 'mobile_phone', 'company_phone1', 'company_phone2',
+  'email', 'line_id', 'company_address1', 'company_address2', 'note1', 'note2',
+];
+
 const CardManagerPage = () => {
   const navigate = useNavigate();
   const [cards, setCards] = useState([]);
@@ -35,7 +41,10 @@ const CardManagerPage = () => {
   const loadCards = async () => {
     setLoading(true);
     try {
-      const response = await axios.get('/api/v1/cards/');
+      // 列表頁只需要這些欄位，避免下載OCR原始文字等大欄位
+      const response = await axios.get('/api/v1/cards/', {
+        params: { fields: LIST_FIELDS.join(',') },
+      });
       if (response.data) {
         setCards(response.data);
         setFilteredCards(response.data);
@@ -98,6 +107,16 @@ const CardManagerPage = () => {
 
   // 匯出名片
   const handleExport = async (format) => {
+    if (format === 'zip') {
+      // ZIP 可能有數 GB，直接交給瀏覽器串流下載，不先讀進記憶體
+      const link = document.createElement('a');
+      link.href = '/api/v1/cards/export/download?format=zip';
+      link.setAttribute('download', 'cards.zip');
+      document.body.appendChild(link);
+      link.click();
+      link.remove();
+      return;
+    }
     try {
       const response = await axios.get(`/api/v1/cards/export/download?format=${format}`, {
         responseType: 'blob',
@@ -310,6 +329,14 @@ const CardManagerPage = () => {
               >
                 <DownlandOutline /> vCard
               </Button>
+              <Button 
+                color="default" 
+                fill="outline"
+                style={{ flex: 1 }}
+                onClick={() => handleExport('zip')}
+              >
+                <DownlandOutline /> ZIP
+              </Button>
             </Space>
           </Space>
         </Card>
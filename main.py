@@ -1,18 +1,46 @@
+import time
+_import_started = time.perf_counter()
+
+import asyncio
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 from backend.api.v1 import card, ocr
 from backend.core.config import settings
+from backend.core.admission import OCRAdmissionMiddleware
+from backend.core.startup import startup_report, bootstrap_schema, start_data_migrations
+from backend.services.rendition_service import rendition_service
+from backend.services.image_gc import image_gc
+
+startup_report.record("import", time.perf_counter() - _import_started)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    from backend.models.db import Base, engine
-    Base.metadata.create_all(bind=engine)
+    # 資料庫結構只在這裡初始化一次（遷移引擎會略過已套用的版本）；
+    # 耗時的資料遷移不阻擋啟動，於背景套用
+    with startup_report.phase("schema"):
+        pending = bootstrap_schema()
+    if pending and settings.DB_BACKGROUND_MIGRATIONS:
+        start_data_migrations()
+    startup_report.complete()
+    app.state.startup_report = startup_report.as_dict()
     print("backend activate")
+    # 定期清理未被名片引用的圖片（各 worker 以鎖檔協調，同時只有一個執行）
+    gc_task = None
+    if settings.IMAGE_GC_INTERVAL_HOURS > 0:
+        gc_task = asyncio.create_task(image_gc.run_periodically())
     yield
+    if gc_task is not None:
+        gc_task.cancel()
+    rendition_service.shutdown()
+    ocr.ocr_service.router.shutdown()
+
+app = FastAPI(title="OCR API", description="Business Card Scanning and Management Backend", version="1.0.0", lifespan=lifespan)
 
-app = FastAPI(title="OCR API", description="Business Card Scanning and Management Backend", version="1.0.0")
+# OCR 路由准入控制（先加入，位於 CORS 內層，429/503 回應仍帶 CORS 標頭）
+app.add_middleware(OCRAdmissionMiddleware, path_prefix="/api/v1/ocr")
 
 # CORS
 app.add_middleware(
@@ -21,17 +49,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Content-Range", "Accept-Ranges", "Retry-After"],
 )
 
 app.include_router(card.router, prefix="/api/v1/cards", tags=["Business Card Management"])
 app.include_router(ocr.router, prefix="/api/v1/ocr", tags=["OCR"])
 
-@app.on_event("startup")
-def startup_event():
-    from backend.models.db import Base, engine
-    Base.metadata.create_all(bind=engine)
+@app.get("/api/v1/startup", tags=["System"])
+def get_startup_report():
+    """本 worker 的啟動各階段耗時"""
+    return startup_report.as_dict()
 
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8006) 
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=8006)
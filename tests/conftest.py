@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# 設定需在匯入 backend 之前完成（資料庫引擎與各服務於匯入時依設定建立）
+_workdir = tempfile.mkdtemp(prefix="cards-test-")
+os.environ.update({
+    "DB_URL": f"sqlite:///{os.path.join(_workdir, 'cards.db')}",
+    "IMAGE_STORE_DIR": os.path.join(_workdir, "card_images"),
+    "EXPORT_DIR": os.path.join(_workdir, "exports"),
+    "IMAGE_GC_INTERVAL_HOURS": "0",
+    "SYNC_COMPACT_INTERVAL_HOURS": "0",
+    "OCR_BACKENDS": '[{"type": "stub", "name": "stub", "result": "王小明"}]',
+})
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def workdir():
+    return _workdir
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def db(client):
+    from backend.models.db import SessionLocal
+
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture
+def make_card(client):
+    """以 API 建立名片，回傳 JSON"""
+    def create(**fields):
+        fields.setdefault("name", "測試名片")
+        response = client.post("/api/v1/cards/", data=fields)
+        assert response.status_code == 200, response.text
+        return response.json()
+    return create
@@ -0,0 +1,113 @@
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from backend.core.admission import AdmissionController, OCRAdmissionMiddleware
+from backend.core.config import settings
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_ADMISSION_MAX_IN_FLIGHT", 1)
+    monkeypatch.setattr(settings, "OCR_ADMISSION_MAX_QUEUE", 1)
+    monkeypatch.setattr(settings, "OCR_ADMISSION_QUEUE_TIMEOUT", 5)
+    monkeypatch.setattr(settings, "OCR_CLIENT_RATE", 0)
+    monkeypatch.setattr(settings, "OCR_TRUST_FORWARDED_FOR", False)
+    return AdmissionController()
+
+
+def _app(controller, gate):
+    """OCR 路由的替身：收到請求後等待 gate 才回應"""
+    app = FastAPI()
+
+    @app.post("/api/v1/ocr/image")
+    async def ocr_image():
+        await gate.wait()
+        return {"text": "王小明"}
+
+    @app.get("/api/v1/ocr/stats")
+    async def ocr_stats():
+        return controller.snapshot()
+
+    app.add_middleware(OCRAdmissionMiddleware, path_prefix="/api/v1/ocr", controller=controller)
+    return app
+
+
+async def _wait_until(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "等待逾時"
+        await asyncio.sleep(0.005)
+
+
+def _run(scenario, controller, gate_open=False):
+    async def main():
+        gate = asyncio.Event()
+        if gate_open:
+            gate.set()
+        transport = httpx.ASGITransport(app=_app(controller, gate))
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await scenario(client, gate)
+    return asyncio.run(main())
+
+
+def test_full_queue_is_rejected_with_503(admission):
+    async def scenario(client, gate):
+        first = asyncio.ensure_future(client.post("/api/v1/ocr/image"))
+        await _wait_until(lambda: admission.in_flight == 1)
+        second = asyncio.ensure_future(client.post("/api/v1/ocr/image"))
+        await _wait_until(lambda: admission.snapshot()["waiting"] == 1)
+
+        rejected = await client.post("/api/v1/ocr/image")
+        # 統計路由不受准入控制
+        stats = await client.get("/api/v1/ocr/stats")
+        gate.set()
+        return rejected, stats, await first, await second
+
+    rejected, stats, first, second = _run(scenario, admission)
+    assert rejected.status_code == 503
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert rejected.json()["retry_after"] >= 1
+    assert stats.status_code == 200 and stats.json()["overloaded"] == 1
+    assert (first.status_code, second.status_code) == (200, 200)
+    assert admission.in_flight == 0
+    assert admission.stats["admitted"] == 2 and admission.stats["queued"] == 1
+
+
+def test_queue_timeout_is_rejected_with_503(admission, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_ADMISSION_QUEUE_TIMEOUT", 0.05)
+
+    async def scenario(client, gate):
+        first = asyncio.ensure_future(client.post("/api/v1/ocr/image"))
+        await _wait_until(lambda: admission.in_flight == 1)
+        timed_out = await client.post("/api/v1/ocr/image")
+        gate.set()
+        return timed_out, await first
+
+    timed_out, first = _run(scenario, admission)
+    assert timed_out.status_code == 503
+    assert first.status_code == 200
+    assert admission.stats["queue_timeouts"] == 1
+    assert admission.snapshot()["waiting"] == 0 and admission.in_flight == 0
+
+
+def test_client_over_rate_is_rejected_with_429(admission, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_CLIENT_RATE", 0.5)
+    monkeypatch.setattr(settings, "OCR_CLIENT_BURST", 2)
+    monkeypatch.setattr(settings, "OCR_TRUST_FORWARDED_FOR", True)
+
+    async def scenario(client, gate):
+        responses = [await client.post("/api/v1/ocr/image", headers={"X-Forwarded-For": "10.0.0.1"})
+                     for _ in range(3)]
+        other = await client.post("/api/v1/ocr/image", headers={"X-Forwarded-For": "10.0.0.2, 10.0.0.1"})
+        return responses, other
+
+    responses, other = _run(scenario, admission, gate_open=True)
+    assert [r.status_code for r in responses] == [200, 200, 429]
+    assert int(responses[2].headers["Retry-After"]) == 2
+    # 速率限制以用戶端區分，不影響其他用戶端
+    assert other.status_code == 200
+    assert admission.stats["rate_limited"] == 1
@@ -0,0 +1,62 @@
+import contextlib
+
+from sqlalchemy import event
+
+from backend.models.card import CardChangeORM, CardORM
+from backend.models.db import engine
+from backend.services.card_cache import CardCache
+from backend.services.card_service import _load_cache_entry
+
+
+@contextlib.contextmanager
+def count_queries():
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+
+def test_hit_within_check_interval_runs_no_query(db, make_card):
+    card = make_card(name="快取")
+    cache = CardCache(max_size=10, ttl=60, check_interval=60)
+    cache.get(db, card["id"], _load_cache_entry)
+
+    with count_queries() as statements:
+        entry = cache.get(db, card["id"], _load_cache_entry)
+    assert entry.card.name == "快取"
+    assert statements == []
+
+
+def test_version_check_is_a_single_query(db, make_card):
+    card = make_card(name="快取")
+    cache = CardCache(max_size=10, ttl=60, check_interval=60)
+    cache.get(db, card["id"], _load_cache_entry)
+
+    cache._last_check = 0.0
+    with count_queries() as statements:
+        cache.get(db, card["id"], _load_cache_entry)
+    assert len(statements) == 1
+    assert "max(card_changes.seq)" in statements[0]
+    assert cache.stats()["hits"] == 1
+
+
+def test_write_from_another_worker_invalidates_entry(db, make_card):
+    card = make_card(name="舊名稱")
+    cache = CardCache(max_size=10, ttl=60, check_interval=60)
+    assert cache.get(db, card["id"], _load_cache_entry).card.name == "舊名稱"
+
+    # 模擬其他 worker：直接寫入資料庫並記錄變更，不經過本程序的快取失效
+    db.query(CardORM).filter(CardORM.id == card["id"]).update({"name": "新名稱"})
+    db.add(CardChangeORM(card_id=card["id"], op="update"))
+    db.commit()
+
+    assert cache.get(db, card["id"], _load_cache_entry).card.name == "舊名稱"
+    cache._last_check = 0.0
+    assert cache.get(db, card["id"], _load_cache_entry).card.name == "新名稱"
+    assert cache.stats()["invalidations"] == 1
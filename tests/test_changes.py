@@ -0,0 +1,63 @@
+def _changes(client, **params):
+    response = client.get("/api/v1/cards/changes", params=params)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def _cursor(client, make_card):
+    make_card(name="起點")
+    return _changes(client, since=0)["cursor"]
+
+
+def test_initial_sync_returns_reset(client):
+    body = _changes(client, since=0)
+    assert body["reset"] is True
+    assert body["changes"] == []
+
+
+def test_changes_full_cards(client, make_card):
+    cursor = _cursor(client, make_card)
+    card = make_card(name="陳大文", company_name="星位科技")
+
+    body = _changes(client, since=cursor)
+    assert body["reset"] is False
+    assert body["cursor"] > cursor
+    change = body["changes"][-1]
+    assert change["op"] == "upsert"
+    assert change["card_id"] == card["id"]
+    assert change["card"]["company_name"] == "星位科技"
+
+
+def test_changes_with_fields(client, make_card):
+    cursor = _cursor(client, make_card)
+    first = make_card(name="林小華", email="hua@example.com")
+    second = make_card(name="張三")
+
+    body = _changes(client, since=cursor, fields="name,email")
+    assert body["cursor"] > cursor
+    cards = {change["card_id"]: change["card"] for change in body["changes"]}
+    assert cards[first["id"]] == {"id": first["id"], "name": "林小華", "email": "hua@example.com"}
+    assert set(cards[second["id"]]) == {"id", "name", "email"}
+
+    summary = _changes(client, since=cursor, view="summary")
+    assert summary["cursor"] == body["cursor"]
+    assert all("front_ocr_text" not in change["card"] for change in summary["changes"])
+
+
+def test_changes_report_deletes_and_paginate(client, make_card):
+    cursor = _cursor(client, make_card)
+    kept = make_card(name="保留")
+    removed = make_card(name="刪除")
+    assert client.delete(f"/api/v1/cards/{removed['id']}").status_code == 200
+
+    page = _changes(client, since=cursor, limit=1, fields="name")
+    assert page["has_more"] is True
+    assert [change["card_id"] for change in page["changes"]] == [kept["id"]]
+
+    rest = _changes(client, since=page["cursor"], fields="name")
+    assert rest["changes"][-1] == {"seq": rest["cursor"], "op": "delete", "card_id": removed["id"], "card": None}
+
+
+def test_changes_rejects_unknown_field(client):
+    response = client.get("/api/v1/cards/changes", params={"since": 1, "fields": "nope"})
+    assert response.status_code == 400
@@ -0,0 +1,46 @@
+from backend.models.card import CardChangeORM, CardORM
+
+
+def _duplicates_of(client, card_id):
+    response = client.get("/api/v1/cards/duplicates", params={"card_id": card_id})
+    assert response.status_code == 200, response.text
+    return [item["card_id"] for item in response.json()["duplicates"]]
+
+
+def _write_as_other_worker(db, card_id=None, op="insert", **fields):
+    """直接寫入資料庫並記錄變更，模擬另一個 worker（不經過本程序的索引維護）"""
+    if op == "insert":
+        card = CardORM(**fields)
+        db.add(card)
+        db.flush()
+        card_id = card.id
+    elif op == "update":
+        db.query(CardORM).filter(CardORM.id == card_id).update(fields)
+    else:
+        db.query(CardORM).filter(CardORM.id == card_id).delete()
+    db.add(CardChangeORM(card_id=card_id, op=op))
+    db.commit()
+    return card_id
+
+
+def test_duplicates_found_by_email(client, make_card):
+    first = make_card(name="李大同", email="datong@example.com", company_name="大同股份有限公司")
+    second = make_card(name="李大通", email="DaTong@example.com ", company_name="大同公司")
+    assert second["id"] in _duplicates_of(client, first["id"])
+
+
+def test_index_follows_writes_from_other_workers(client, db, make_card):
+    mine = make_card(name="周杰", mobile_phone="0955-111-222")
+    assert _duplicates_of(client, mine["id"]) == []
+
+    other = _write_as_other_worker(db, name="周傑", mobile_phone="+886 955 111 222")
+    assert other in _duplicates_of(client, mine["id"])
+
+    _write_as_other_worker(db, other, op="update", mobile_phone="0900-000-000", name="王五")
+    assert other not in _duplicates_of(client, mine["id"])
+
+    _write_as_other_worker(db, other, op="update", mobile_phone="0955111222", name="周傑")
+    assert other in _duplicates_of(client, mine["id"])
+
+    _write_as_other_worker(db, other, op="delete")
+    assert other not in _duplicates_of(client, mine["id"])
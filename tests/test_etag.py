@@ -0,0 +1,97 @@
+import datetime
+
+import pytest
+from sqlalchemy import text
+
+from backend.models.card import Card, CardChangeORM, CardORM
+from backend.models.db import SessionLocal
+from backend.services import card_service
+from backend.services.card_cache import card_cache
+from backend.services.card_service import CardConflictError, get_card_etag, update_card
+
+
+def _etag(client, card_id):
+    response = client.get(f"/api/v1/cards/{card_id}")
+    assert response.status_code == 200
+    return response.headers["ETag"]
+
+
+def test_read_with_matching_etag_is_not_modified(client, make_card):
+    card = make_card(name="快取驗證")
+    etag = _etag(client, card["id"])
+    response = client.get(f"/api/v1/cards/{card['id']}", headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+
+def test_update_with_stale_if_match_is_rejected(client, make_card):
+    card = make_card(name="原始名稱")
+    etag = _etag(client, card["id"])
+
+    first = client.put(f"/api/v1/cards/{card['id']}", data={"name": "第一次修改"}, headers={"If-Match": etag})
+    assert first.status_code == 200, first.text
+    assert first.headers["ETag"] != etag
+
+    stale = client.put(f"/api/v1/cards/{card['id']}", data={"name": "第二次修改"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+    assert client.get(f"/api/v1/cards/{card['id']}").json()["name"] == "第一次修改"
+
+    fresh = client.put(f"/api/v1/cards/{card['id']}", data={"name": "第二次修改"},
+                       headers={"If-Match": first.headers["ETag"]})
+    assert fresh.status_code == 200, fresh.text
+    assert fresh.json()["name"] == "第二次修改"
+
+
+def test_update_without_if_match_is_unconditional(client, make_card):
+    card = make_card(name="無條件")
+    response = client.put(f"/api/v1/cards/{card['id']}", data={"name": "無條件修改"})
+    assert response.status_code == 200, response.text
+
+
+def test_if_match_uses_database_not_worker_cache(client, db, make_card):
+    card = make_card(name="快取中的版本")
+    _etag(client, card["id"])
+
+    # 其他 worker 修改名片，本 worker 的快取在版本檢查間隔內仍是舊版本
+    db.query(CardORM).filter(CardORM.id == card["id"]).update(
+        {"name": "其他 worker 的修改", "updated_at": datetime.datetime.utcnow()})
+    db.add(CardChangeORM(card_id=card["id"], op="update"))
+    db.commit()
+    fresh = get_card_etag(db, card["id"])
+
+    response = client.put(f"/api/v1/cards/{card['id']}", data={"name": "依最新版本修改"}, headers={"If-Match": fresh})
+    assert response.status_code == 200, response.text
+
+
+def test_if_match_guards_legacy_rows_without_updated_at(client, db, make_card):
+    card = make_card(name="舊資料")
+    db.execute(text("UPDATE cards SET updated_at = NULL WHERE id = :id"), {"id": card["id"]})
+    db.commit()
+    card_cache.invalidate([card["id"]])
+    etag = _etag(client, card["id"])
+
+    first = client.put(f"/api/v1/cards/{card['id']}", data={"name": "第一次修改"}, headers={"If-Match": etag})
+    assert first.status_code == 200, first.text
+    stale = client.put(f"/api/v1/cards/{card['id']}", data={"name": "覆蓋"}, headers={"If-Match": etag})
+    assert stale.status_code == 412
+
+
+def test_write_between_check_and_update_conflicts(db, make_card, monkeypatch):
+    card = make_card(name="並行修改")
+    db.execute(text("UPDATE cards SET updated_at = NULL WHERE id = :id"), {"id": card["id"]})
+    db.commit()
+    etag = get_card_etag(db, card["id"])
+    real_matches = card_service.etag_matches
+
+    def matches_then_other_request_writes(header, current, weak=True):
+        # 其他請求在 If-Match 比對之後、條件式 UPDATE 之前搶先寫入
+        with SessionLocal() as other:
+            other.query(CardORM).filter(CardORM.id == card["id"]).update({"name": "搶先的修改"})
+            other.commit()
+        return real_matches(header, current, weak)
+
+    monkeypatch.setattr(card_service, "etag_matches", matches_then_other_request_writes)
+    with pytest.raises(CardConflictError):
+        update_card(db, card["id"], Card(name="較慢的修改"), if_match=etag)
+    db.expire_all()
+    assert db.get(CardORM, card["id"]).name == "搶先的修改"
@@ -0,0 +1,345 @@
+import codecs
+import csv
+import io
+import tracemalloc
+import uuid
+import zipfile
+import zlib
+
+import pytest
+
+from backend.services import export_service
+from backend.core.config import settings
+from backend.services.export_service import (
+    COLUMNAR_DEFAULT_FIELDS, COLUMNAR_FORMATS, _escape, _fold, _split_name, column_headers, iter_record_batches,
+    ZIP_MANIFEST_NAME, stream_csv, stream_vcard, stream_zip, write_arrow, write_excel, write_parquet,
+)
+
+COLUMNS = ["name", "company_name", "company_name_en", "note1"]
+
+
+@pytest.fixture
+def marked_cards(make_card):
+    """建立一批以唯一英文公司名標記的名片（含中文與多位元組字元）"""
+    marker = f"Export {uuid.uuid4().hex[:8]}"
+    cards = [make_card(name=f"陳美玲{i}", company_name="星位科技股份有限公司", company_name_en=marker,
+                       note1="展覽認識，需回電 😀\n第二行" * 3)
+             for i in range(12)]
+    return cards, marker
+
+
+def test_stream_csv_yields_bounded_chunks(client, marked_cards):
+    _, marker = marked_cards
+    batches = []
+    chunks = list(stream_csv(COLUMNS, batch_size=5, chunk_size=256, progress=batches.append))
+
+    assert chunks[0] == codecs.BOM_UTF8
+    body = chunks[1:]
+    assert len(body) >= 3
+    # 除了最後一段，每段都在累積到 chunk_size 個字元後才送出（UTF-8 中文字每字 3 bytes）
+    assert all(256 <= len(chunk) <= 4 * (256 + 200) for chunk in body[:-1])
+    assert batches == sorted(batches) and len(batches) > 1
+
+    # 每段各自都是完整的 UTF-8（不切斷多位元組字元），BOM 只出現在開頭一次
+    for chunk in body:
+        assert not chunk.startswith(codecs.BOM_UTF8)
+        chunk.decode("utf-8")
+    rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8-sig"))))
+    assert rows[0] == column_headers(COLUMNS)
+    marked = [row for row in rows[1:] if row[2] == marker]
+    assert [row[0] for row in marked] == [f"陳美玲{i}" for i in range(12)]
+    assert all(row[3] == "展覽認識，需回電 😀\n第二行" * 3 for row in marked)
+
+
+def _peak_memory(monkeypatch, rows: int):
+    """消耗 stream_csv 的輸出（不保留），回傳 (讀取筆數, 輸出大小, 記憶體峰值)"""
+    pulled = [0]
+
+    def fake_rows(columns, batch_size, progress):
+        for i in range(rows):
+            pulled[0] += 1
+            yield (f"王小明{i}", "星位科技股份有限公司", f"Company {i}", "備註" * 20)
+
+    monkeypatch.setattr(export_service, "iter_card_rows", fake_rows)
+    stream = stream_csv(COLUMNS, chunk_size=64 * 1024)
+    total = len(next(stream)) + len(next(stream))
+    # 第一段送出時只讀了產生這一段所需的資料列
+    assert pulled[0] < 1000
+    tracemalloc.start()
+    try:
+        for chunk in stream:
+            total += len(chunk)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return pulled[0], total, peak
+
+
+def test_stream_csv_memory_does_not_grow_with_row_count(monkeypatch):
+    small_rows, small_total, small_peak = _peak_memory(monkeypatch, 5000)
+    rows, total, peak = _peak_memory(monkeypatch, 50000)
+
+    assert (small_rows, rows) == (5000, 50000)
+    assert total > 9 * small_total and total > 8 * 1024 * 1024
+    # 輸出大小相差十倍，記憶體峰值維持在數個區塊的大小
+    assert peak < small_peak * 1.5
+    assert peak < total / 8
+
+
+def test_write_excel_headers_rows_and_cjk(db, marked_cards, workdir):
+    import openpyxl
+
+    from backend.models.card import CardORM
+
+    _, marker = marked_cards
+    columns = ["id", "name", "company_name", "company_name_en", "note1"]
+    path = f"{workdir}/export-{uuid.uuid4().hex[:8]}.xlsx"
+    count = write_excel(path, columns, batch_size=5)
+
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        sheet = workbook["名片資料"]
+        # 尾端的空白儲存格不會寫出，補齊欄數
+        rows = [row + (None,) * (len(columns) - len(row)) for row in sheet.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+    assert rows[0] == ("ID", "姓名", "公司名稱", "英文公司名稱", "備註1")
+    assert len(rows) - 1 == count == db.query(CardORM).count()
+    marked = [row for row in rows[1:] if row[3] == marker]
+    assert [row[1] for row in marked] == [f"陳美玲{i}" for i in range(12)]
+    assert all(row[2] == "星位科技股份有限公司" for row in marked)
+    assert all(row[4] == "展覽認識，需回電 😀\n第二行" * 3 for row in marked)
+    assert all(isinstance(row[0], int) for row in rows[1:])
+
+
+def _physical_lines(data: bytes):
+    assert data.endswith(b"\r\n")
+    return data[:-2].split(b"\r\n")
+
+
+def _unfold(data: bytes) -> str:
+    return data.replace(b"\r\n ", b"").decode("utf-8")
+
+
+@pytest.mark.parametrize("parts", [
+    ["NOTE:" + "a" * 200],
+    ["NOTE:" + "名片" * 60],
+    # 前綴 5 bytes + 23 個中文字 = 74 bytes，第 24 個字放不下，必須整個移到下一行
+    ["NOTE:" + "中" * 23 + "文字😀" * 20],
+    ["PHOTO;ENCODING=b;TYPE=JPEG:", "QUJD" * 40, "REVG" * 40, "名"],
+], ids=["ascii", "cjk", "boundary", "parts"])
+def test_fold_limits_lines_to_75_octets_without_splitting_characters(parts):
+    data = b"".join(_fold(parts))
+    lines = _physical_lines(data)
+
+    assert len(lines) > 1
+    for i, line in enumerate(lines):
+        assert len(line) <= 75
+        # 每一行都是完整的 UTF-8，續行以一個空白開頭
+        line.decode("utf-8")
+        assert line.startswith(b" ") == (i > 0)
+    assert _unfold(data) == "".join(parts) + "\r\n"
+    if parts[0].startswith("NOTE:中"):
+        assert len(lines[0]) == 74
+
+
+def test_escape_special_characters():
+    assert _escape("a,b;c\\d") == "a\\,b\\;c\\\\d"
+    assert _escape("一\n二\r\n三\r四") == "一\\n二\\n三\\n四"
+
+
+@pytest.mark.parametrize("name, family_first, expected", [
+    ("王小明", None, ("王", "小明")),
+    ("歐陽娜娜", None, ("歐陽", "娜娜")),
+    ("Mei-Ling Chen", False, ("Chen", "Mei-Ling")),
+    ("Chen Mei-Ling", True, ("Chen", "Mei-Ling")),
+    ("Chen, Mei-Ling", False, ("Chen", "Mei-Ling")),
+    ("Chen, Mei-Ling", True, ("Chen", "Mei-Ling")),
+    ("Madonna", True, ("", "Madonna")),
+])
+def test_split_name(name, family_first, expected):
+    assert _split_name(name, family_first) == expected
+
+
+def test_split_name_order_follows_setting(monkeypatch):
+    assert _split_name("Chen Mei-Ling") == ("Mei-Ling", "Chen")
+    monkeypatch.setattr(settings, "VCARD_LATIN_FAMILY_FIRST", True)
+    assert _split_name("Chen Mei-Ling") == ("Chen", "Mei-Ling")
+
+
+@pytest.mark.parametrize("version", ["3.0", "4.0"])
+def test_stream_vcard_folds_and_escapes(make_card, version):
+    created = make_card(name="陳美玲", name_en="Mei-Ling Chen", company_name="星位科技, 股份有限公司; 台北",
+                        note1="展覽認識，需回電\n" + "長備註" * 40)
+    data = b"".join(stream_vcard(version, batch_size=5))
+
+    lines = _physical_lines(data)
+    assert all(len(line) <= 75 for line in lines)
+    for line in lines:
+        line.decode("utf-8")
+    cards = _unfold(data).split("BEGIN:VCARD\r\n")
+    card = next(card for card in cards if f"UID:card-{created['id']}\r\n" in card)
+    properties = card.split("\r\n")
+    assert f"VERSION:{version}" in properties
+    assert any(p.startswith("ORG") and p.endswith(":星位科技\\, 股份有限公司\\; 台北") for p in properties)
+    assert "NOTE:展覽認識，需回電\\n" + "長備註" * 40 in properties
+    assert any(p.startswith("N") and p.endswith(":陳;美玲;;;") for p in properties)
+
+
+@pytest.fixture
+def columnar_card(db, make_card):
+    """含中文、空值與時間欄位的名片（新名片的 updated_at 為空）"""
+    from backend.models.card import CardORM
+
+    marker = f"Columnar {uuid.uuid4().hex[:8]}"
+    created = make_card(name="歐陽娜娜", company_name="星位科技股份有限公司", company_name_en=marker,
+                        department1="研發部", note1="第一行\n第二行 😀")
+    card = db.get(CardORM, created["id"])
+    assert card.email is None and card.created_at is not None
+    return card, marker
+
+
+def _check_columnar_row(row, card):
+    assert row["name"] == "歐陽娜娜"
+    assert row["company_name"] == "星位科技股份有限公司"
+    assert row["department1"] == "研發部"
+    assert row["note1"] == "第一行\n第二行 😀"
+    assert row["email"] is None and row["department2"] is None
+    assert row["created_at"] == card.created_at
+    assert row["updated_at"] == card.updated_at
+
+
+def test_iter_record_batches_types_and_batches(db, columnar_card):
+    import pyarrow as pa
+
+    from backend.models.card import CardORM
+
+    card, marker = columnar_card
+    columns = list(COLUMNAR_DEFAULT_FIELDS)
+    batches = list(iter_record_batches(columns, batch_size=5))
+
+    assert sum(batch.num_rows for batch in batches) == db.query(CardORM).count()
+    assert all(batch.num_rows <= 5 for batch in batches) and len(batches) > 1
+    schema = batches[0].schema
+    assert schema.field("id").type == pa.int64()
+    assert schema.field("created_at").type == pa.timestamp("us")
+    assert pa.types.is_dictionary(schema.field("company_name").type)
+    rows = [row for batch in batches for row in batch.to_pylist() if row["company_name_en"] == marker]
+    assert len(rows) == 1 and rows[0]["id"] == card.id
+    _check_columnar_row(rows[0], card)
+
+
+@pytest.mark.parametrize("format", COLUMNAR_FORMATS)
+def test_columnar_export_import_round_trip(db, workdir, columnar_card, format):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    from backend.models.card import CardORM
+    from backend.services.import_service import import_rows, iter_columnar_rows
+
+    card, marker = columnar_card
+    columns = list(COLUMNAR_DEFAULT_FIELDS)
+    path = f"{workdir}/export-{uuid.uuid4().hex[:8]}.{format}"
+    writer = write_parquet if format == "parquet" else write_arrow
+    count = writer(path, columns, batch_size=5)
+
+    if format == "parquet":
+        table = pq.read_table(path)
+    else:
+        with pa.OSFile(path, "rb") as source:
+            table = pa.ipc.open_stream(source).read_all()
+    assert table.num_rows == count == db.query(CardORM).count()
+    assert table.schema.names == columns
+    exported = [row for row in table.to_pylist() if row["company_name_en"] == marker]
+    assert len(exported) == 1
+    _check_columnar_row(exported[0], card)
+
+    # 以欄式格式匯入（只匯入標記的那一筆，id 由資料庫重新產生）
+    with open(path, "rb") as f:
+        rows = ((number, row) for number, row in iter_columnar_rows(f, format, batch_size=5)
+                if row["company_name_en"] == marker)
+        result = import_rows(db, rows)
+    assert (result.total, result.imported, result.failed) == (1, 1, 0)
+
+    db.expire_all()
+    copies = db.query(CardORM).filter(CardORM.company_name_en == marker, CardORM.id != card.id).all()
+    assert len(copies) == 1
+    copy = copies[0]
+    _check_columnar_row({column: getattr(copy, column) for column in columns}, card)
+
+
+def _image_bytes(format: str, color) -> bytes:
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (16, 16), color).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+def _read_zip(chunks) -> zipfile.ZipFile:
+    data = b"".join(chunks)
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    # 逐項讀出並檢查 CRC
+    assert archive.testzip() is None
+    return archive
+
+
+def _crc(path: str) -> int:
+    with open(path, "rb") as f:
+        return zlib.crc32(f.read())
+
+
+def test_stream_zip_entries_and_crcs(client):
+    response = client.post("/api/v1/cards/", data={"name": "壓縮檔測試", "company_name": "星位科技"},
+                           files={"front_image": ("front.png", _image_bytes("PNG", (10, 20, 30)), "image/png"),
+                                  "back_image": ("back.bmp", _image_bytes("BMP", (40, 50, 60)), "image/bmp")})
+    assert response.status_code == 200, response.text
+    card = response.json()
+    chunks = list(stream_zip(["name", "company_name"], batch_size=5))
+
+    archive = _read_zip(chunks)
+    front, back = f"images/{card['id']}_front.png", f"images/{card['id']}_back.bmp"
+    infos = {info.filename: info for info in archive.infolist()}
+    assert {front, back, ZIP_MANIFEST_NAME} <= set(infos)
+    assert archive.namelist()[-1] == ZIP_MANIFEST_NAME
+    for name, path in ((front, card["front_image_path"]), (back, card["back_image_path"])):
+        assert infos[name].CRC == _crc(path)
+        with open(path, "rb") as f:
+            assert archive.read(name) == f.read()
+        # 輸出不可回頭修改，每個項目都以 data descriptor 記錄大小與 CRC
+        assert infos[name].flag_bits & 0x08
+    assert infos[front].compress_type == zipfile.ZIP_STORED
+    assert infos[back].compress_type == zipfile.ZIP_DEFLATED
+
+    manifest = list(csv.reader(io.StringIO(archive.read(ZIP_MANIFEST_NAME).decode("utf-8-sig"))))
+    assert manifest[0] == ["ID", "姓名", "公司名稱", "正面圖片", "背面圖片"]
+    assert [str(card["id"]), "壓縮檔測試", "星位科技", front, back] in manifest[1:]
+
+
+def test_stream_zip_with_more_entries_than_zip32_allows(monkeypatch, tmp_path):
+    front = tmp_path / "front.jpg"
+    back = tmp_path / "back.bmp"
+    front.write_bytes(_image_bytes("JPEG", (10, 20, 30)))
+    back.write_bytes(_image_bytes("BMP", (40, 50, 60)))
+    cards = 33000
+
+    def fake_rows(columns, batch_size, progress):
+        assert columns == ["id", "name", "front_image_path", "back_image_path"]
+        for card_id in range(1, cards + 1):
+            yield card_id, f"名片{card_id}", str(front), str(back)
+
+    monkeypatch.setattr(export_service, "iter_card_rows", fake_rows)
+    chunks = list(stream_zip(["name"]))
+
+    # 超過 65535 個項目，必須寫出 zip64 的結尾紀錄
+    assert b"PK\x06\x06" in chunks[-1]
+    archive = _read_zip(chunks)
+    infos = archive.infolist()
+    assert len(infos) == cards * 2 + 1
+    assert infos[0].filename == "images/1_front.jpg"
+    assert infos[-2].filename == f"images/{cards}_back.bmp"
+    assert {info.CRC for info in infos if info.filename.endswith("_front.jpg")} == {_crc(front)}
+    assert {info.CRC for info in infos if info.filename.endswith("_back.bmp")} == {_crc(back)}
+    manifest = archive.read(ZIP_MANIFEST_NAME).decode("utf-8-sig").splitlines()
+    assert len(manifest) == cards + 1
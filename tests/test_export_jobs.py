@@ -0,0 +1,158 @@
+import codecs
+import os
+import threading
+import time
+
+import pytest
+
+from backend.services.export_jobs import (
+    EXPORT_FORMATS, JOB_DONE, JOB_FAILED, JOB_PENDING, JOB_RUNNING, ExportFormat, ExportJobManager, normalize_options,
+)
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = ExportJobManager(export_dir=str(tmp_path), workers=1, ttl_hours=1)
+    yield manager
+    if manager._executor is not None:
+        manager._executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def gated_format(monkeypatch, manager):
+    """以可控制的寫出函式取代 CSV 匯出：等待 gate 後寫出檔案，error 不為 None 時拋出例外"""
+    state = {"gate": threading.Event(), "calls": [], "error": None, "seen": []}
+
+    def writer(options, progress):
+        def write(path):
+            state["calls"].append(options)
+            # 從 JSON 檔讀取寫出時的工作狀態（其他 worker 看到的狀態）
+            state["seen"] += [manager.get(job.id).status for job in list(manager._jobs.values())
+                              if job.options is options]
+            assert state["gate"].wait(5)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("partial")
+            progress(3)
+            if state["error"]:
+                raise RuntimeError(state["error"])
+        return write
+
+    monkeypatch.setitem(EXPORT_FORMATS, "csv", ExportFormat("csv", "text/csv; charset=utf-8", writer))
+    return state
+
+
+def _wait_for(manager, job, statuses=(JOB_DONE, JOB_FAILED), timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while manager.get(job.id).status not in statuses:
+        assert time.monotonic() < deadline, "等待匯出工作逾時"
+        time.sleep(0.01)
+    return manager.get(job.id)
+
+
+def test_submit_runs_job_and_reuses_artifact(db, make_card, manager, gated_format):
+    make_card(name="陳美玲")
+    options = normalize_options("csv", "name,company_name")
+    job = manager.submit(db, "csv", options)
+    assert job.status in (JOB_PENDING, JOB_RUNNING)
+    # 相同內容的工作仍在執行時直接沿用
+    assert manager.submit(db, "csv", options) is job
+    other = manager.submit(db, "csv", normalize_options("csv", "name"))
+    assert other.id != job.id and other.cache_key != job.cache_key
+
+    gated_format["gate"].set()
+    finished = _wait_for(manager, job)
+    _wait_for(manager, other)
+    assert finished.status == JOB_DONE
+    assert gated_format["seen"][:2] == [JOB_RUNNING, JOB_RUNNING]
+    assert finished.processed == 3 and finished.finished_at is not None
+    assert os.path.exists(manager.artifact_path(finished))
+    assert not [name for name in os.listdir(manager.export_dir) if name.endswith(".tmp")]
+
+    # 資料沒有變更時沿用既有檔案，不重新匯出
+    calls = len(gated_format["calls"])
+    cached = manager.submit(db, "csv", options)
+    assert cached.id != job.id and cached.cached and cached.status == JOB_DONE
+    assert cached.cache_key == job.cache_key
+    assert len(gated_format["calls"]) == calls
+
+    # 資料變更後快取鍵不同，重新匯出
+    make_card(name="王小明")
+    fresh = manager.submit(db, "csv", options)
+    assert fresh.cache_key != job.cache_key and not fresh.cached
+    assert _wait_for(manager, fresh).status == JOB_DONE
+    assert len(gated_format["calls"]) == calls + 1
+
+
+def test_job_status_is_visible_to_other_workers(db, manager, gated_format, tmp_path):
+    job = manager.submit(db, "csv", normalize_options("csv"))
+    other_worker = ExportJobManager(export_dir=str(tmp_path))
+
+    assert other_worker.get(job.id).status in (JOB_PENDING, JOB_RUNNING)
+    gated_format["gate"].set()
+    _wait_for(manager, job)
+    loaded = other_worker.get(job.id)
+    assert loaded is not manager.get(job.id)
+    assert (loaded.status, loaded.cache_key, loaded.processed) == (JOB_DONE, job.cache_key, 3)
+    assert other_worker.get("../../etc/passwd") is None
+    assert other_worker.get("0" * 32) is None
+
+
+def test_failed_job_records_error_and_removes_partial_file(db, manager, gated_format):
+    gated_format["error"] = "磁碟已滿"
+    gated_format["gate"].set()
+    options = normalize_options("csv")
+
+    job = _wait_for(manager, manager.submit(db, "csv", options))
+
+    assert job.status == JOB_FAILED
+    assert job.error == "磁碟已滿"
+    assert not os.path.exists(manager.artifact_path(job))
+    assert not [name for name in os.listdir(manager.export_dir) if name.endswith(".tmp")]
+    # 失敗的工作不會被沿用，再次提交會重新執行
+    gated_format["error"] = None
+    retry = manager.submit(db, "csv", options)
+    assert retry.id != job.id
+    assert _wait_for(manager, retry).status == JOB_DONE
+
+
+def test_prune_removes_expired_artifacts_by_mtime(db, manager, gated_format):
+    gated_format["gate"].set()
+    options = normalize_options("csv")
+    job = _wait_for(manager, manager.submit(db, "csv", options))
+    artifact = manager.artifact_path(job)
+    job_file = manager._job_path(job.id)
+    stale = os.path.join(manager.export_dir, "stale.csv")
+    with open(stale, "w") as f:
+        f.write("old")
+    expired = time.time() - 2 * 3600
+    recent = time.time() - 1800
+    os.utime(stale, (expired, expired))
+    os.utime(artifact, (recent, recent))
+
+    # 提交時先清除過期檔；沿用快取檔時更新時間戳，保留期限從最後一次使用起算
+    cached = manager.submit(db, "csv", options)
+    assert cached.cached
+    assert os.stat(artifact).st_mtime > time.time() - 60
+    assert not os.path.exists(stale)
+
+    os.utime(artifact, (expired, expired))
+    os.utime(job_file, (expired, expired))
+    job.finished_at = expired
+    manager.prune()
+    assert not os.path.exists(artifact)
+    assert not os.path.exists(job_file)
+    assert job.id not in manager._jobs
+    assert cached.id in manager._jobs
+
+
+def test_csv_job_writes_real_export(db, make_card, manager):
+    make_card(name="陳美玲")
+    job = _wait_for(manager, manager.submit(db, "csv", normalize_options("csv", "name")))
+
+    assert job.status == JOB_DONE
+    assert job.processed == job.total > 0
+    assert job.to_dict()["progress"] == 1.0
+    with open(manager.artifact_path(job), "rb") as f:
+        content = f.read()
+    assert content.startswith(codecs.BOM_UTF8)
+    assert "陳美玲" in content.decode("utf-8-sig")
@@ -0,0 +1,101 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from backend.core.config import settings
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _jpeg(color=(30, 90, 150)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (640, 400), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def card_with_image(client):
+    content = _jpeg()
+    response = client.post("/api/v1/cards/", data={"name": "圖片快取"},
+                           files={"front_image": ("front.jpg", content, "image/jpeg")})
+    assert response.status_code == 200, response.text
+    return response.json(), content
+
+
+def test_versioned_url_is_immutable(client, card_with_image):
+    card, content = card_with_image
+    url = card["renditions"]["front"]["original"]
+
+    response = client.get(url)
+
+    assert response.status_code == 200
+    assert response.content == content
+    assert response.headers["cache-control"] == IMMUTABLE
+    assert response.headers["etag"].startswith('"') and response.headers["accept-ranges"] == "bytes"
+
+
+@pytest.mark.parametrize("query", ["", "?v=outdated"])
+def test_unversioned_or_stale_url_must_revalidate(client, card_with_image, query):
+    card, _ = card_with_image
+    response = client.get(f"/api/v1/cards/{card['id']}/images/front{query}")
+
+    assert response.status_code == 200
+    assert response.headers["cache-control"] == "no-cache"
+
+
+def test_if_none_match_returns_304(client, card_with_image):
+    card, _ = card_with_image
+    url = card["renditions"]["front"]["original"]
+    etag = client.get(url).headers["etag"]
+
+    response = client.get(url, headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+    assert response.headers["cache-control"] == IMMUTABLE
+
+    assert client.get(url, headers={"If-None-Match": f"W/{etag}"}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": '"other", ' + etag}).status_code == 304
+    assert client.get(url, headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_range_request_returns_partial_content(client, card_with_image):
+    card, content = card_with_image
+    url = f"/api/v1/cards/{card['id']}/images/front"
+
+    response = client.get(url, headers={"Range": "bytes=10-109"})
+    assert response.status_code == 206
+    assert response.content == content[10:110]
+    assert response.headers["content-range"] == f"bytes 10-109/{len(content)}"
+    assert response.headers["content-length"] == "100"
+
+    tail = client.get(url, headers={"Range": "bytes=-20"})
+    assert tail.status_code == 206 and tail.content == content[-20:]
+
+    outside = client.get(url, headers={"Range": f"bytes={len(content) + 10}-"})
+    assert outside.status_code == 416
+
+
+def test_rendition_has_its_own_etag(client, card_with_image):
+    card, _ = card_with_image
+    name = next(iter(settings.RENDITION_SIZES))
+    original = client.get(card["renditions"]["front"]["original"])
+    response = client.get(card["renditions"]["front"][name])
+
+    assert response.status_code == 200
+    assert response.headers["etag"] != original.headers["etag"]
+    assert response.headers["cache-control"] == IMMUTABLE
+    with Image.open(io.BytesIO(response.content)) as image:
+        assert max(image.size) <= settings.RENDITION_SIZES[name]
+    revalidated = client.get(card["renditions"]["front"][name], headers={"If-None-Match": response.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+def test_missing_image_and_unknown_rendition(client, card_with_image):
+    card, _ = card_with_image
+    assert client.get(f"/api/v1/cards/{card['id']}/images/back").status_code == 404
+    assert client.get(f"/api/v1/cards/{card['id']}/images/side").status_code == 404
+    assert client.get(f"/api/v1/cards/{card['id']}/images/front?rendition=poster").status_code == 400
+    assert os.path.exists(card["front_image_path"])
@@ -0,0 +1,128 @@
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+from backend.models.card import CardORM, ImageBlobORM
+from backend.services.image_gc import QUARANTINE_DIR, ImageGarbageCollector, image_gc
+from backend.services.image_store import ImageStore
+
+HOUR = 3600
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _backdate(path, hours):
+    stamp = time.time() - hours * HOUR
+    os.utime(path, (stamp, stamp))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(str(tmp_path / "store"))
+
+
+@pytest.fixture
+def gc(store):
+    return ImageGarbageCollector(store, grace_hours=1, max_dirs=1000)
+
+
+@pytest.fixture
+def put(store):
+    def put_image(color, age_hours=2):
+        stored = store.put(io.BytesIO(_png(color)), "card.png")
+        _backdate(stored.path, age_hours)
+        return stored
+    return put_image
+
+
+@pytest.fixture
+def reference(db):
+    """以名片引用圖片，測試結束時刪除名片"""
+    card_ids = []
+
+    def add(path):
+        card = CardORM(name="圖片清理", front_image_path=path)
+        db.add(card)
+        db.commit()
+        card_ids.append(card.id)
+    yield add
+    db.query(CardORM).filter(CardORM.id.in_(card_ids)).delete(synchronize_session=False)
+    db.commit()
+
+
+def _quarantined(store, path):
+    return os.path.join(store.root, QUARANTINE_DIR, os.path.relpath(path, store.root))
+
+
+def test_orphan_is_quarantined_then_deleted(gc, store, put, reference, db):
+    kept = put((255, 0, 0))
+    reference(kept.path)
+    young = put((0, 255, 0), age_hours=0)
+    orphan = put((0, 0, 255))
+    db.add(ImageBlobORM(digest=orphan.digest, path=orphan.path, size=orphan.size, ref_count=0))
+    db.commit()
+
+    report = gc.sweep(dry_run=True, full=True)
+    assert (report.orphans, report.young, report.referenced, report.quarantined) == (1, 1, 1, 0)
+    assert report.sample == [orphan.path]
+    assert os.path.exists(orphan.path)
+
+    report = gc.sweep(full=True)
+    assert report.quarantined == 1
+    assert not os.path.exists(orphan.path)
+    assert os.path.exists(_quarantined(store, orphan.path))
+    assert os.path.exists(kept.path) and os.path.exists(young.path)
+
+    # 寬限期從隔離時開始計算
+    assert gc.sweep(full=True).deleted == 0
+    _backdate(_quarantined(store, orphan.path), 2)
+    report = gc.sweep(full=True)
+    assert report.deleted == 1
+    assert not os.path.exists(_quarantined(store, orphan.path))
+    db.expire_all()
+    assert db.get(ImageBlobORM, orphan.digest) is None
+
+
+def test_quarantined_image_is_restored_when_referenced_again(gc, store, put, reference):
+    image = put((10, 20, 30))
+    assert gc.sweep(full=True).quarantined == 1
+
+    reference(image.path)
+    report = gc.sweep(full=True)
+    assert report.restored == 1
+    assert os.path.exists(image.path)
+    assert not os.path.exists(_quarantined(store, image.path))
+
+
+def test_incremental_sweep_resumes_from_cursor(store, put):
+    for i in range(6):
+        put((i * 40, 0, 0))
+    gc = ImageGarbageCollector(store, grace_hours=1, max_dirs=2)
+    reports = []
+    while not reports or not reports[-1].cycle_completed:
+        reports.append(gc.sweep())
+        assert len(reports) < 20
+    assert sum(report.quarantined for report in reports) == 6
+    assert all(report.directories <= 2 for report in reports)
+
+
+def test_image_route_restores_quarantined_image(client):
+    response = client.post("/api/v1/cards/", data={"name": "隔離還原"},
+                           files={"front_image": ("front.png", _png((1, 2, 3)), "image/png")})
+    assert response.status_code == 200, response.text
+    card = response.json()
+    path = card["front_image_path"]
+    image_gc._quarantine(path)
+    assert not os.path.exists(path)
+
+    response = client.get(f"/api/v1/cards/{card['id']}/images/front")
+    assert response.status_code == 200
+    assert response.content == _png((1, 2, 3))
+    assert os.path.exists(path)
@@ -0,0 +1,78 @@
+import io
+
+import pytest
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+from backend.services.ocr_service import assess_image_quality
+
+LINES = ["Wang Xiao Ming", "+886 912 345 678", "wang@example.com", "Star Bit Technology Co.", "Sales Manager"]
+
+
+def _card(width=1000, height=600, paper=255, ink=20, lines=2, size=40):
+    image = Image.new("RGB", (width, height), (paper,) * 3)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=size)
+    for i in range(lines):
+        draw.text((60, 60 + i * (size + 20)), LINES[i % len(LINES)], fill=(ink,) * 3, font=font)
+    return image
+
+
+def _on_table(card, size):
+    table = Image.new("RGB", size, (60, 50, 40))
+    table.paste(card, ((size[0] - card.width) // 2, (size[1] - card.height) // 2))
+    return table
+
+
+@pytest.mark.parametrize("image", [
+    _card(lines=1, size=32),                        # 白色名片、只有一行字，幾乎全白
+    _card(lines=5),
+    _card(paper=10, ink=240, lines=4),              # 黑底白字
+    _on_table(_card(1100, 660, lines=4), (1400, 1000)),
+], ids=["white-one-line", "white-dense", "black-card", "card-on-table"])
+def test_clean_cards_pass(image):
+    quality = assess_image_quality(image)
+    assert quality.passed, quality.issues
+
+
+def test_white_card_is_not_overexposed():
+    quality = assess_image_quality(_card(lines=2))
+    assert quality.clipped_ratio > 0.9
+    assert quality.coverage == 1.0
+    assert quality.passed
+
+
+def test_washed_out_card_is_overexposed():
+    quality = assess_image_quality(_card(lines=5, ink=242))
+    assert quality.issues == ["圖片過亮或反光，請避免閃光燈直射名片"]
+
+
+def test_dark_photo_is_underexposed():
+    quality = assess_image_quality(_card(lines=5, paper=20, ink=8))
+    assert quality.issues == ["圖片過暗，請在光線充足的地方拍攝"]
+
+
+def test_blurred_card_is_blurry():
+    quality = assess_image_quality(_card(lines=5).filter(ImageFilter.GaussianBlur(8)))
+    assert quality.issues == ["圖片模糊，請對焦並保持手機穩定後重新拍攝"]
+
+
+def test_small_card_on_table_is_rejected():
+    quality = assess_image_quality(_on_table(_card(300, 180, size=14), (2000, 1500)))
+    assert quality.coverage < 0.05
+    assert quality.issues == ["名片在畫面中太小，請靠近名片讓名片佔滿畫面"]
+
+
+def test_ocr_route_rejects_bad_photo(client):
+    buffer = io.BytesIO()
+    _card(lines=5, ink=242).save(buffer, format="JPEG")
+    response = client.post("/api/v1/ocr/image", files={"file": ("card.jpg", buffer.getvalue(), "image/jpeg")})
+    assert response.status_code == 422
+    assert response.json()["detail"]["quality"]["passed"] is False
+
+
+def test_ocr_route_accepts_clean_white_scan(client):
+    buffer = io.BytesIO()
+    _card(lines=2).save(buffer, format="PNG")
+    response = client.post("/api/v1/ocr/image", files={"file": ("card.png", buffer.getvalue(), "image/png")})
+    assert response.status_code == 200, response.text
+    assert response.json()["text"] == "王小明"
@@ -0,0 +1,116 @@
+import hashlib
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from backend.services.image_store import ImageStore, content_digest, sniff_extension
+
+
+def _png(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ImageStore(str(tmp_path / "store"))
+
+
+def _stored_files(store):
+    return sorted(
+        os.path.relpath(os.path.join(directory, name), store.root)
+        for directory, _, names in os.walk(store.root)
+        for name in names
+    )
+
+
+def test_same_content_is_stored_once(store):
+    content = _png((1, 2, 3))
+    digest = hashlib.sha256(content).hexdigest()
+
+    first = store.put(io.BytesIO(content), "front.jpeg")
+    second = store.put(io.BytesIO(content), "another-name.png")
+    other = store.put(io.BytesIO(_png((4, 5, 6))), "back.png")
+
+    assert (first.digest, first.size, first.created) == (digest, len(content), True)
+    assert (second.path, second.created) == (first.path, False)
+    # 兩層分片目錄，副檔名依檔頭而非上傳檔名
+    assert first.path == os.path.join(store.root, digest[:2], digest[2:4], f"{digest}.png")
+    assert other.path != first.path
+    assert _stored_files(store) == sorted(
+        os.path.relpath(path, store.root) for path in (first.path, other.path)
+    )
+    with open(first.path, "rb") as f:
+        assert f.read() == content
+
+
+def test_write_is_atomic(store):
+    content = _png((7, 8, 9))
+    target = store.path_for(hashlib.sha256(content).hexdigest(), ".png")
+    seen = []
+
+    class SlowSource(io.BytesIO):
+        def read(self, size=-1):
+            # 寫入途中最終路徑尚不存在，只有暫存檔
+            seen.append((os.path.exists(target), os.listdir(os.path.join(store.root, ".tmp"))))
+            return super().read(4)
+
+    stored = store.put(SlowSource(content))
+
+    assert stored.path == target
+    assert all(not exists and len(parts) == 1 and parts[0].endswith(".part") for exists, parts in seen)
+    assert os.listdir(os.path.join(store.root, ".tmp")) == []
+
+
+def test_failed_write_leaves_no_files(store):
+    class BrokenSource(io.BytesIO):
+        def read(self, size=-1):
+            if self.tell():
+                raise OSError("連線中斷")
+            return super().read(8)
+
+    with pytest.raises(OSError):
+        store.put(BrokenSource(_png((1, 1, 1))))
+    assert _stored_files(store) == []
+
+
+def test_put_file_links_existing_file(store, tmp_path):
+    source = tmp_path / "legacy.png"
+    source.write_bytes(_png((10, 20, 30)))
+
+    stored = store.put_file(str(source))
+    again = store.put(io.BytesIO(source.read_bytes()))
+
+    assert stored.created and not again.created and again.path == stored.path
+    assert source.exists()
+    # 同一檔案系統以硬連結放入存放區，不佔額外空間
+    assert os.stat(stored.path).st_ino == os.stat(source).st_ino
+    assert store.put_file(str(source)).created is False
+
+
+def test_digest_of_and_content_digest(store, tmp_path):
+    content = _png((3, 3, 3))
+    stored = store.put(io.BytesIO(content))
+    legacy = tmp_path / "cards" / f"{stored.digest}.png"
+    legacy.parent.mkdir()
+    legacy.write_bytes(content)
+
+    assert ImageStore.digest_of(stored.path) == stored.digest
+    # 檔名像雜湊但不在分片目錄中，不視為存放區的檔案
+    assert ImageStore.digest_of(str(legacy)) is None
+    assert ImageStore.digest_of(None) is None
+    assert content_digest(stored.path) == content_digest(str(legacy)) == stored.digest
+
+
+@pytest.mark.parametrize("head, filename, expected", [
+    (b"\xff\xd8\xff\xe0", "card.png", ".jpg"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", None, ".webp"),
+    (b"unknown", "scan.HEIC", ".heic"),
+    (b"unknown", "../../etc/passwd", ".bin"),
+    (b"unknown", None, ".bin"),
+])
+def test_sniff_extension(head, filename, expected):
+    assert sniff_extension(head, filename) == expected
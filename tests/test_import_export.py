@@ -0,0 +1,147 @@
+import csv
+import io
+import uuid
+
+import pytest
+from PIL import Image
+
+from backend.models.card import CardORM
+from backend.services import import_service
+from backend.services.card_cache import card_cache
+from backend.services.card_service import bulk_insert_cards
+from backend.services.image_store import image_store
+from backend.services.phash_service import phash_index
+
+FIELDS = {
+    "name": "陳美玲",
+    "name_en": "Chen Mei-Ling",
+    "company_name": "星位科技股份有限公司",
+    "position": "業務經理",
+    "department1": "業務部",
+    "mobile_phone": "0912-345-678",
+    "company_phone1": "02-2345-6789",
+    "email": "meiling@example.com",
+    "line_id": "meiling",
+    "company_address1": "台北市信義區松仁路100號",
+    "note1": "展覽認識, 需回電\n第二行",
+}
+
+
+@pytest.fixture
+def marked_card(make_card):
+    """建立以唯一英文公司名標記的名片，方便在共用資料庫中找回匯入的資料"""
+    marker = f"RoundTrip {uuid.uuid4().hex[:8]}"
+    return make_card(company_name_en=marker, **FIELDS), marker
+
+
+def _cards_marked(client, marker):
+    return [card for card in client.get("/api/v1/cards/").json() if card["company_name_en"] == marker]
+
+
+def _export(client, **params):
+    response = client.get("/api/v1/cards/export/download", params=params)
+    assert response.status_code == 200, response.text
+    return response.content
+
+
+def _import(client, filename, content, **form):
+    response = client.post("/api/v1/cards/import", files={"file": (filename, content)}, data=form)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+# vCard 3.0 只輸出中文版本，完整的中英文欄位需用 4.0
+@pytest.mark.parametrize("filename, params", [
+    ("cards.csv", {"format": "csv"}),
+    ("cards.xlsx", {"format": "excel"}),
+    ("cards.vcf", {"format": "vcard", "vcard_version": "4.0"}),
+], ids=["csv", "excel", "vcard"])
+def test_export_then_import_keeps_fields(client, marked_card, filename, params):
+    original, marker = marked_card
+    content = _export(client, **params)
+
+    result = _import(client, filename, content)
+    assert result["failed"] == 0, result["errors"]
+
+    copies = [card for card in _cards_marked(client, marker) if card["id"] != original["id"]]
+    assert len(copies) == 1
+    for field, value in FIELDS.items():
+        assert copies[0][field] == value, field
+
+
+def test_reimport_with_dedup_skips_existing_cards(client, marked_card):
+    original, marker = marked_card
+    rows = list(csv.reader(io.StringIO(_export(client, format="csv").decode("utf-8-sig"))))
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows([rows[0]] + [row for row in rows[1:] if marker in row])
+
+    result = _import(client, "cards.csv", buffer.getvalue().encode("utf-8"), dedup="true")
+    assert (result["total"], result["imported"], result["duplicates"]) == (1, 0, 1)
+    assert [card["id"] for card in _cards_marked(client, marker)] == [original["id"]]
+
+
+def _rows(count, marker, fail_after=None):
+    for number in range(1, count + 1):
+        if number == fail_after:
+            raise ValueError(f"第 {number} 列格式錯誤")
+        yield number, {"name": f"匯入 {number}", "company_name_en": marker}
+
+
+def test_failed_batch_is_counted_and_other_batches_kept(db, monkeypatch):
+    marker = f"Batch {uuid.uuid4().hex[:8]}"
+    calls = []
+
+    def flaky(db, cards):
+        calls.append(len(cards))
+        if len(calls) == 2:
+            raise RuntimeError("database is locked")
+        return bulk_insert_cards(db, cards)
+
+    monkeypatch.setattr(import_service, "bulk_insert_cards", flaky)
+    result = import_service.import_rows(db, _rows(5, marker), batch_size=2)
+
+    assert calls == [2, 2, 1]
+    assert (result.total, result.imported, result.failed, result.batches) == (5, 3, 2, 2)
+    assert result.errors == [{"row": 3, "last_row": 4, "errors": ["寫入失敗: database is locked"]}]
+    assert result.error is None
+    names = sorted(name for (name,) in db.query(CardORM.name).filter(CardORM.company_name_en == marker))
+    assert names == ["匯入 1", "匯入 2", "匯入 5"]
+
+
+def test_parse_error_keeps_imported_rows_and_reports_counts(client, monkeypatch):
+    marker = f"Partial {uuid.uuid4().hex[:8]}"
+    monkeypatch.setattr(import_service, "iter_csv_rows", lambda file: _rows(10, marker, fail_after=4))
+
+    response = client.post("/api/v1/cards/import", files={"file": ("cards.csv", b"name\n")})
+
+    assert response.status_code == 200, response.text
+    result = response.json()
+    assert result["success"] is False
+    assert (result["total"], result["imported"], result["error"]) == (3, 3, "第 4 列格式錯誤")
+    assert len(_cards_marked(client, marker)) == 3
+
+
+def test_parse_error_before_any_row_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(import_service, "iter_csv_rows", lambda file: _rows(10, "unused", fail_after=1))
+
+    response = client.post("/api/v1/cards/import", files={"file": ("cards.csv", b"name\n")})
+
+    assert response.status_code == 400
+    assert "第 1 列格式錯誤" in response.json()["detail"]
+
+
+def test_bulk_insert_updates_phash_index_and_card_cache(db, monkeypatch):
+    buffer = io.BytesIO()
+    Image.new("RGB", (320, 200), (10, 120, 200)).save(buffer, format="JPEG")
+    buffer.seek(0)
+    path = image_store.put(buffer, "front.jpg").path
+    phash_index.refresh(db)
+    invalidated = []
+    monkeypatch.setattr(card_cache, "invalidate", lambda card_ids: invalidated.extend(card_ids))
+
+    card_ids = bulk_insert_cards(db, [{"name": "批次圖片", "front_image_path": path}, {"name": "批次無圖"}])
+
+    assert invalidated == card_ids
+    # 不需重新整理索引即可找到新名片的圖片雜湊
+    assert phash_index.similar(card_ids[0]) is not None
+    assert phash_index.similar(card_ids[1]) is None
@@ -0,0 +1,204 @@
+import datetime
+import os
+import sqlite3
+import time
+
+import pytest
+from PIL import Image
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.core.startup import bootstrap_schema, run_data_migrations
+from backend.models.card import CardORM
+from backend.models import migrations
+from backend.models.migrations import (
+    LATEST_VERSION, MigrationLockError, current_version, pending_migrations, run_migrations,
+)
+from backend.services import ocr_text_store
+from backend.services.image_gc import ImageGarbageCollector
+from backend.services.image_store import ImageStore, image_store
+from backend.services.ocr_text_store import OCRTextCodec, load_ocr_texts
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _backdate(path, hours=48):
+    stamp = time.time() - hours * 3600
+    os.utime(path, (stamp, stamp))
+
+
+def _baseline_engine(path):
+    """以隨專案發佈的 cards.db 結構（內嵌 OCR 文字、沒有版本紀錄）建立資料庫，另加兩個更早期的欄位"""
+    with sqlite3.connect(f"file:{os.path.join(ROOT, 'cards.db')}?mode=ro", uri=True) as baseline:
+        schema = baseline.execute("SELECT sql FROM sqlite_master WHERE name = 'cards'").fetchone()[0]
+    with sqlite3.connect(path) as conn:
+        conn.execute(schema)
+        conn.execute("ALTER TABLE cards ADD COLUMN company VARCHAR(200)")
+        conn.execute("ALTER TABLE cards ADD COLUMN mobile VARCHAR(50)")
+    return create_engine(f"sqlite:///{path}")
+
+
+def test_upgrade_from_baseline_database(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_text_store, "ocr_text_codec", OCRTextCodec())
+    os.makedirs(image_store.root, exist_ok=True)
+    legacy_image = os.path.join(image_store.root, "legacy_front.png")
+    Image.new("RGB", (40, 20), (200, 30, 30)).save(legacy_image)
+
+    engine = _baseline_engine(str(tmp_path / "baseline.db"))
+    with engine.begin() as conn:
+        for i in range(1, 6):
+            conn.execute(text("""
+                INSERT INTO cards (id, name, company, mobile, company_name, front_image_path, front_ocr_text)
+                VALUES (:id, :name, :company, '0912-000-000', :company_name, :image, :ocr)
+            """), {"id": i, "name": f"名片{i}", "company": "舊公司", "company_name": "新公司" if i == 1 else None,
+                   "image": legacy_image if i == 1 else None, "ocr": f'{{"姓名": "名片{i}"}}'})
+
+    assert current_version(engine) == 0
+    assert run_migrations(engine, batch_size=2) == list(range(1, LATEST_VERSION + 1))
+    assert current_version(engine) == LATEST_VERSION
+    assert run_migrations(engine) == []
+
+    with engine.connect() as conn:
+        columns = [row[1] for row in conn.execute(text("PRAGMA table_info(cards)"))]
+        assert sorted(columns) == sorted(column.name for column in CardORM.__table__.columns)
+        rows = conn.execute(text(
+            "SELECT id, company_name, mobile_phone, front_image_path FROM cards ORDER BY id")).fetchall()
+        # 舊欄位只填入新欄位為空的資料
+        assert [row[1] for row in rows] == ["新公司"] + ["舊公司"] * 4
+        assert all(row[2] == "0912-000-000" for row in rows)
+        front = rows[0][3]
+        assert ImageStore.digest_of(front) and os.path.isfile(front)
+        assert conn.execute(text("SELECT ref_count FROM image_blobs WHERE path = :p"), {"p": front}).scalar() == 1
+    # 舊檔不由遷移直接刪除，交由圖片清理依寬限期隔離
+    assert os.path.exists(legacy_image)
+    gc = ImageGarbageCollector(image_store, grace_hours=24)
+    _backdate(legacy_image)
+    report = gc.sweep(full=True)
+    assert report.quarantined >= 1
+    assert not os.path.exists(legacy_image)
+    assert gc.restore(legacy_image)
+    os.remove(legacy_image)
+
+    with sessionmaker(bind=engine)() as db:
+        texts = load_ocr_texts(db, range(1, 6))
+    assert texts == {i: (f'{{"姓名": "名片{i}"}}', None) for i in range(1, 6)}
+    engine.dispose()
+
+
+def test_interrupted_migration_resumes(tmp_path, monkeypatch):
+    engine = _baseline_engine(str(tmp_path / "resume.db"))
+    with engine.begin() as conn:
+        for i in range(1, 6):
+            conn.execute(text("INSERT INTO cards (id, name, mobile) VALUES (:id, :name, '0912')"),
+                         {"id": i, "name": f"名片{i}"})
+    run_migrations(engine, target=1)
+
+    # mobile -> mobile_phone 處理完第一批後程序中斷
+    real_run_batches = migrations.MigrationContext.run_batches
+    batches = []
+
+    def interrupted(self, step, table, process, where="1 = 1"):
+        def first_batch_only(conn, low_id, high_id):
+            if step == "mobile->mobile_phone":
+                if batches:
+                    raise KeyboardInterrupt
+                batches.append(high_id)
+            return process(conn, low_id, high_id)
+        return real_run_batches(self, step, table, first_batch_only, where)
+
+    monkeypatch.setattr(migrations.MigrationContext, "run_batches", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        run_migrations(engine, target=2, batch_size=2)
+    monkeypatch.undo()
+    assert current_version(engine) == 1
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM cards WHERE mobile_phone IS NOT NULL")).scalar() == 2
+
+    assert run_migrations(engine, target=2, batch_size=2) == [2]
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM cards WHERE mobile_phone IS NOT NULL")).scalar() == 5
+    engine.dispose()
+
+
+def _baseline_with_rows(path, count=3):
+    engine = _baseline_engine(path)
+    with engine.begin() as conn:
+        for i in range(1, count + 1):
+            conn.execute(text("INSERT INTO cards (id, name, mobile, front_ocr_text) VALUES (:id, :name, '0912', '名片')"),
+                         {"id": i, "name": f"名片{i}"})
+    return engine
+
+
+def _hold_lock(engine, owner="other-host:1"):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO schema_migration_lock (id, owner, heartbeat) VALUES (1, :o, :t)"),
+                     {"o": owner, "t": datetime.datetime.utcnow()})
+
+
+def test_schema_only_defers_data_migrations(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_text_store, "ocr_text_codec", OCRTextCodec())
+    engine = _baseline_with_rows(str(tmp_path / "startup.db"))
+
+    assert run_migrations(engine, schema_only=True) == [1]
+    assert [m.version for m in pending_migrations(engine)] == list(range(2, LATEST_VERSION + 1))
+    with engine.connect() as conn:
+        # 資料遷移的結構部分已先套用，應用程式可使用新結構
+        assert "dict_id" in [row[1] for row in conn.execute(text("PRAGMA table_info(card_ocr_texts)"))]
+        assert "dhash" in [row[1] for row in conn.execute(text("PRAGMA table_info(image_blobs)"))]
+        assert conn.execute(text("SELECT count(*) FROM cards WHERE mobile_phone IS NOT NULL")).scalar() == 0
+
+    assert run_migrations(engine) == list(range(2, LATEST_VERSION + 1))
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM cards WHERE mobile_phone IS NOT NULL")).scalar() == 3
+        # 改寫過的名片寫入變更紀錄，其他 worker 的快取與索引會重新載入
+        changed = {row[0] for row in conn.execute(text("SELECT card_id FROM card_changes"))}
+        assert changed == {1, 2, 3}
+    engine.dispose()
+
+
+def test_schema_only_runs_everything_on_empty_database(tmp_path):
+    engine = _baseline_engine(str(tmp_path / "empty.db"))
+    assert run_migrations(engine, schema_only=True) == list(range(1, LATEST_VERSION + 1))
+    engine.dispose()
+
+
+def test_startup_does_not_wait_for_data_migration_lock(tmp_path, monkeypatch):
+    monkeypatch.setattr(ocr_text_store, "ocr_text_codec", OCRTextCodec())
+    engine = _baseline_with_rows(str(tmp_path / "busy.db"))
+    run_migrations(engine, target=1)
+    monkeypatch.setattr(migrations, "default_engine", engine)
+    _hold_lock(engine)
+
+    with pytest.raises(MigrationLockError):
+        run_migrations(engine, lock_wait=0)
+    started = time.monotonic()
+    assert bootstrap_schema() == list(range(2, LATEST_VERSION + 1))
+    run_data_migrations()
+    assert time.monotonic() - started < 5
+    assert current_version(engine) == 1
+
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_migration_lock"))
+    run_data_migrations()
+    assert current_version(engine) == LATEST_VERSION
+    engine.dispose()
+
+
+def test_lock_heartbeat_continues_during_long_step(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'heartbeat.db'}")
+    monkeypatch.setattr(migrations, "LOCK_TIMEOUT", 0.5)
+    taken_over = []
+
+    def slow_step(ctx):
+        # 沒有檢查點的長步驟：期間其他程序不應判定鎖已逾時
+        for _ in range(4):
+            time.sleep(0.3)
+            taken_over.append(migrations._acquire_lock(engine, "other-host:1", wait=0))
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [migrations.Migration(1, "slow_step", slow_step)])
+    monkeypatch.setattr(migrations, "LATEST_VERSION", 1)
+    assert run_migrations(engine) == [1]
+    assert taken_over == [False] * 4
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT count(*) FROM schema_migration_lock")).scalar() == 0
+    engine.dispose()
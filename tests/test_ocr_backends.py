@@ -0,0 +1,163 @@
+import threading
+import time
+
+import pytest
+
+from backend.core.config import settings
+from backend.services.ocr_backends import (
+    HTTPOCRBackend,
+    OCRRouter,
+    OCRUnavailableError,
+    StubOCRBackend,
+    make_stub_server,
+)
+
+
+@pytest.fixture(autouse=True)
+def router_settings(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_TIMEOUT", 2)
+    monkeypatch.setattr(settings, "OCR_RETRY_ATTEMPTS", 2)
+    monkeypatch.setattr(settings, "OCR_EWMA_ALPHA", 0.3)
+    monkeypatch.setattr(settings, "OCR_EJECT_CONSECUTIVE_FAILURES", 2)
+    monkeypatch.setattr(settings, "OCR_EJECT_ERROR_RATE", 0.5)
+    monkeypatch.setattr(settings, "OCR_EJECT_SECONDS", 30)
+    monkeypatch.setattr(settings, "OCR_EJECT_MAX_SECONDS", 300)
+
+
+@pytest.fixture
+def stub_server():
+    """啟動替身伺服器，回傳 (server, url)"""
+    servers = []
+
+    def start(**kwargs):
+        server = make_stub_server(**kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server, f"http://127.0.0.1:{server.server_address[1]}/api/card"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _expire(backend):
+    """讓剔除期立即結束，進入半開（只放行探測請求）狀態"""
+    backend.ejected_until = time.monotonic() - 1
+
+
+def test_routes_to_backend_with_lower_latency(stub_server):
+    _, fast_url = stub_server(latency=0.0, result="fast")
+    _, slow_url = stub_server(latency=0.1, result="slow")
+    slow = HTTPOCRBackend("slow", slow_url, max_concurrency=2)
+    fast = HTTPOCRBackend("fast", fast_url, max_concurrency=2)
+    router = OCRRouter([slow, fast])
+
+    results = [router.recognize(b"image") for _ in range(10)]
+
+    # 尚無樣本時兩者各試一次，之後 EWMA 延遲較低者取得全部請求
+    assert slow.requests == 1
+    assert fast.requests == 9
+    assert results.count("fast") == 9
+    assert fast.latency_ewma < slow.latency_ewma
+
+
+def test_error_rate_counts_against_fast_failing_backend():
+    broken = StubOCRBackend("broken", error_rate=1.0, max_concurrency=2)
+    healthy = StubOCRBackend("healthy", latency=0.01, result="ok", max_concurrency=2)
+    router = OCRRouter([broken, healthy])
+
+    # 失敗的後端立即回應（延遲較低），仍應因錯誤率而被避開，並由重試改派到健康的後端
+    assert all(router.recognize(b"image") == "ok" for _ in range(6))
+    assert broken.requests == 1
+    assert broken.error_ewma > 0
+
+
+def test_consecutive_failures_eject_backend(stub_server):
+    _, url = stub_server(error_rate=1.0)
+    backend = HTTPOCRBackend("upstream", url, max_concurrency=2)
+    solo = OCRRouter([backend])
+
+    for _ in range(2):
+        with pytest.raises(OCRUnavailableError):
+            solo.recognize(b"image")
+    assert solo.snapshot()[0]["healthy"] is False
+    assert backend.ejections == 1
+
+    # 全部後端都被剔除時立即失敗，不等待逾時
+    started = time.monotonic()
+    with pytest.raises(OCRUnavailableError):
+        solo.recognize(b"image")
+    assert time.monotonic() - started < 0.5
+
+    # 剔除期間不再分派給它
+    router = OCRRouter([backend, StubOCRBackend("local", result="ok")])
+    assert all(router.recognize(b"image") == "ok" for _ in range(5))
+    assert backend.requests == 2
+
+
+def test_half_open_allows_single_probe_until_it_completes():
+    backend = StubOCRBackend("flaky", max_concurrency=4)
+    router = OCRRouter([backend])
+
+    # 剔除前已送出的請求
+    stale, stale_probe = router._acquire(set(), timeout=1)
+    assert stale_probe is False
+    router._eject(backend)
+    _expire(backend)
+
+    probe_backend, probe = router._acquire(set(), timeout=1)
+    assert probe_backend is backend and probe is True
+    with pytest.raises(OCRUnavailableError):
+        router._acquire(set(), timeout=0.05)
+
+    # 舊請求完成不能解除探測狀態，也不能提早恢復後端
+    router._release(backend, 0.01, ok=True, probe=stale_probe)
+    assert backend.probing is True
+    assert backend.ejections == 1
+    with pytest.raises(OCRUnavailableError):
+        router._acquire(set(), timeout=0.05)
+
+    router._release(backend, 0.01, ok=True, probe=probe)
+    assert backend.probing is False
+    assert backend.ejections == 0
+    assert backend.ejected_until == 0.0
+    # 恢復後同時放行多個請求
+    first, first_probe = router._acquire(set(), timeout=1)
+    second, second_probe = router._acquire(set(), timeout=1)
+    assert first_probe is False and second_probe is False
+
+
+def test_failed_probe_doubles_ejection():
+    backend = StubOCRBackend("flaky", max_concurrency=2)
+    router = OCRRouter([backend])
+    router._eject(backend)
+    first_duration = backend.ejected_until - time.monotonic()
+    _expire(backend)
+
+    _, probe = router._acquire(set(), timeout=1)
+    router._release(backend, 0.01, ok=False, probe=probe)
+
+    assert backend.probing is False
+    assert backend.ejections == 2
+    assert backend.ejected_until - time.monotonic() > first_duration * 1.5
+
+
+def test_backend_recovers_after_upstream_heals(stub_server, monkeypatch):
+    monkeypatch.setattr(settings, "OCR_EJECT_SECONDS", 0.2)
+    server, url = stub_server(error_rate=1.0, result="王小明")
+    backend = HTTPOCRBackend("upstream", url, max_concurrency=2)
+    router = OCRRouter([backend])
+
+    for _ in range(2):
+        with pytest.raises(OCRUnavailableError):
+            router.recognize(b"image")
+    assert backend.ejections == 1
+    with pytest.raises(OCRUnavailableError):
+        router.recognize(b"image")
+
+    server.error_rate = 0.0
+    time.sleep(0.3)
+    assert router.recognize(b"image") == "王小明"
+    assert backend.ejections == 0
+    assert router.snapshot()[0]["healthy"] is True
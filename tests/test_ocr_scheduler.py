@@ -0,0 +1,136 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from backend.core.config import settings
+from backend.services.ocr_scheduler import LANE_BACKGROUND, LANE_BATCH, LANE_INTERACTIVE, OCRScheduler
+
+
+class FakeRouter:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.executor = ThreadPoolExecutor(max_workers=capacity + 4)
+
+
+@pytest.fixture(autouse=True)
+def lane_settings(monkeypatch):
+    monkeypatch.setattr(settings, "OCR_LANE_WEIGHTS", {"interactive": 8, "batch": 3, "background": 1})
+    monkeypatch.setattr(settings, "OCR_LANE_MAX_SHARE", {"interactive": 1.0, "batch": 0.75, "background": 0.5})
+    monkeypatch.setattr(settings, "OCR_INTERACTIVE_RESERVED", 1)
+
+
+async def _wait_until(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "等待逾時"
+        await asyncio.sleep(0.005)
+
+
+def test_lanes_share_capacity_by_weight():
+    async def scenario():
+        scheduler = OCRScheduler(FakeRouter(capacity=1))
+        gate = threading.Event()
+        order = []
+        # 先佔住唯一的位置，讓其餘工作全部排隊
+        blocker = asyncio.ensure_future(scheduler.run(LANE_INTERACTIVE, gate.wait))
+        await _wait_until(lambda: scheduler.snapshot()["running"] == 1)
+        tasks = [asyncio.ensure_future(scheduler.run(lane, order.append, lane))
+                 for lane in [LANE_BATCH] * 12 + [LANE_BACKGROUND] * 12]
+        await asyncio.sleep(0)
+        gate.set()
+        await asyncio.gather(blocker, *tasks)
+        return order
+
+    order = asyncio.run(scenario())
+    assert len(order) == 24
+    first = order[:16]
+    assert first.count(LANE_BATCH) == 12 and first.count(LANE_BACKGROUND) == 4
+    # 低權重通道仍持續取得位置，不會等到高權重通道清空才執行
+    assert LANE_BACKGROUND in order[:2]
+
+
+def test_interactive_runs_while_batch_work_fills_capacity():
+    async def scenario():
+        scheduler = OCRScheduler(FakeRouter(capacity=4))
+        gate = threading.Event()
+        backlog = [asyncio.ensure_future(scheduler.run(lane, gate.wait))
+                   for lane in [LANE_BATCH] * 6 + [LANE_BACKGROUND] * 6]
+        await _wait_until(lambda: scheduler.snapshot()["running"] == 3)
+        await asyncio.sleep(0.05)
+        snapshot = scheduler.snapshot()
+        # 保留一個位置給 interactive，批次與背景工作各自不超過通道上限
+        assert snapshot["running"] == 3
+        assert snapshot["lanes"][LANE_BATCH]["in_flight"] <= snapshot["lanes"][LANE_BATCH]["limit"]
+        assert snapshot["lanes"][LANE_BACKGROUND]["in_flight"] <= 2
+
+        result = await asyncio.wait_for(scheduler.run(LANE_INTERACTIVE, lambda: "掃描結果"), timeout=2)
+        assert result == "掃描結果"
+
+        gate.set()
+        await asyncio.gather(*backlog)
+        return scheduler.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["running"] == 0
+    assert snapshot["lanes"][LANE_BATCH]["completed"] == 6
+    assert snapshot["lanes"][LANE_BACKGROUND]["completed"] == 6
+    assert snapshot["lanes"][LANE_INTERACTIVE]["completed"] == 1
+
+
+def test_cancelled_request_gives_back_its_place():
+    async def scenario():
+        scheduler = OCRScheduler(FakeRouter(capacity=1))
+        gate = threading.Event()
+        blocker = asyncio.ensure_future(scheduler.run(LANE_BATCH, gate.wait))
+        await _wait_until(lambda: scheduler.snapshot()["running"] == 1)
+        queued = asyncio.ensure_future(scheduler.run(LANE_BATCH, lambda: "不應執行"))
+        await asyncio.sleep(0)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        gate.set()
+        await blocker
+        assert await scheduler.run(LANE_BACKGROUND, lambda: "完成") == "完成"
+        return scheduler.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["running"] == 0
+    assert snapshot["lanes"][LANE_BATCH]["cancelled"] == 1
+    assert snapshot["lanes"][LANE_BATCH]["completed"] == 1
+
+
+def test_cancelled_running_job_keeps_its_place_until_worker_finishes():
+    async def scenario():
+        scheduler = OCRScheduler(FakeRouter(capacity=1))
+        gate = threading.Event()
+        started = []
+        running = asyncio.ensure_future(scheduler.run(LANE_BATCH, gate.wait))
+        await _wait_until(lambda: scheduler.snapshot()["running"] == 1)
+        waiting = asyncio.ensure_future(scheduler.run(LANE_BATCH, started.append, "下一個"))
+        await asyncio.sleep(0)
+
+        # 呼叫端被取消，但執行緒中的 OCR 仍在執行
+        running.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await running
+        await asyncio.sleep(0.05)
+        assert scheduler.snapshot()["running"] == 1
+        assert started == []
+
+        gate.set()
+        await asyncio.wait_for(waiting, timeout=2)
+        assert started == ["下一個"]
+        await _wait_until(lambda: scheduler.snapshot()["running"] == 0)
+        return scheduler.snapshot()
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["lanes"][LANE_BATCH]["cancelled"] == 1
+    assert snapshot["lanes"][LANE_BATCH]["completed"] == 2
+
+
+def test_unknown_lane_is_rejected():
+    with pytest.raises(ValueError):
+        OCRScheduler(FakeRouter(capacity=2)).lane("urgent")
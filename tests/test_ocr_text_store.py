@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from backend.models.migrations import run_migrations, current_version, LATEST_VERSION
+from backend.services import ocr_text_store
+from backend.services.ocr_text_store import OCRTextCodec, load_ocr_texts, save_ocr_texts, CODEC_ZSTD_DICT
+
+zstandard = pytest.importorskip("zstandard")
+
+
+def _samples(count=200):
+    return [
+        json.dumps({"姓名": f"王小明{i}", "公司": "星位科技股份有限公司", "Email": f"user{i}@example.com",
+                    "手機": f"0912-345-{i:03d}", "地址": "台北市信義區松仁路100號"}, ensure_ascii=False).encode()
+        for i in range(count)
+    ]
+
+
+def test_list_omits_ocr_text_unless_requested(client, make_card):
+    card = make_card(name="OCR 名片", front_ocr_text='{"姓名": "OCR 名片"}')
+
+    listed = {item["id"]: item for item in client.get("/api/v1/cards/").json()}
+    assert listed[card["id"]]["front_ocr_text"] is None
+
+    listed = {item["id"]: item for item in client.get("/api/v1/cards/", params={"include_ocr_text": True}).json()}
+    assert listed[card["id"]]["front_ocr_text"] == '{"姓名": "OCR 名片"}'
+
+    projected = client.get("/api/v1/cards/", params={"fields": "front_ocr_text"}).json()
+    assert {"id": card["id"], "front_ocr_text": '{"姓名": "OCR 名片"}'} in projected
+
+    assert client.get(f"/api/v1/cards/{card['id']}").json()["front_ocr_text"] == '{"姓名": "OCR 名片"}'
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'ocr.db'}")
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+def test_dictionary_is_stored_in_database(engine, monkeypatch):
+    Session = sessionmaker(bind=engine)
+    codec = OCRTextCodec()
+    # 使用獨立的壓縮器，不影響其他測試所用資料庫的啟用字典
+    monkeypatch.setattr(ocr_text_store, "ocr_text_codec", codec)
+    with Session() as db:
+        dict_id = codec.train_dictionary(db, _samples())
+        db.commit()
+        assert dict_id is not None
+
+        db.execute(text("INSERT INTO cards (id, name) VALUES (1, 'a')"))
+        save_ocr_texts(db, 1, front='{"姓名": "王小明"}')
+        db.commit()
+        row = db.execute(text("SELECT codec, dict_id FROM card_ocr_texts WHERE card_id = 1")).one()
+        assert tuple(row) == (CODEC_ZSTD_DICT, dict_id)
+
+    # 新的程序（沒有任何字典快取或字典檔）只靠資料庫即可解壓
+    monkeypatch.setattr(ocr_text_store, "ocr_text_codec", OCRTextCodec())
+    with Session() as db:
+        assert load_ocr_texts(db, [1]) == {1: ('{"姓名": "王小明"}', None)}
+
+
+def test_migration_imports_legacy_dictionary_files(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    run_migrations(engine, target=6)
+    trained = zstandard.train_dictionary(16 * 1024, _samples())
+    dict_dir = tmp_path / "ocr_dicts"
+    dict_dir.mkdir()
+    (dict_dir / f"{trained.dict_id()}.zdict").write_bytes(trained.as_bytes())
+    (dict_dir / "active").write_text(str(trained.dict_id()))
+    blob = zstandard.ZstdCompressor(dict_data=trained).compress("舊版字典壓縮的文字".encode())
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE ocr_text_dicts"))
+        conn.execute(text("INSERT INTO cards (id, name) VALUES (1, 'a')"))
+        conn.execute(text("INSERT INTO card_ocr_texts (card_id, codec, front_ocr) VALUES (1, :codec, :blob)"),
+                     {"codec": f"zstd-dict:{trained.dict_id()}", "blob": blob})
+
+    monkeypatch.setenv("OCR_TEXT_DICT_DIR", str(dict_dir))
+    assert run_migrations(engine) == [7]
+    assert current_version(engine) == LATEST_VERSION
+
+    for path in dict_dir.iterdir():
+        os.remove(path)
+    monkeypatch.setattr(ocr_text_store, "ocr_text_codec", OCRTextCodec())
+    with sessionmaker(bind=engine)() as db:
+        assert load_ocr_texts(db, [1]) == {1: ("舊版字典壓縮的文字", None)}
+    engine.dispose()
@@ -0,0 +1,65 @@
+import io
+import logging
+
+from PIL import Image
+from sqlalchemy.exc import OperationalError
+
+from backend.api.v1 import ocr
+from backend.models.card import CardChangeORM, CardORM, ImageBlobORM
+from backend.services.phash_service import PerceptualIndex, to_signed
+
+
+def _write_as_other_worker(db, card_id=None, dhash=None, op="insert"):
+    """直接寫入名片、圖片雜湊與變更紀錄，模擬另一個 worker（不經過本程序的索引維護）"""
+    if op == "delete":
+        db.query(CardORM).filter(CardORM.id == card_id).delete()
+    else:
+        path = f"other/{dhash:016x}.jpg"
+        if db.get(ImageBlobORM, path) is None:
+            db.add(ImageBlobORM(digest=path, path=path, size=1, ref_count=1, dhash=to_signed(dhash)))
+        if op == "insert":
+            card = CardORM(name="其他 worker", front_image_path=path)
+            db.add(card)
+            db.flush()
+            card_id = card.id
+        else:
+            db.query(CardORM).filter(CardORM.id == card_id).update({"front_image_path": path})
+    db.add(CardChangeORM(card_id=card_id, op=op))
+    db.commit()
+    return card_id
+
+
+def _matches(index, db, value):
+    index.refresh(db)
+    return [item["card_id"] for item in index.find_cards([value], max_distance=2)]
+
+
+def test_index_follows_writes_from_other_workers(client, db):
+    index = PerceptualIndex()
+    first = 0x0F0F_0F0F_0F0F_0F0F
+    second = 0xF0F0_F0F0_F0F0_F0F0
+    index.refresh(db)
+    assert _matches(index, db, first) == []
+
+    card_id = _write_as_other_worker(db, dhash=first)
+    assert _matches(index, db, first) == [card_id]
+
+    _write_as_other_worker(db, card_id, dhash=second, op="update")
+    assert _matches(index, db, first) == []
+    assert _matches(index, db, second) == [card_id]
+
+    _write_as_other_worker(db, card_id, op="delete")
+    assert _matches(index, db, second) == []
+
+
+def test_ocr_survives_database_error_in_lookup(client, monkeypatch, caplog):
+    def locked(db):
+        raise OperationalError("SELECT max(seq)", {}, Exception("database is locked"))
+
+    monkeypatch.setattr(ocr.phash_index, "refresh", locked)
+    buffer = io.BytesIO()
+    Image.effect_noise((64, 64), 64).convert("RGB").save(buffer, format="PNG")
+    with caplog.at_level(logging.ERROR):
+        assert ocr._find_near_duplicates(buffer.getvalue()) == []
+    assert "相似圖片查詢失敗" in caplog.text
+    assert "database is locked" in caplog.text
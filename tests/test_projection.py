@@ -0,0 +1,92 @@
+import pytest
+
+from backend.models.card import CARD_SUMMARY_FIELDS
+
+
+def test_fields_returns_only_requested_fields(client, make_card):
+    card = make_card(name="欄位投影", company_name="星位科技", email="meiling@example.com",
+                     front_ocr_text="陳美玲\n星位科技")
+    response = client.get(f"/api/v1/cards/{card['id']}",
+                          params={"fields": "company_name, name,company_name,front_ocr_text,renditions"})
+
+    assert response.status_code == 200
+    # id 永遠回傳，其餘依請求順序並去重
+    assert list(response.json()) == ["id", "company_name", "name", "front_ocr_text", "renditions"]
+    assert response.json() == {"id": card["id"], "company_name": "星位科技", "name": "欄位投影",
+                               "front_ocr_text": "陳美玲\n星位科技", "renditions": None}
+
+
+def test_summary_view(client, make_card):
+    card = make_card(name="摘要", company_name="星位科技", position="經理", email="summary@example.com")
+    item = client.get(f"/api/v1/cards/{card['id']}", params={"view": "summary"}).json()
+    assert list(item) == list(CARD_SUMMARY_FIELDS)
+    assert item["position"] == "經理"
+
+    listed = client.get("/api/v1/cards/", params={"view": "summary"}).json()
+    assert all(list(entry) == list(CARD_SUMMARY_FIELDS) for entry in listed)
+    assert any(entry["id"] == card["id"] for entry in listed)
+
+
+@pytest.mark.parametrize("url", ["/api/v1/cards/{id}", "/api/v1/cards/"])
+def test_unknown_field_is_rejected(client, make_card, url):
+    card = make_card(name="未知欄位")
+    response = client.get(url.format(id=card["id"]), params={"fields": "name,password,__class__"})
+
+    assert response.status_code == 400
+    assert "password" in response.json()["detail"] and "__class__" in response.json()["detail"]
+
+
+def test_projection_has_its_own_etag(client, make_card):
+    card = make_card(name="投影版本")
+    url = f"/api/v1/cards/{card['id']}"
+    full = client.get(url)
+    names = client.get(url, params={"fields": "name"})
+    companies = client.get(url, params={"fields": "company_name"})
+
+    etags = {full.headers["etag"], names.headers["etag"], companies.headers["etag"]}
+    assert len(etags) == 3
+    assert names.headers["cache-control"] == "no-cache"
+    # 同一組欄位的 ETag 才能驗證；完整名片的 ETag 不適用於投影
+    assert client.get(url, params={"fields": "name"},
+                      headers={"If-None-Match": names.headers["etag"]}).status_code == 304
+    assert client.get(url, params={"fields": "name"},
+                      headers={"If-None-Match": full.headers["etag"]}).status_code == 200
+    assert client.get(url, params={"fields": "company_name"},
+                      headers={"If-None-Match": names.headers["etag"]}).status_code == 200
+
+
+def test_projection_etag_changes_after_update(client, make_card):
+    card = make_card(name="修改前")
+    url = f"/api/v1/cards/{card['id']}"
+    before = client.get(url, params={"fields": "name"})
+
+    updated = client.put(url, data={"name": "修改後"})
+    assert updated.status_code == 200, updated.text
+
+    after = client.get(url, params={"fields": "name"}, headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200
+    assert after.json() == {"id": card["id"], "name": "修改後"}
+    assert after.headers["etag"] != before.headers["etag"]
+    assert client.get(url, params={"fields": "name"},
+                      headers={"If-None-Match": after.headers["etag"]}).status_code == 304
+
+
+def test_list_projection_etag(client, make_card):
+    make_card(name="列表投影")
+    names = client.get("/api/v1/cards/", params={"fields": "name"})
+    full = client.get("/api/v1/cards/")
+
+    assert names.status_code == 200
+    assert all(set(entry) == {"id", "name"} for entry in names.json())
+    assert names.headers["etag"] != full.headers["etag"]
+    assert client.get("/api/v1/cards/", params={"fields": "name"},
+                      headers={"If-None-Match": names.headers["etag"]}).status_code == 304
+
+    make_card(name="新增後")
+    changed = client.get("/api/v1/cards/", params={"fields": "name"}, headers={"If-None-Match": names.headers["etag"]})
+    assert changed.status_code == 200
+    assert any(entry["name"] == "新增後" for entry in changed.json())
+
+
+def test_missing_card_with_fields_is_404(client):
+    assert client.get("/api/v1/cards/999999999", params={"fields": "name"}).status_code == 404
@@ -0,0 +1,90 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+from backend.core.config import settings
+from backend.services.rendition_service import RenditionService, render_rendition, rendition_path
+
+
+def _jpeg(size=(1600, 1000), color=(200, 120, 40)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def service():
+    service = RenditionService(workers=1)
+    yield service
+    service.shutdown()
+
+
+@pytest.fixture
+def original(tmp_path):
+    path = tmp_path / "card.jpg"
+    path.write_bytes(_jpeg())
+    return str(path)
+
+
+def test_ensure_generates_each_rendition(service, original):
+    for name, max_size in settings.RENDITION_SIZES.items():
+        path = service.ensure(original, name)
+
+        assert path == rendition_path(original, name)
+        with Image.open(path) as image:
+            assert image.format == ("WEBP" if settings.RENDITION_FORMAT == "webp" else "JPEG")
+            assert max(image.size) == max_size
+            # 保持原圖比例
+            assert abs(image.width / image.height - 1.6) < 0.02
+    assert not [name for name in os.listdir(os.path.dirname(original)) if name.endswith(".part")]
+
+
+def test_existing_rendition_is_served_without_rendering(service, original, monkeypatch):
+    path = service.ensure(original, "thumb")
+    mtime = os.stat(path).st_mtime_ns
+
+    def no_pool():
+        raise AssertionError("縮圖已存在時不應再送入程序池")
+
+    monkeypatch.setattr(service, "_pool", no_pool)
+    assert service.submit(original, "thumb") is None
+    assert service.ensure(original, "thumb") == path
+    assert os.stat(path).st_mtime_ns == mtime
+
+
+def test_concurrent_requests_share_one_job(service, original):
+    first = service.submit(original, "medium")
+    second = service.submit(original, "medium")
+
+    assert first is second
+    first.result(timeout=30)
+    # 完成後移出進行中的工作，強制重新產生時會建立新工作
+    assert service.submit(original, "medium") is None
+    forced = service.submit(original, "medium", force=True)
+    assert forced is not first
+    forced.result(timeout=30)
+
+
+def test_unreadable_image_returns_none(service, tmp_path):
+    broken = tmp_path / "broken.jpg"
+    broken.write_bytes(b"\xff\xd8\xff not really a jpeg")
+
+    assert service.ensure(str(broken), "thumb") is None
+    assert service.ensure(str(tmp_path / "missing.jpg"), "thumb") is None
+    assert not os.path.exists(rendition_path(str(broken), "thumb"))
+    assert sorted(os.listdir(tmp_path)) == ["broken.jpg"]
+    with pytest.raises(ValueError):
+        service.submit(str(broken), "poster")
+
+
+def test_render_rendition_writes_jpeg_atomically(tmp_path, original):
+    target = str(tmp_path / "card.small.jpg")
+
+    size = render_rendition(original, target, 128, 80)
+
+    assert size == os.path.getsize(target)
+    with Image.open(target) as image:
+        assert image.format == "JPEG" and image.size == (128, 80)
+    assert sorted(os.listdir(tmp_path)) == ["card.jpg", "card.small.jpg"]
@@ -0,0 +1,109 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw
+
+from backend.services.sheet_service import detect_cards, ocr_sheet
+
+BACKGROUND = (90, 110, 100)
+CARD_SIZE = (350, 200)
+
+
+def _card(index: int = 0, size=CARD_SIZE):
+    card = Image.new("RGB", size, (250, 250, 245))
+    draw = ImageDraw.Draw(card)
+    for line in range(5):
+        width = (280 if line == 0 else 200) - (index * 7 + line * 13) % 60
+        draw.rectangle((20, 25 + line * 32, 20 + width, 40 + line * 32), fill=(20, 20, 30))
+    return card
+
+
+def _sheet(cols: int = 2, rows: int = 2, angle: float = 0.0, gap: int = 60, margin: int = 80):
+    """桌面上平鋪 cols × rows 張名片，angle 為整張照片的傾斜角度（逆時針為正）"""
+    width, height = CARD_SIZE
+    sheet = Image.new("RGB", (margin * 2 + cols * width + (cols - 1) * gap,
+                              margin * 2 + rows * height + (rows - 1) * gap), BACKGROUND)
+    for row in range(rows):
+        for col in range(cols):
+            sheet.paste(_card(row * cols + col), (margin + col * (width + gap), margin + row * (height + gap)))
+    if angle:
+        sheet = sheet.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=BACKGROUND)
+    return sheet
+
+
+def _assert_card_crop(region):
+    width, height = region.crop.size
+    assert 1.5 <= width / height <= 1.95
+    assert abs(width - CARD_SIZE[0]) < CARD_SIZE[0] * 0.15
+    # 裁切圖以名片為主，不含大片桌面
+    assert np.asarray(region.crop.convert("L")).mean() > 180
+
+
+def test_detects_each_card_on_a_sheet():
+    regions = detect_cards(_sheet(cols=3, rows=2))
+
+    assert len(regions) == 6
+    for region in regions:
+        assert region.angle == 0
+        _assert_card_crop(region)
+    # 由上而下、由左而右
+    tops = [region.box[1] for region in regions]
+    assert max(tops[:3]) < min(tops[3:])
+
+
+@pytest.mark.parametrize("angle", [8, -8, 20])
+def test_detects_cards_on_a_skewed_sheet(angle):
+    sheet = _sheet(angle=angle)
+    regions = detect_cards(sheet)
+
+    assert len(regions) == 4
+    for region in regions:
+        assert abs(region.angle - angle) < 1
+        _assert_card_crop(region)
+        left, top, right, bottom = region.box
+        assert 0 <= left < right <= sheet.width and 0 <= top < bottom <= sheet.height
+    # 各張名片的範圍互不相同
+    assert len({region.box for region in regions}) == 4
+
+
+def test_single_card_filling_the_frame():
+    card = _card(size=(1200, 700))
+    regions = detect_cards(card)
+
+    assert len(regions) == 1
+    assert regions[0].box == (0, 0, 1200, 700)
+    assert regions[0].crop.size == card.size
+
+
+class FakeOCRService:
+    """第二張名片辨識時拋出例外"""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ocr_decoded_image(self, image, check_quality, lane):
+        self.calls += 1
+        if self.calls == 2:
+            raise RuntimeError("排程逾時")
+        return "王小明"
+
+    def parse_ocr_to_fields(self, text, side):
+        return {"name": text}
+
+
+def test_ocr_sheet_isolates_failure_of_one_card():
+    buffer = io.BytesIO()
+    _sheet().save(buffer, format="PNG")
+    service = FakeOCRService()
+
+    result = asyncio.run(ocr_sheet(service, buffer.getvalue(), check_quality=False))
+
+    assert result["count"] == 4
+    assert result["recognized"] == 3
+    failed = [draft for draft in result["cards"] if not draft["success"]]
+    assert len(failed) == 1
+    assert failed[0]["index"] == 1 and failed[0]["error"] == "排程逾時"
+    assert len(failed[0]["box"]) == 4
+    assert all(draft["parsed_fields"] == {"name": "王小明"} for draft in result["cards"] if draft["success"])
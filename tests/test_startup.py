@@ -0,0 +1,16 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 只在第一次使用時才匯入的套件
+DEFERRED_MODULES = ("numpy", "PIL", "openpyxl", "pyarrow", "requests")
+
+
+def test_import_main_defers_heavy_modules():
+    script = f"import json, sys, main; print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert json.loads(result.stdout.strip().splitlines()[-1]) == []